@@ -1,23 +1,16 @@
+import functools
+
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import SystemMessage
 from langchain.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 
 from app.config import llm_config
-from app.services.llm import LLMService
+from app.services.llm import llm_registry
 from app.tools.video_creation_tool import create_video_tool
 
-llm = LLMService(llm_config.provider,
-                  llm_config.model_name,
-                  llm_config.api_key,)
-
 tools = [create_video_tool]
 
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True,
-)
-
 
 system_message = SystemMessage(
     content="""You are an expert content creator specializing in inspirational quotes and videos.
@@ -38,15 +31,30 @@ messages = [
 
 prompt = ChatPromptTemplate.from_messages(messages)
 
-agent = create_openai_functions_agent(
-    llm.model,
-    tools=tools,
-    prompt=prompt
-)
 
-# TODO: what is the use of AgentExecuter
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    memory=memory
-)
\ No newline at end of file
+@functools.lru_cache(maxsize=None)
+def get_agent_executor() -> AgentExecutor:
+    """
+    Get the quotes video agent executor, creating the LLM client and agent on first use.
+
+    :return: The agent executor.
+    """
+    memory = ConversationBufferMemory(
+        memory_key="chat_history",
+        return_messages=True,
+    )
+
+    agent = create_openai_functions_agent(
+        llm_registry.get_model(llm_config.provider,
+                               llm_config.model_name,
+                               llm_config.api_key,),
+        tools=tools,
+        prompt=prompt
+    )
+
+    # TODO: what is the use of AgentExecuter
+    return AgentExecutor(
+        agent=agent,
+        tools=tools,
+        memory=memory
+    )
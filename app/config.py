@@ -12,6 +12,18 @@ class LLMConfig:
     model_name: str = os.getenv("LLM_MODEL", "gpt-4.1-mini")
     api_key: str = os.getenv("LLM_API_KEY", "")
     temperature: float = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+    max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    requests_per_minute: int = int(os.getenv("LLM_RPM", "0"))  # 0 disables the budget
+    tokens_per_minute: int = int(os.getenv("LLM_TPM", "0"))  # 0 disables the budget
+    expected_output_tokens: int = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1000"))
+    fallbacks: str = os.getenv("LLM_FALLBACKS", "")  # Comma separated provider:model routes tried after the primary
+    call_deadline_seconds: float = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "60"))
+    router_max_error_rate: float = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+    router_min_samples: int = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5"))
+    coalesce_calls: bool = os.getenv("LLM_COALESCE_CALLS", "true").lower() == "true"  # Share identical in-flight calls
+    http_max_connections: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    http_max_keepalive_connections: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    http_timeout_seconds: float = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120"))
 
 
 @dataclass(frozen=True)
@@ -19,6 +31,22 @@ class APIConfig:
     base_url: str = os.getenv("VIDEO_API_BASE_URL", "")
     api_key: str = os.getenv("VIDEO_API_KEY", "")
     server_api_key: str = os.getenv("SERVER_API_KEY", "default_secret_key")
+    connect_timeout_seconds: float = float(os.getenv("VIDEO_API_CONNECT_TIMEOUT_SECONDS", "5"))
+    read_timeout_seconds: float = float(os.getenv("VIDEO_API_READ_TIMEOUT_SECONDS", "120"))
+    max_retries: int = int(os.getenv("VIDEO_API_MAX_RETRIES", "3"))
+    retry_backoff_seconds: float = float(os.getenv("VIDEO_API_RETRY_BACKOFF_SECONDS", "0.5"))
+    max_connections: int = int(os.getenv("VIDEO_API_MAX_CONNECTIONS", "20"))
+    max_concurrency: int = int(os.getenv("VIDEO_API_MAX_CONCURRENCY", "4"))
+    bulkhead_wait_seconds: float = float(os.getenv("VIDEO_API_BULKHEAD_WAIT_SECONDS", "10"))
+    breaker_error_rate: float = float(os.getenv("VIDEO_API_BREAKER_ERROR_RATE", "0.5"))
+    breaker_slow_call_seconds: float = float(os.getenv("VIDEO_API_BREAKER_SLOW_CALL_SECONDS", "60"))
+    breaker_min_calls: int = int(os.getenv("VIDEO_API_BREAKER_MIN_CALLS", "5"))
+    breaker_window_seconds: float = float(os.getenv("VIDEO_API_BREAKER_WINDOW_SECONDS", "120"))
+    breaker_open_seconds: float = float(os.getenv("VIDEO_API_BREAKER_OPEN_SECONDS", "30"))
+    breaker_mode: str = os.getenv("VIDEO_API_BREAKER_MODE", "fail")  # 'fail' or 'defer'
+    request_compression: str = os.getenv("VIDEO_API_REQUEST_COMPRESSION", "")  # e.g. "videos/create-with-scenes=zstd,*=gzip"
+    compression_min_bytes: int = int(os.getenv("VIDEO_API_COMPRESSION_MIN_BYTES", "1024"))
+    deferred_path: str = os.getenv("VIDEO_API_DEFERRED_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "deferred_videos.jsonl"))
 
 
 @dataclass(frozen=True)
@@ -29,10 +57,67 @@ class StorageConfig:
     aws_secret_key: str = os.getenv("AWS_SECRET_KEY", "")
 
 
+@dataclass(frozen=True)
+class MCQConfig:
+    dedup_threshold: float = float(os.getenv("MCQ_DEDUP_THRESHOLD", "0.8"))
+    dedup_num_perm: int = int(os.getenv("MCQ_DEDUP_NUM_PERM", "64"))
+
+
+@dataclass(frozen=True)
+class GraphConfig:
+    checkpoint_ttl_seconds: float = float(os.getenv("GRAPH_CHECKPOINT_TTL_SECONDS", "3600"))
+    checkpoint_max_threads: int = int(os.getenv("GRAPH_CHECKPOINT_MAX_THREADS", "500"))
+    checkpoint_sqlite_path: str = os.getenv("GRAPH_CHECKPOINT_SQLITE_PATH", "")
+    batch_max_topics: int = int(os.getenv("GRAPH_BATCH_MAX_TOPICS", "100"))
+    batch_max_concurrency: int = int(os.getenv("GRAPH_BATCH_MAX_CONCURRENCY", "10"))
+    title_cache_path: str = os.getenv("TITLE_CACHE_PATH", "")
+    title_cache_ttl_seconds: float = float(os.getenv("TITLE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    title_cache_min_unused: int = int(os.getenv("TITLE_CACHE_MIN_UNUSED", "3"))
+
+
+@dataclass(frozen=True)
+class ThumbnailConfig:
+    enabled: bool = os.getenv("THUMBNAIL_ENABLED", "false").lower() == "true"
+    image_dir: str = os.getenv("THUMBNAIL_IMAGE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "thumbnails"))
+    model: str = os.getenv("THUMBNAIL_MODEL", "dall-e-3")
+    size: str = os.getenv("THUMBNAIL_SIZE", "1792x1024")  # Closest to 16:9 for YouTube thumbnails
+    quality: str = os.getenv("THUMBNAIL_QUALITY", "standard")
+    api_base_url: str = os.getenv("THUMBNAIL_API_BASE_URL", "")  # Empty uses the OpenAI default
+    timeout_seconds: float = float(os.getenv("THUMBNAIL_TIMEOUT_SECONDS", "120"))
+
+
+@dataclass(frozen=True)
+class BatchConfig:
+    backend: str = os.getenv("LLM_BATCH_BACKEND", "openai")  # openai, or local to run the requests in-process
+    batch_dir: str = os.getenv("LLM_BATCH_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "batches"))
+    poll_interval_seconds: float = float(os.getenv("LLM_BATCH_POLL_INTERVAL_SECONDS", "60"))
+    timeout_seconds: float = float(os.getenv("LLM_BATCH_TIMEOUT_SECONDS", str(24 * 3600)))
+    completion_window: str = os.getenv("LLM_BATCH_COMPLETION_WINDOW", "24h")
+
+
+@dataclass(frozen=True)
+class PromptConfig:
+    versions: str = os.getenv("PROMPT_VERSIONS", "")  # e.g. create_quotes=v2,create_description=v2
+    templates_path: str = os.getenv("PROMPT_TEMPLATES_PATH", "")  # Optional JSON file with more template versions
+
+
+@dataclass(frozen=True)
+class UsageConfig:
+    store_path: str = os.getenv("LLM_USAGE_STORE_PATH", "")  # .jsonl or .sqlite/.db file; empty keeps usage in memory only
+    flush_interval_seconds: float = float(os.getenv("LLM_USAGE_FLUSH_INTERVAL_SECONDS", "60"))
+    prices: str = os.getenv("LLM_PRICES", "")  # JSON {model: [input, cached input, output] USD per 1M tokens}, extends the defaults
+
+
 # Instantiate configuration objects
 llm_config = LLMConfig()
 api_config = APIConfig()
 storage_config = StorageConfig()
+mcq_config = MCQConfig()
+graph_config = GraphConfig()
+thumbnail_config = ThumbnailConfig()
+batch_config = BatchConfig()
+prompt_config = PromptConfig()
+usage_config = UsageConfig()
 
 # Ensure directories exist
 os.makedirs(storage_config.temp_file_path, exist_ok=True)
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.config import graph_config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    parent_checkpoint_id TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+_TABLES = ("checkpoints", "blobs", "writes", "threads")
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    A MemorySaver that keeps a bounded number of threads in memory.
+
+    Threads idle for longer than ``ttl_seconds`` are deleted, and once more than
+    ``max_threads`` threads are held the least recently used ones are evicted.
+    When ``sqlite_path`` is set every checkpoint is also written through to a
+    local SQLite file: LRU-evicted threads are offloaded there and loaded back
+    on their next access, and interrupted runs survive a process restart.
+    ``aput`` / ``aput_writes`` do those writes in a worker thread, so async
+    graph runs don't block the event loop on disk I/O.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 3600,
+        max_threads: int = 500,
+        sqlite_path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        if max_threads < 1:
+            raise ValueError(f"max_threads must be at least 1, got {max_threads}")
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Serializes use of the connection; the write-through of async runs happens in worker threads
+        self._db_lock = threading.Lock()
+        self._last_prune = 0.0
+        if sqlite_path:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_config(cls) -> "BoundedMemorySaver":
+        """Create a checkpointer from the GRAPH_CHECKPOINT_* settings."""
+        return cls(
+            ttl_seconds=graph_config.checkpoint_ttl_seconds,
+            max_threads=graph_config.checkpoint_max_threads,
+            sqlite_path=graph_config.checkpoint_sqlite_path or None,
+        )
+
+    @property
+    def thread_count(self) -> int:
+        """Number of threads currently held in memory."""
+        return len(self._last_access)
+
+    # -- eviction -----------------------------------------------------------
+
+    def _touch(self, thread_id: str) -> None:
+        with self._lock:
+            self._load_thread(thread_id)
+            self._last_access[thread_id] = time.time()
+            self._last_access.move_to_end(thread_id)
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        while self._last_access:
+            thread_id, last_access = next(iter(self._last_access.items()))
+            if now - last_access > self.ttl_seconds:
+                logger.info(f"Deleting checkpoint thread {thread_id} after TTL expiry")
+                self.delete_thread(thread_id)
+            elif len(self._last_access) > self.max_threads:
+                logger.info(f"Evicting least recently used checkpoint thread {thread_id}")
+                self._last_access.pop(thread_id)
+                super().delete_thread(thread_id)
+            else:
+                break
+        # Expired threads on disk are swept at most once a minute
+        if self._conn is not None and now - self._last_prune > min(60.0, self.ttl_seconds):
+            self._last_prune = now
+            self._prune_expired(now)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete all checkpoints and writes of a thread, in memory and on disk."""
+        with self._lock:
+            self._last_access.pop(thread_id, None)
+            super().delete_thread(thread_id)
+            if self._conn is not None:
+                with self._db_lock, self._conn:
+                    for table in _TABLES:
+                        self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # -- checkpointer interface ----------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self._touch(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any) -> Iterator[CheckpointTuple]:
+        if config is not None:
+            self._touch(config["configurable"]["thread_id"])
+        return super().list(config, **kwargs)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config, statements = self._put(config, checkpoint, metadata, new_versions)
+        self._execute(statements)
+        return next_config
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config, statements = self._put(config, checkpoint, metadata, new_versions)
+        if statements:
+            await asyncio.to_thread(self._execute, statements)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._execute(self._put_writes(config, writes, task_id, task_path))
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        statements = self._put_writes(config, writes, task_id, task_path)
+        if statements:
+            await asyncio.to_thread(self._execute, statements)
+
+    def _put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+             new_versions: ChannelVersions) -> Tuple[RunnableConfig, List[tuple]]:
+        """Save a checkpoint in memory and return the statements writing it through to SQLite."""
+        thread_id = config["configurable"]["thread_id"]
+        self._touch(thread_id)
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        if self._conn is None:
+            return next_config, []
+        return next_config, self._checkpoint_statements(
+            thread_id, config["configurable"]["checkpoint_ns"], checkpoint["id"], new_versions
+        )
+
+    def _put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                    task_path: str) -> List[tuple]:
+        """Save pending writes in memory and return the statements writing them through to SQLite."""
+        thread_id = config["configurable"]["thread_id"]
+        self._touch(thread_id)
+        super().put_writes(config, writes, task_id, task_path)
+        if self._conn is None:
+            return []
+        return self._writes_statements(
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+
+    # -- SQLite write-through -------------------------------------------------
+
+    def _checkpoint_statements(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                               new_versions: ChannelVersions) -> List[tuple]:
+        (checkpoint_type, checkpoint), (metadata_type, metadata), parent_id = (
+            self.storage[thread_id][checkpoint_ns][checkpoint_id]
+        )
+        return [
+            (
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint,
+                  metadata_type, metadata, parent_id)],
+            ),
+            (
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, checkpoint_ns, channel, str(version),
+                     *self.blobs[(thread_id, checkpoint_ns, channel, version)])
+                    for channel, version in new_versions.items()
+                ],
+            ),
+            ("INSERT OR REPLACE INTO threads VALUES (?, ?)", [(thread_id, time.time())]),
+        ]
+
+    def _writes_statements(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[tuple]:
+        writes = self.writes[(thread_id, checkpoint_ns, checkpoint_id)]
+        return [(
+            "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path)
+                for (_, idx), (task_id, channel, (value_type, value), task_path) in writes.items()
+            ],
+        )]
+
+    def _execute(self, statements: List[tuple]) -> None:
+        """Run (sql, rows) statements in one transaction."""
+        if not statements:
+            return
+        with self._db_lock, self._conn:
+            for sql, rows in statements:
+                self._conn.executemany(sql, rows)
+
+    def _load_thread(self, thread_id: str) -> None:
+        """Load an offloaded thread back into memory."""
+        if self._conn is None or self.storage.get(thread_id):
+            return
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, "
+                "parent_checkpoint_id FROM checkpoints WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+            if not rows:
+                return
+            blobs = self._conn.execute(
+                "SELECT checkpoint_ns, channel, version, type, value FROM blobs WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+            writes = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path "
+                "FROM writes WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+        for checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id in rows:
+            self.storage[thread_id][checkpoint_ns][checkpoint_id] = (
+                (checkpoint_type, checkpoint), (metadata_type, metadata), parent_id
+            )
+        for checkpoint_ns, channel, version, value_type, value in blobs:
+            self.blobs[(thread_id, checkpoint_ns, channel, version)] = (value_type, value)
+        for checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path in writes:
+            self.writes[(thread_id, checkpoint_ns, checkpoint_id)][(task_id, idx)] = (
+                task_id, channel, (value_type, value), task_path
+            )
+        logger.info(f"Loaded checkpoint thread {thread_id} from {len(rows)} stored checkpoints")
+
+    def _prune_expired(self, now: float) -> None:
+        with self._db_lock:
+            expired = [
+                thread_id
+                for (thread_id,) in self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?", (now - self.ttl_seconds,)
+                )
+            ]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
@@ -0,0 +1,184 @@
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from langchain_core.runnables import RunnableConfig
+
+from app.services.llm import track_usage
+from app.services.llm_usage import usage_labels
+from app.services.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class NodeMetrics:
+    """
+    In-memory per-node latency, token, retry and error metrics, with recent runs kept per thread
+    """
+
+    def __init__(self, max_threads: int = 500, max_samples: int = 1000):
+        """
+        :param max_threads: Number of most recent threads whose node runs are kept.
+        :param max_samples: Number of most recent latencies kept per node for percentiles.
+        """
+        self.max_threads = max_threads
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all recorded metrics."""
+        with self._lock:
+            self._nodes = defaultdict(self._new_node)
+            self._threads = OrderedDict()
+
+    def _new_node(self) -> dict:
+        return {
+            "count": 0,
+            "errors": 0,
+            "retries": 0,
+            "total_ms": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_input_tokens": 0,
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            "samples": deque(maxlen=self.max_samples),
+        }
+
+    def attempts(self, thread_id: str, node: str) -> int:
+        """
+        :return: How often the node already ran on the thread.
+        """
+        with self._lock:
+            runs = self._threads.get(thread_id, [])
+            return sum(1 for run in runs if run["node"] == node)
+
+    def record(
+        self,
+        node: str,
+        thread_id: str,
+        wall_ms: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        retry: bool = False,
+        error: str = None,
+        cached_input_tokens: int = 0,
+    ) -> None:
+        """
+        Record one node execution.
+
+        :param node: The node name.
+        :param thread_id: The thread the node ran on.
+        :param wall_ms: Wall time of the node in milliseconds.
+        :param input_tokens: LLM input tokens used by the node.
+        :param output_tokens: LLM output tokens used by the node.
+        :param retry: Whether the node already ran on this thread before.
+        :param error: The exception message if the node failed.
+        :param cached_input_tokens: Input tokens served from the provider's prompt cache.
+        """
+        with self._lock:
+            stats = self._nodes[node]
+            stats["count"] += 1
+            stats["errors"] += 1 if error else 0
+            stats["retries"] += 1 if retry else 0
+            stats["total_ms"] += wall_ms
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["cached_input_tokens"] += cached_input_tokens
+            stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, wall_ms)] += 1
+            stats["samples"].append(wall_ms)
+
+            runs = self._threads.setdefault(thread_id, [])
+            self._threads.move_to_end(thread_id)
+            runs.append({
+                "node": node,
+                "wall_ms": round(wall_ms, 1),
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cached_input_tokens": cached_input_tokens,
+                "retry": retry,
+                "error": error,
+            })
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def summary(self) -> dict:
+        """
+        :return: Per-node counts, error rate, retries, token totals (including cached input tokens),
+            latency percentiles and histogram.
+        """
+        with self._lock:
+            nodes = {name: dict(stats, samples=list(stats["samples"])) for name, stats in self._nodes.items()}
+
+        summary = {}
+        for name, stats in nodes.items():
+            labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+            summary[name] = {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "error_rate": stats["errors"] / stats["count"] if stats["count"] else 0.0,
+                "retries": stats["retries"],
+                "input_tokens": stats["input_tokens"],
+                "output_tokens": stats["output_tokens"],
+                "cached_input_tokens": stats["cached_input_tokens"],
+                "mean_ms": round(stats["total_ms"] / stats["count"], 1) if stats["count"] else 0.0,
+                "p50_ms": round(percentile(stats["samples"], 0.5), 1),
+                "p95_ms": round(percentile(stats["samples"], 0.95), 1),
+                "histogram_ms": dict(zip(labels, stats["buckets"])),
+            }
+        return summary
+
+    def thread(self, thread_id: str) -> list:
+        """
+        :return: The recorded node runs of a thread, in execution order.
+        """
+        with self._lock:
+            return list(self._threads.get(thread_id, []))
+
+
+node_metrics = NodeMetrics()
+
+
+def instrument_node(name: str, node):
+    """
+    Wrap an async graph node so each execution records its wall time, LLM token
+    usage (and prompt cache hits), retries and exceptions in ``node_metrics``, keyed by thread ID.
+
+    :param name: The node name used in the metrics.
+    :param node: The async node function taking the graph state.
+    :return: The wrapped node.
+    """
+    async def wrapper(state, config: RunnableConfig):
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        retry = node_metrics.attempts(thread_id, name) > 0
+        error = None
+        started = time.perf_counter()
+        with track_usage() as usage, usage_labels(node=name, project_id=state.get("project_id")):
+            try:
+                return await node(state)
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+                raise
+            finally:
+                wall_ms = (time.perf_counter() - started) * 1000
+                input_tokens = usage.input_tokens
+                output_tokens = usage.output_tokens
+                cached_input_tokens = usage.cached_input_tokens
+                node_metrics.record(
+                    name, thread_id, wall_ms, input_tokens, output_tokens, retry, error, cached_input_tokens
+                )
+                logger.info(
+                    f"Node {name} on thread {thread_id} took {wall_ms:.1f}ms "
+                    f"({input_tokens} input, {cached_input_tokens} cached / {output_tokens} output tokens)"
+                    + (f", failed: {error}" if error else "")
+                )
+
+    # Not functools.wraps: LangGraph inspects the signature to decide whether to pass the config
+    wrapper.__name__ = node.__name__
+    wrapper.__doc__ = node.__doc__
+    return wrapper
@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from app.config import graph_config
+from app.graphs import quotes_video_graph
+from app.graphs.quotes_video_graph import (
+    Description,
+    Quotes,
+    ThumbnailVisualDesc,
+    TitleCandidatesAndBest,
+    get_graph,
+    new_thread_config,
+)
+from app.services.llm_batch import BatchRunner
+from app.services.prompts import Prompts
+from app.services.topics import TOPICS
+
+logger = logging.getLogger(__name__)
+
+# asyncio primitives are bound to one event loop, so keep one semaphore per loop
+_run_slots = weakref.WeakKeyDictionary()
+
+
+def _run_slot() -> asyncio.Semaphore:
+    """
+    Get the semaphore capping batch graph runs in flight across all batches (GRAPH_BATCH_MAX_CONCURRENCY),
+    so the checkpointer never has to evict the threads of runs that are still going.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _run_slots.get(loop)
+    if semaphore is None:
+        semaphore = _run_slots[loop] = asyncio.Semaphore(graph_config.batch_max_concurrency)
+    return semaphore
+
+
+async def _run_topic(topic: str, project_id: str, variant: str) -> dict:
+    """
+    Run the quotes video graph for one topic on its own thread.
+
+    :param topic: The topic of the video.
+    :param project_id: The ID of the project for video creation.
+    :param variant: The graph variant to run.
+    :return: The per-topic result, with status "success" or "failed".
+    """
+    config = new_thread_config()
+    thread_id = config["configurable"]["thread_id"]
+    graph = get_graph(variant)
+    try:
+        async with _run_slot():
+            await graph.ainvoke({"topic": topic, "project_id": project_id, "variant": variant}, config=config)
+            values = (await graph.aget_state(config=config)).values
+        if not values.get("video_id"):
+            raise RuntimeError("Video was not created")
+    except Exception as e:
+        logger.error(f"Batch run for topic '{topic}' on thread {thread_id} failed: {str(e)}")
+        return {"topic": topic, "thread_id": thread_id, "status": "failed", "error": str(e)}
+
+    return {
+        "topic": topic,
+        "thread_id": thread_id,
+        "status": "success",
+        "title": values.get("best_title"),
+        "video_id": values["video_id"],
+        "video_url": values.get("video_url"),
+    }
+
+
+async def run_quotes_video_batch(topics: list[str], project_id: str, variant: str = "two_step") -> dict:
+    """
+    Run the quotes video graph for several topics concurrently.
+
+    At most GRAPH_BATCH_MAX_CONCURRENCY graphs run at once across all batches, all runs
+    share the process-wide LLM concurrency cap (LLM_MAX_CONCURRENCY), and a failing topic
+    does not affect the others.
+
+    :param topics: The topics to create videos for.
+    :param project_id: The ID of the project for video creation.
+    :param variant: The graph variant to run for every topic.
+    :return: Per-topic results, failure counts and throughput in videos per minute.
+    """
+    logger.info(f"Running quotes video batch of {len(topics)} topics for project {project_id}")
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_run_topic(topic, project_id, variant) for topic in topics))
+    elapsed_seconds = time.perf_counter() - started
+
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    videos_per_minute = succeeded / elapsed_seconds * 60 if elapsed_seconds > 0 else 0.0
+    logger.info(
+        f"Quotes video batch finished: {succeeded}/{len(topics)} videos in {elapsed_seconds:.1f}s "
+        f"({videos_per_minute:.2f} videos/min)"
+    )
+    return {
+        "project_id": project_id,
+        "results": list(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        "videos_per_minute": round(videos_per_minute, 3),
+    }
+
+
+# Per-topic stages of the offline batch; each stage only needs the output of the previous one
+OFFLINE_TITLE_STAGE = {"titles": (TitleCandidatesAndBest, Prompts.create_and_select_title_thumbnail_prompt)}
+OFFLINE_CONTENT_STAGE = {
+    "quotes": (Quotes, Prompts.create_quotes_prompt),
+    "description": (Description, Prompts.create_description_prompt),
+    "visual_desc": (ThumbnailVisualDesc, Prompts.create_thumbnail_visual_desc_prompt),
+}
+
+
+def _run_offline_stage(runner: BatchRunner, stage: dict, states: dict, failures: dict, name: str) -> None:
+    """
+    Submit one request per topic and step of a stage as a single batch and merge the
+    parsed responses into the topic states. Topics with a failed request move to failures.
+
+    :param runner: The batch runner.
+    :param stage: Step name -> (response schema, prompt factory).
+    :param states: Graph state per topic, updated in place.
+    :param failures: Error message per failed topic, updated in place.
+    :param name: Prefix of the batch files.
+    """
+    requests = [
+        runner.chat_request(f"{index}:{step}", prompt().invoke(state).to_messages(), schema)
+        for index, state in states.items()
+        for step, (schema, prompt) in stage.items()
+    ]
+    results = runner.run(requests, name=name)
+    for index in list(states):
+        try:
+            for step, (schema, _) in stage.items():
+                states[index].update(BatchRunner.parse(results.get(f"{index}:{step}"), schema).model_dump())
+        except Exception as e:
+            logger.error(f"Offline batch {name} stage for topic '{states[index]['topic']}' failed: {str(e)}")
+            failures[index] = str(e)
+            del states[index]
+
+
+async def _create_offline_video(state: dict) -> dict:
+    """
+    Create the video of one topic through the graph's create_video node.
+
+    :param state: The generated graph state of the topic.
+    :return: The per-topic result, with status "success" or "failed".
+    """
+    try:
+        values = await quotes_video_graph.create_video(state)
+        if not values.get("video_id"):
+            raise RuntimeError("Video was not created")
+    except Exception as e:
+        logger.error(f"Offline batch video for topic '{state['topic']}' failed: {str(e)}")
+        return {"topic": state["topic"], "status": "failed", "error": str(e)}
+    return {
+        "topic": state["topic"],
+        "status": "success",
+        "title": state["best_title"],
+        "video_id": values["video_id"],
+        "video_url": values.get("video_url"),
+    }
+
+
+async def run_quotes_video_offline_batch(topics: list[str], project_id: str, runner: BatchRunner = None) -> dict:
+    """
+    Generate the quotes videos of many topics through a provider batch API instead of
+    interactive calls, for bulk runs that don't need low latency.
+
+    The fused title request of every topic is submitted as one batch, then the quotes,
+    description and visual description requests as a second batch. The results feed the
+    graph's create_video node.
+
+    :param topics: The topics to create videos for.
+    :param project_id: The ID of the project for video creation.
+    :param runner: The batch runner (default: from the LLM_BATCH_* settings).
+    :return: Per-topic results and failure counts, like ``run_quotes_video_batch``.
+    """
+    runner = runner or BatchRunner.from_config()
+    logger.info(f"Running offline quotes video batch of {len(topics)} topics for project {project_id}")
+    started = time.perf_counter()
+    states = {index: {"topic": topic, "project_id": project_id} for index, topic in enumerate(topics)}
+    failures = {}
+
+    # Polling blocks for minutes to hours, so keep it off the event loop
+    await asyncio.to_thread(_run_offline_stage, runner, OFFLINE_TITLE_STAGE, states, failures, "quotes-titles")
+    for state in states.values():
+        quotes_video_graph.title_cache.mark_used(state["topic"], state["best_title"], state["best_thumbnail_text"])
+    if states:
+        await asyncio.to_thread(_run_offline_stage, runner, OFFLINE_CONTENT_STAGE, states, failures, "quotes-content")
+
+    videos = dict(zip(states, await asyncio.gather(*(_create_offline_video(state) for state in states.values()))))
+    results = [
+        videos.get(index) or {"topic": topic, "status": "failed", "error": failures.get(index)}
+        for index, topic in enumerate(topics)
+    ]
+    elapsed_seconds = time.perf_counter() - started
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    logger.info(f"Offline quotes video batch finished: {succeeded}/{len(topics)} videos in {elapsed_seconds:.1f}s")
+    return {
+        "project_id": project_id,
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+    }
+
+
+if __name__ == "__main__":
+    # Nightly bulk run, e.g.: python -m app.graphs.quotes_video_batch --project-id <id>
+    parser = argparse.ArgumentParser(description="Create quotes videos through the offline batch API")
+    parser.add_argument("--project-id", required=True, help="Project the videos are created for")
+    parser.add_argument("--topics", nargs="*", default=None, help="Topics to use (all topics by default)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(run_quotes_video_offline_batch(args.topics or TOPICS, args.project_id))
+    print(json.dumps(summary, indent=2))
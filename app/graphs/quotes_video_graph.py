@@ -1,8 +1,8 @@
 from typing import Annotated
 import json
-import os
-import requests  # Placeholder: Add necessary imports for image generation/saving
-import openai
+import time
+import uuid
+import functools
 import logging # Add logging import
 
 from typing_extensions import TypedDict
@@ -13,25 +13,29 @@ from langchain_core.prompts import ChatPromptTemplate
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import Command, interrupt
 
 from pydantic import BaseModel
 
-from app.services.llm import LLMService
-from app.config import llm_config
+from app.services.llm import llm_registry, llm_router, llm_concurrency, llm_rate_limiter
+from app.config import llm_config, thumbnail_config
 from app.tools.video_creation_tool import create_video_tool
-from app.services.prompts import Prompts # Import the Prompts class
+from app.services.prompts import Prompts, prompt_registry # Import the Prompts class
+from app.graphs.checkpointer import BoundedMemorySaver
+from app.graphs.instrumentation import instrument_node
+from app.services.title_cache import TitleCache
+from app.services.thumbnail_service import ThumbnailService
 
 logger = logging.getLogger(__name__) # Initialize logger for this module
 
-llm = LLMService(
-    llm_config.provider,
-    llm_config.model_name,
-    llm_config.api_key,
-)
+def get_llm_model():
+    """
+    Get the model used by the graph nodes: a router over the configured providers
+    that picks the healthiest one and fails over on errors and timeouts.
 
-llm_model = llm.model
+    :return: The process-wide LLM router.
+    """
+    return llm_router
 
 
 @tool
@@ -43,9 +47,30 @@ def human_assistance(query: str) -> str:
 
 tools = [create_video_tool, human_assistance]
 
-llm_with_tools = llm_model.bind_tools(tools)
 
-memory = MemorySaver()
+@functools.lru_cache(maxsize=None)
+def get_llm_with_tools():
+    """
+    Get the chat model with the graph tools bound, creating it on first use.
+
+    :return: The chat model bound to ``tools``.
+    """
+    return llm_registry.get_model(
+        llm_config.provider,
+        llm_config.model_name,
+        llm_config.api_key,
+        llm_config.temperature,
+    ).bind_tools(tools)
+
+
+# Bounded by GRAPH_CHECKPOINT_TTL_SECONDS / GRAPH_CHECKPOINT_MAX_THREADS so long-lived workers don't grow forever
+memory = BoundedMemorySaver.from_config()
+
+# Reuses generated title/thumbnail candidates per topic and remembers which were used
+title_cache = TitleCache.from_config()
+
+# Thumbnail images stored by visual description hash (THUMBNAIL_* settings)
+thumbnail_service = ThumbnailService.from_config()
 
 
 class TitleAndThumbnailTextLists(BaseModel):
@@ -58,6 +83,13 @@ class BestTitleAndThumbnailText(BaseModel):
     best_title: str
 
 
+class TitleCandidatesAndBest(BaseModel):
+    titles: list[str]
+    thumbnail_text_list: list[str]
+    best_title: str
+    best_thumbnail_text: str
+
+
 class Quotes(BaseModel):
     quotes: list[str]
 
@@ -91,9 +123,17 @@ class State(TypedDict):
     thumbnail_image_path: str  # Add path for the generated thumbnail image
     video_id: str
     video_url: str
+    variant: str  # Graph variant the thread runs on, so a resume replays it on the same graph
+
 
+def new_thread_config(thread_id: str = None) -> dict:
+    """
+    Build the run config for a graph thread.
 
-graph_builder = StateGraph(State)
+    :param thread_id: An existing thread ID to resume, or None to start a new, isolated thread.
+    :return: The config to pass to graph.invoke / graph.get_state.
+    """
+    return {"configurable": {"thread_id": thread_id or str(uuid.uuid4())}}
 
 
 class BasicToolNode:
@@ -126,132 +166,111 @@ class BasicToolNode:
 tool_node = BasicToolNode(tools=tools)
 
 
-def create_titles_and_thumbnail_texts(state: State):
-    prompt_template = Prompts.create_titles_thumbnails_prompt()
-    structure_llm = llm_model.with_structured_output(TitleAndThumbnailTextLists)
+async def _ainvoke_structured(schema: type[BaseModel], prompt_template: ChatPromptTemplate, state: State):
+    """
+    Render a prompt from the state and call the LLM asynchronously with structured output.
+
+    :param schema: The pydantic model the response is parsed into.
+    :param prompt_template: The prompt template to render with the state.
+    :param state: The current graph state.
+    :return: An instance of the schema.
+    """
+    structured_llm = llm_registry.structured(get_llm_model(), schema)
     msg = prompt_template.invoke(state).to_messages()
-    response = structure_llm.invoke(msg)
+    # Queue fairly per project for the RPM/TPM budgets, then take one of the shared in-flight slots
+    async with llm_rate_limiter.alimit(state.get("project_id"), llm_rate_limiter.estimate_tokens(msg)):
+        async with llm_concurrency.slot():
+            return await structured_llm.ainvoke(msg)
 
-    return {
-        "titles": response.titles,
-        "thumbnail_text_list": response.thumbnail_text_list,
-    }
 
+async def create_titles_and_thumbnail_texts(state: State):
+    """
+    Create title and thumbnail text candidates, reusing the topic's cached pool while it is fresh.
+    Only candidates that were not used for an earlier video are returned.
+    """
+    if pool := title_cache.get_pool(state["topic"]):
+        logger.info(f"Reusing {len(pool['titles'])} cached unused titles for topic {state['topic']}")
+        return pool
 
-def find_best_title_and_thumbnail_text(state: State):
+    response = await _ainvoke_structured(
+        TitleAndThumbnailTextLists, Prompts.create_titles_thumbnails_prompt(), state
+    )
+    return await title_cache.astore_pool(state["topic"], response.titles, response.thumbnail_text_list)
+
+
+async def find_best_title_and_thumbnail_text(state: State):
     """
     Find the best title and thumbnail text based on the given criteria.
     """
-    prompt_template = Prompts.find_best_title_thumbnail_prompt()
+    response = await _ainvoke_structured(
+        BestTitleAndThumbnailText, Prompts.find_best_title_thumbnail_prompt(), state
+    )
+    await title_cache.amark_used(state["topic"], response.best_title, response.best_thumbnail_text)
+    return {
+        "best_title": response.best_title,
+        "best_thumbnail_text": response.best_thumbnail_text,
+    }
 
-    structured_llm = llm_model.with_structured_output(BestTitleAndThumbnailText)
-    msg = prompt_template.invoke(state).to_messages()
-    response = structured_llm.invoke(msg)
+
+async def create_and_select_title_and_thumbnail_text(state: State):
+    """
+    Generate the title and thumbnail text candidates and pick the best ones in a single LLM call.
+    Used by the "fused" graph variant in place of the two separate title nodes.
+    """
+    response = await _ainvoke_structured(
+        TitleCandidatesAndBest, Prompts.create_and_select_title_thumbnail_prompt(), state
+    )
+    await title_cache.amark_used(state["topic"], response.best_title, response.best_thumbnail_text)
     return {
+        "titles": response.titles,
+        "thumbnail_text_list": response.thumbnail_text_list,
         "best_title": response.best_title,
         "best_thumbnail_text": response.best_thumbnail_text,
     }
 
 
-def create_quotes(state: State):
+async def create_quotes(state: State):
     """
     Create a list of quotes based on the given topic.
     """
-    prompt_template = Prompts.create_quotes_prompt()
-    structured_llm = llm_model.with_structured_output(Quotes)
-    msg = prompt_template.invoke(state).to_messages()
-    response = structured_llm.invoke(msg)
+    response = await _ainvoke_structured(Quotes, Prompts.create_quotes_prompt(), state)
     return {"quotes": response.quotes}
 
 
-def create_thumbnail_visual_desc(state: State):
+async def create_thumbnail_visual_desc(state: State):
     """
     Create a visual description for the thumbnail based on the given topic.
     """
-    prompt_template = Prompts.create_thumbnail_visual_desc_prompt()
-    structured_llm = llm_model.with_structured_output(ThumbnailVisualDesc)
-    msg = prompt_template.invoke(state).to_messages()
-    response = structured_llm.invoke(msg)
+    response = await _ainvoke_structured(
+        ThumbnailVisualDesc, Prompts.create_thumbnail_visual_desc_prompt(), state
+    )
     return {"thumbnail_visual_desc": response.thumbnail_visual_desc}
 
 
-def create_thumbnail_image(state: State):
+async def create_thumbnail_image(state: State):
     """
-    Generates an image based on the thumbnail visual description using OpenAI DALL-E
-    and saves it locally.
+    Generates the thumbnail image from the visual description. Images are stored
+    under a hash of the description, so repeated descriptions reuse the stored image.
     """
-    desc = state["thumbnail_visual_desc"]
-    topic = state["topic"]
-    image_filename = f"{topic.replace(' ', '_')}_thumbnail.png"
-    # Ensure the data directory exists
-    data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'data') # Adjust path as needed
-    os.makedirs(data_dir, exist_ok=True)
-    image_path = os.path.join(data_dir, image_filename)
-
-    print(f"Generating image for: {desc}")
-    print(f"Saving image to: {image_path}")
-
+    logger.info(">>> Entering create_thumbnail_image node")
     try:
-        # Assuming llm_config.api_key holds the OpenAI API key
-        client = openai.OpenAI(api_key=llm_config.api_key)
-
-        response = client.images.generate(
-            model="dall-e-3",  # Or "dall-e-2" if preferred/available
-            prompt=desc,
-            size="1792x1024", # Closest to 16:9 aspect ratio for YouTube thumbnails
-            quality="standard", # Or "hd"
-            n=1,
-        )
-
-        image_url = response.data[0].url
-        print(f"Image generated, URL: {image_url}")
-
-        # Download the image from the URL
-        image_response = requests.get(image_url, stream=True)
-        image_response.raise_for_status() # Raise an exception for bad status codes
-
-        # Save the image content to the file
-        with open(image_path, 'wb') as f:
-            for chunk in image_response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print("Image downloaded and saved successfully.")
-
-    except openai.APIError as e:
-        print(f"OpenAI API returned an API Error: {e}")
-        # Handle error appropriately, maybe raise or return an error state
-        # Create an empty file as a fallback for now
-        with open(image_path, 'w') as f:
-            f.write(f"Error generating image: {e}")
-        print("Fallback empty image file created due to API error.")
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading image: {e}")
-        # Handle error appropriately
-        with open(image_path, 'w') as f:
-            f.write(f"Error downloading image: {e}")
-        print("Fallback empty image file created due to download error.")
+        image_path = await thumbnail_service.get_or_create(state["thumbnail_visual_desc"])
     except Exception as e:
-        print(f"An unexpected error occurred during image generation/saving: {e}")
-        # Handle unexpected errors
-        with open(image_path, 'w') as f:
-            f.write(f"Unexpected error: {e}")
-        print("Fallback empty image file created due to unexpected error.")
-
-
+        # The video can still be created without a generated image
+        logger.error(f"Error generating thumbnail image: {str(e)}")
+        return {"thumbnail_image_path": ""}
     return {"thumbnail_image_path": image_path}
 
 
-def create_description(state: State):
+async def create_description(state: State):
     """
     Create a description for the video based on the given topic.
     """
-    prompt_template = Prompts.create_description_prompt()
-    structured_llm = llm_model.with_structured_output(Description)
-    msg = prompt_template.invoke(state).to_messages()
-    response = structured_llm.invoke(msg)
+    response = await _ainvoke_structured(Description, Prompts.create_description_prompt(), state)
     return {"description": response.description}
 
 
-def create_video(state: State):
+async def create_video(state: State):
     logger.info(">>> Entering create_video node")
 
     # --- Input Validation Start ---
@@ -275,7 +294,8 @@ def create_video(state: State):
 
     logger.info(f"Current state before invoking video tool: {state}") # Log state
 
-    resp = create_video_tool.invoke(
+    # ainvoke uses the tool's async variant, so the HTTP call doesn't hold an executor thread
+    resp = await create_video_tool.ainvoke(
         input={
             "title": state["best_title"],
             "desc": state["description"],
@@ -296,7 +316,7 @@ def create_video(state: State):
 def chatbot(state: State):
     print("State:", state)
     print("Messages:", state["messages"])
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+    return {"messages": [get_llm_with_tools().invoke(state["messages"])]}
 
 
 def route_tools(
@@ -325,43 +345,145 @@ def route_tools(
     return END
 
 
-# The first argument is the unique node name
-# The second argument is the function or object that will be called whenever
-# the node is used.
-graph_builder.add_node(
-    "create_titles_thumbnails_list", create_titles_and_thumbnail_texts
-)
-graph_builder.add_node(
-    "find_best_title_thumbnail_text", find_best_title_and_thumbnail_text
-)
-
-graph_builder.add_node("create_quotes", create_quotes)
-graph_builder.add_node("create_thumbnail_visual_desc", create_thumbnail_visual_desc)
-graph_builder.add_node("create_description", create_description)
-# graph_builder.add_node("create_thumbnail_image", create_thumbnail_image) 
-graph_builder.add_node("create_video", create_video)
-
-
-graph_builder.add_edge(START, "create_titles_thumbnails_list")
-graph_builder.add_edge(
-    "create_titles_thumbnails_list", "find_best_title_thumbnail_text"
-)
-# Edges from find_best_title_thumbnail_text to parallel tasks
-graph_builder.add_edge("find_best_title_thumbnail_text", "create_quotes")
-graph_builder.add_edge("find_best_title_thumbnail_text", "create_thumbnail_visual_desc")
-graph_builder.add_edge("find_best_title_thumbnail_text", "create_description")
-
-# Edges leading to create_video
-graph_builder.add_edge("create_quotes", "create_video")
-graph_builder.add_edge("create_description", "create_video")
-graph_builder.add_edge("create_thumbnail_visual_desc", "create_video")
-# Ensure create_video runs after the visual description is created (as the tool needs it)
-# and after the image generation step completes.
-# TODO: disabling this for now as we are not creating the image automatically
-# graph_builder.add_edge("create_thumbnail_image", "create_video") # Ensure image generation finishes first
-
-graph_builder.add_edge("create_video", END)
-
-
-graph = graph_builder.compile(checkpointer=memory)
-print(graph.get_graph().draw_ascii())
+GRAPH_VARIANTS = ("two_step", "fused")
+
+
+def build_graph(variant: str = "two_step", thumbnail_image: bool = None) -> StateGraph:
+    """
+    Build the quotes video graph.
+
+    :param variant: "two_step" generates title/thumbnail candidates and picks the best
+        in two LLM calls; "fused" does both in a single structured-output call.
+    :param thumbnail_image: Whether to generate the thumbnail image; defaults to THUMBNAIL_ENABLED.
+    :return: The uncompiled graph builder.
+    """
+    if thumbnail_image is None:
+        thumbnail_image = thumbnail_config.enabled
+    if variant not in GRAPH_VARIANTS:
+        raise ValueError(f"Unsupported graph variant: {variant}")
+    # Fail at startup rather than mid-run when a selected prompt version uses a variable the state lacks
+    prompt_registry.validate(State.__annotations__)
+
+    graph_builder = StateGraph(State)
+
+    # The first argument is the unique node name
+    # The second argument is the function or object that will be called whenever
+    # the node is used. Every node records its latency, tokens, retries and errors.
+    def add_node(name, node):
+        graph_builder.add_node(name, instrument_node(name, node))
+
+    if variant == "fused":
+        title_node = "create_and_select_title_thumbnail_text"
+        add_node(title_node, create_and_select_title_and_thumbnail_text)
+        graph_builder.add_edge(START, title_node)
+    else:
+        title_node = "find_best_title_thumbnail_text"
+        add_node("create_titles_thumbnails_list", create_titles_and_thumbnail_texts)
+        add_node(title_node, find_best_title_and_thumbnail_text)
+        graph_builder.add_edge(START, "create_titles_thumbnails_list")
+        graph_builder.add_edge("create_titles_thumbnails_list", title_node)
+
+    add_node("create_quotes", create_quotes)
+    add_node("create_thumbnail_visual_desc", create_thumbnail_visual_desc)
+    add_node("create_description", create_description)
+    add_node("create_video", create_video)
+
+    # Edges from the best title/thumbnail text to parallel tasks
+    graph_builder.add_edge(title_node, "create_quotes")
+    graph_builder.add_edge(title_node, "create_thumbnail_visual_desc")
+    graph_builder.add_edge(title_node, "create_description")
+
+    # Edges leading to create_video
+    if thumbnail_image:
+        # The image is generated while quotes and description are still running;
+        # create_video waits for all three branches
+        add_node("create_thumbnail_image", create_thumbnail_image)
+        graph_builder.add_edge("create_thumbnail_visual_desc", "create_thumbnail_image")
+        graph_builder.add_edge(
+            ["create_quotes", "create_description", "create_thumbnail_image"], "create_video"
+        )
+    else:
+        graph_builder.add_edge("create_quotes", "create_video")
+        graph_builder.add_edge("create_description", "create_video")
+        graph_builder.add_edge("create_thumbnail_visual_desc", "create_video")
+
+    graph_builder.add_edge("create_video", END)
+    return graph_builder
+
+
+@functools.lru_cache(maxsize=None)
+def get_graph(variant: str = "two_step"):
+    """
+    Get the compiled quotes video graph, compiling it on first use.
+
+    Both variants share the checkpointer; thread IDs are unique per run.
+
+    :param variant: The graph variant, see ``build_graph``.
+    :return: The compiled graph.
+    """
+    return build_graph(variant).compile(checkpointer=memory)
+
+
+async def aget_thread_graph(config: dict):
+    """
+    Get the compiled graph a thread was started on, from the variant saved in its checkpoint.
+
+    :param config: The thread config from new_thread_config.
+    :return: The compiled graph, or None if the thread has no checkpoint.
+    """
+    checkpoint = await memory.aget_tuple(config)
+    if checkpoint is None:
+        return None
+    # Threads checkpointed before the variant was saved all ran the default graph
+    return get_graph(checkpoint.checkpoint["channel_values"].get("variant") or "two_step")
+
+
+def warm_up() -> None:
+    """
+    Create the chat models of every route and compile every graph variant (and its prompts)
+    ahead of the first request.
+    """
+    for route in llm_router.routes:
+        llm_router.model_for(route)
+    for variant in GRAPH_VARIANTS:
+        get_graph(variant)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Quotes video graph:\n" + get_graph().get_graph().draw_ascii())
+
+
+async def astream_progress(inputs: dict, config: dict, variant: str = "two_step"):
+    """
+    Run the graph and yield a progress event as each node finishes.
+
+    Node events carry the node's state update plus the elapsed time since the run
+    started and since the previous event; a final ``done`` or ``error`` event ends the stream.
+
+    :param inputs: The graph input (topic and project_id); the variant is added to it.
+    :param config: The run config from new_thread_config.
+    :param variant: The graph variant to run.
+    :return: An async iterator of event dicts.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    started = previous = time.perf_counter()
+    try:
+        async for update in get_graph(variant).astream({**inputs, "variant": variant}, config=config, stream_mode="updates"):
+            now = time.perf_counter()
+            for node, output in update.items():
+                yield {
+                    "event": "node",
+                    "thread_id": thread_id,
+                    "node": node,
+                    "output": output,
+                    "elapsed_ms": round((now - started) * 1000, 1),
+                    "step_ms": round((now - previous) * 1000, 1),
+                }
+            previous = now
+    except Exception as e:
+        logger.error(f"Graph run on thread {thread_id} failed: {str(e)}")
+        yield {"event": "error", "thread_id": thread_id, "error": str(e)}
+        return
+    yield {
+        "event": "done",
+        "thread_id": thread_id,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
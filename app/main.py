@@ -1,17 +1,25 @@
 from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+import json
+import asyncio
 import logging
 
 from langgraph.types import Command
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal
 
-from app.agents.quotes_video_agent import agent_executor
-from app.graphs.quotes_video_graph import graph
-from app.config import api_config  # Import api_config
-from app.services.topics import get_random_topic
+from app.graphs.quotes_video_graph import get_graph, aget_thread_graph, new_thread_config, astream_progress, warm_up
+from app.config import api_config, graph_config  # Import api_config
+from app.graphs.quotes_video_batch import run_quotes_video_batch
+from app.graphs.instrumentation import node_metrics
+from app.services.llm import llm_rate_limiter, llm_router
+from app.services.llm_usage import llm_usage, usage_labels
+from app.services.topics import get_random_topic, get_random_topics
 from app.services.mcq_service import MCQService
+from app.services.mcq_stream import astream_mcqs
+from app.services.video_http_client import VideoHttpClient, CircuitOpenError, BulkheadFullError, video_breaker
 
 
 
@@ -72,14 +80,43 @@ async def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(sec
         )
     return credentials
 
+# Dependency to fail fast while the video API is down
+async def require_video_api():
+    """
+    Reject requests that end in a video submission while the video API circuit is open,
+    before any LLM work is done. In 'defer' mode the submissions are queued instead.
+    """
+    if api_config.breaker_mode == "fail" and not video_breaker.accepting():
+        retry_after = video_breaker.retry_after()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Video API is unavailable, retry in {retry_after:.0f}s",
+            headers={"Retry-After": str(max(int(retry_after), 1))},
+        )
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    video_api = VideoHttpClient.health()
+    return {
+        "status": "healthy" if video_api["circuit"]["state"] == "closed" else "degraded",
+        "video_api": video_api,
+    }
 
 
 class GraphRequest(BaseModel):
     topic: str = None  # Make topic optional
     project_id: str  # Add project_id field
+    thread_id: str = None  # Optional, reuse an earlier run's thread to resume it
+    variant: Literal['two_step', 'fused'] = 'two_step'  # 'fused' picks the title in the same LLM call
+
+class GraphResumeRequest(BaseModel):
+    thread_id: str  # Thread of the failed run; the variant is read back from its checkpoint
+
+class GraphBatchRequest(BaseModel):
+    project_id: str
+    topics: list[str] = Field(None, min_length=1, max_length=graph_config.batch_max_topics)  # Topics to create videos for
+    count: int = Field(None, gt=0, le=graph_config.batch_max_topics)  # Or pick this many random topics when topics is not given
+    variant: Literal['two_step', 'fused'] = 'two_step'
 
 class MCQRequest(BaseModel):
     project_id: str
@@ -93,25 +130,158 @@ class ConversationRequest(BaseModel):
     video_type: Literal['message','mcq']
     context: dict = None
 
-@app.post("/graph", dependencies=[Depends(verify_api_key)]) # Add dependency here
-async def get_graph(request: GraphRequest):
+@app.post("/graph", dependencies=[Depends(verify_api_key), Depends(require_video_api)]) # Add dependency here
+async def run_graph(request: GraphRequest):
+    """
+    Run the quotes video graph. Requires API Key authentication.
+    """
+    # Each request gets its own checkpoint thread so concurrent runs don't share state
+    config = new_thread_config(request.thread_id)
+    logger.info(f"Running quotes video graph on thread {config['configurable']['thread_id']}")
+
+    graph = get_graph(request.variant)
+
+    try:
+        # Pass project_id along with topic; the async nodes let the parallel branches overlap
+        with usage_labels(endpoint="/graph", project_id=request.project_id):
+            await graph.ainvoke(
+                {
+                    # Use the provided topic if available, otherwise pick a random one
+                    "topic": request.topic if request.topic else get_random_topic(),
+                    "project_id": request.project_id,
+                    "variant": request.variant,
+                },
+                config=config,
+            )
+    except Exception as e:
+        logger.error(f"Graph run on thread {config['configurable']['thread_id']} failed: {str(e)}")
+        # Return the thread ID so the caller can resume from the failed node via /graph/resume
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"message": f"Graph run failed: {str(e)}", "thread_id": config["configurable"]["thread_id"]},
+        )
+    return await graph.aget_state(config=config)
+
+@app.post("/graph/resume", dependencies=[Depends(verify_api_key), Depends(require_video_api)])
+async def resume_graph(request: GraphResumeRequest):
+    """
+    Resume a failed graph run from its last good checkpoint. Only the failed
+    node and the nodes downstream of it run again; nodes that already
+    succeeded (titles, quotes, description, visual description) are not repeated.
+    """
+    config = new_thread_config(request.thread_id)
+    graph = await aget_thread_graph(config)
+    snapshot = await graph.aget_state(config=config) if graph else None
+    if not snapshot or not snapshot.values:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No checkpoint found for thread {request.thread_id}",
+        )
+    if not snapshot.next:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Thread {request.thread_id} has already completed",
+        )
+
+    logger.info(f"Resuming thread {request.thread_id} at nodes {snapshot.next}")
+    try:
+        # A None input continues the thread from its last checkpoint
+        with usage_labels(endpoint="/graph/resume", project_id=snapshot.values.get("project_id")):
+            await graph.ainvoke(None, config=config)
+    except Exception as e:
+        logger.error(f"Resumed graph run on thread {request.thread_id} failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"message": f"Graph run failed: {str(e)}", "thread_id": request.thread_id},
+        )
+    return await graph.aget_state(config=config)
+
+@app.post("/graph/stream", dependencies=[Depends(verify_api_key), Depends(require_video_api)])
+async def stream_graph(request: GraphRequest):
+    """
+    Run the quotes video graph and stream each node's output as it finishes.
+    The response is newline-delimited JSON: one "node" event per finished node
+    (titles, best title, quotes, description, visual description, video ID),
+    followed by a "done" or "error" event.
+    """
+    config = new_thread_config(request.thread_id)
+    inputs = {
+        "topic": request.topic if request.topic else get_random_topic(),
+        "project_id": request.project_id,
+    }
+    logger.info(f"Streaming quotes video graph on thread {config['configurable']['thread_id']}")
+
+    async def events():
+        with usage_labels(endpoint="/graph/stream", project_id=request.project_id):
+            async for event in astream_progress(inputs, config, request.variant):
+                yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/graph/batch", dependencies=[Depends(verify_api_key), Depends(require_video_api)])
+async def run_graph_batch(request: GraphBatchRequest):
     """
-    Get the graph of the agent. Requires API Key authentication.
+    Run the quotes video graph for many topics concurrently under the shared
+    LLM concurrency cap. Returns per-topic results and failures plus the
+    aggregate throughput in videos per minute.
     """
-    config = {"configurable": {"thread_id": "1"}}
+    topics = request.topics or (get_random_topics(request.count) if request.count else [])
+    if not topics:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either a list of topics or a positive count of random topics.",
+        )
+    with usage_labels(endpoint="/graph/batch", project_id=request.project_id):
+        return await run_quotes_video_batch(topics, request.project_id, request.variant)
 
-    # Pass project_id along with topic
-    graph.invoke(
-        {
-            # Use the provided topic if available, otherwise pick a random one
-            "topic": request.topic if request.topic else get_random_topic(),
-            "project_id": request.project_id,
-        },
-        config=config,
-    )
-    return graph.get_state(config=config)
+@app.get("/metrics/nodes", dependencies=[Depends(verify_api_key)])
+async def graph_node_metrics(thread_id: str = None):
+    """
+    Get per-node latency, token, retry and error metrics of the quotes video graph.
+    With a thread_id, returns that thread's node runs in execution order instead.
+    """
+    if thread_id:
+        runs = node_metrics.thread(thread_id)
+        if not runs:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No node metrics recorded for thread {thread_id}",
+            )
+        return {"thread_id": thread_id, "nodes": runs}
+    return node_metrics.summary()
 
-@app.post("/mcq", dependencies=[Depends(verify_api_key)]) # Add dependency here
+@app.get("/metrics/llm-rate-limit", dependencies=[Depends(verify_api_key)])
+async def llm_rate_limit_stats():
+    """
+    Get the LLM request/token budgets, remaining capacity, queued calls per project
+    and how long calls waited in the queue.
+    """
+    return llm_rate_limiter.stats()
+
+@app.get("/metrics/llm-routes", dependencies=[Depends(verify_api_key)])
+async def llm_route_stats():
+    """
+    Get the per-provider error rate and p95 latency the LLM router uses, and its current routing order.
+    """
+    return llm_router.stats()
+
+@app.get("/metrics/llm-usage", dependencies=[Depends(verify_api_key)])
+async def llm_usage_stats(project_id: str = None, endpoint: str = None, node: str = None,
+                          group_by: str = "project_id,endpoint,node"):
+    """
+    Get LLM calls, prompt/cached/completion tokens, cost in USD and p50/p95 latency,
+    optionally filtered by project_id, endpoint and graph node. group_by is a comma
+    separated subset of project_id, endpoint, node and model.
+    """
+    try:
+        groups = llm_usage.summary(
+            project_id, endpoint, node, tuple(key.strip() for key in group_by.split(",") if key.strip())
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"groups": groups}
+
+@app.post("/mcq", dependencies=[Depends(verify_api_key), Depends(require_video_api)]) # Add dependency here
 async def create_mcq(req: MCQRequest):
     """
     Create MCQs from provided files and prompts. 
@@ -127,17 +297,23 @@ async def create_mcq(req: MCQRequest):
         logger.info(f"MCQ generation requested for project: {req.project_id}")
         logger.info(f"Processing {len(req.asset_files)} asset files")
         
-        # Process the request using static method
-        result = MCQService.process_mcq_request(
-            project_id=req.project_id,
-            system_prompt=req.system_prompt,
-            asset_files=req.asset_files,
-            user_prompt=req.user_prompt
-        )
+        # The MCQ path blocks on OCR, the rate limiter and the video API, so run it in a worker
+        # thread; to_thread copies the context, so the usage labels still apply there
+        with usage_labels(endpoint="/mcq", project_id=req.project_id):
+            result = await asyncio.to_thread(
+                MCQService.process_mcq_request,
+                project_id=req.project_id,
+                system_prompt=req.system_prompt,
+                asset_files=req.asset_files,
+                user_prompt=req.user_prompt
+            )
         
         logger.info(f"MCQ generation complete for project: {req.project_id}")
         return result
     
+    except (CircuitOpenError, BulkheadFullError) as e:
+        logger.error(f"Video API rejected the MCQ video: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"Error in MCQ generation: {str(e)}")
         raise HTTPException(
@@ -145,6 +321,51 @@ async def create_mcq(req: MCQRequest):
             detail=f"MCQ generation failed: {str(e)}"
         )
 
+@app.post("/mcq/stream", dependencies=[Depends(verify_api_key), Depends(require_video_api)])
+async def stream_mcq(req: MCQRequest):
+    """
+    Create MCQs like /mcq, streaming each question as soon as it has been generated and validated.
+    The response is newline-delimited JSON: one "question" event per valid question ("invalid" for
+    ones that failed validation), a "done" event with the full list, then a "video" event once the
+    video was created, or an "error" event.
+    """
+    logger.info(f"Streaming MCQ generation for project: {req.project_id}")
+
+    async def events():
+        try:
+            with usage_labels(endpoint="/mcq/stream", project_id=req.project_id):
+                combined_text, downloaded_files = await asyncio.to_thread(
+                    MCQService._extract_asset_texts, req.project_id, req.asset_files
+                )
+                mcqs = None
+                async for event in astream_mcqs(
+                    req.system_prompt, combined_text, req.user_prompt, project_id=req.project_id
+                ):
+                    if event["event"] == "done":
+                        mcqs = event.pop("mcqs")
+                        event["processed_files"] = len(downloaded_files)
+                    yield json.dumps(event, default=str) + "\n"
+            if mcqs is None:
+                return
+            video_result, _, duplicates = await asyncio.to_thread(
+                MCQService.create_mcq_video, req.project_id, mcqs.raw
+            )
+            yield json.dumps(
+                {"event": "video", "result": video_result, "duplicates_removed": len(duplicates)}, default=str
+            ) + "\n"
+        except Exception as e:
+            logger.error(f"Error in streamed MCQ generation: {str(e)}")
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/mcq/repair-stats", dependencies=[Depends(verify_api_key)])
+async def mcq_repair_stats():
+    """
+    Get how often MCQ structured output failed validation and was repaired.
+    """
+    return MCQService.get_repair_stats()
+
 @app.post("/conversation", dependencies=[Depends(verify_api_key)])
 async def conversation(req:ConversationRequest):
     """
@@ -170,6 +391,11 @@ async def conversation(req:ConversationRequest):
 
 @app.on_event("startup")
 def startup_event():
+    # The LLM client and graphs are created lazily; build them now so the first request doesn't pay for it
+    try:
+        warm_up()
+    except Exception as e:
+        logger.error(f"Error warming up the quotes video graph: {str(e)}")
     logger.info("Agent is running on http://localhost:8000")
     # Log all routes
     for route in app.routes:
@@ -179,5 +405,9 @@ def startup_event():
 @app.on_event("shutdown")
 def shutdown_event():
     logger.info("Agent is shutting down...")
+    try:
+        llm_usage.flush()
+    except Exception as e:
+        logger.error(f"Error flushing LLM usage records: {str(e)}")
     # Clean up resources or perform shutdown tasks here
     # For example, closing database connections or stopping background tasks
@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field
 from typing import List
 
+MCQ_MIN_QUESTIONS = 20
+MCQ_MAX_QUESTIONS = 30
+
 class MCQOption(BaseModel):
     text: str
     isCorrect: bool
@@ -16,5 +19,9 @@ class MCQQuestion(BaseModel):
     explanationDescription: str
 
 class MCQList(BaseModel):
-    count: int = Field(..., ge=20, le=30, description="Number of MCQ questions to generate")
-    raw: List[MCQQuestion] = Field(..., min_length=20, max_length=30, description="List of 10-30 MCQ questions")
+    count: int = Field(..., ge=MCQ_MIN_QUESTIONS, le=MCQ_MAX_QUESTIONS, description="Number of MCQ questions to generate")
+    raw: List[MCQQuestion] = Field(..., min_length=MCQ_MIN_QUESTIONS, max_length=MCQ_MAX_QUESTIONS, description="List of 10-30 MCQ questions")
+
+class MCQRepairList(BaseModel):
+    """Follow-up batch used to replace questions that failed validation."""
+    raw: List[MCQQuestion] = Field(..., description="List of replacement MCQ questions")
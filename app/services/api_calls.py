@@ -1,26 +1,352 @@
+import gzip
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from app.config import api_config
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard json encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd request compression is unavailable without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Methods that can be sent again without changing the result
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Responses worth retrying an idempotent request on
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# Request body encodings in order of preference when a server lists several
+CONTENT_ENCODINGS = ("zstd", "gzip")
+
+
+def dumps(data) -> bytes:
+    """
+    Serialize a JSON request body, with orjson when it is installed.
+
+    :param data: The JSON-serializable body.
+    :return: The UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a request body.
+
+    :param body: The serialized body.
+    :param encoding: "gzip" or "zstd".
+    :return: The compressed body.
+    :raises ValueError: If the encoding is unknown or its library isn't installed.
+    """
+    if encoding == "gzip":
+        # Level 6 is the usual size/speed tradeoff; mtime=0 keeps the output deterministic
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def parse_compression(value: str) -> Dict[str, str]:
+    """
+    Parse a per-endpoint compression setting like "videos/create-with-scenes=zstd,*=gzip".
+
+    :param value: Comma separated endpoint=encoding pairs; "*" applies to all other endpoints.
+    :return: The encoding per endpoint path.
+    :raises ValueError: If an entry is malformed or names an unsupported encoding.
+    """
+    compression = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, encoding = item.rpartition("=")
+        encoding = encoding.strip()
+        if not endpoint or encoding not in CONTENT_ENCODINGS:
+            raise ValueError(f"Invalid request compression setting: {item}")
+        compression[endpoint.strip().strip("/")] = encoding
+    return compression
 
 
 class HttpClient:
-    def __init__(self, base_url):
+    """
+    JSON HTTP client with pooled keep-alive connections, connect/read timeouts and
+    jittered exponential retries, with sync and async variants of every method.
+
+    Idempotent requests are retried on connection errors, timeouts and 429/502/503/504
+    responses. Other methods (POST) are only retried when the connection could not be
+    established, since the server never saw the request then.
+
+    Request bodies can be compressed per endpoint. An endpoint that answers a compressed
+    request with 415 is sent the encoding it lists in Accept-Encoding from then on, or
+    uncompressed bodies if it lists none we support.
+    """
+
+    def __init__(self, base_url, connect_timeout: float = 5, read_timeout: float = 60, max_retries: int = 3,
+                 backoff_seconds: float = 0.5, max_backoff_seconds: float = 10, max_connections: int = 20,
+                 compression: Dict[str, str] = None, min_compress_bytes: int = 1024):
+        """
+        :param base_url: The base URL the endpoints are relative to.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for the response.
+        :param max_retries: Retries after the first attempt.
+        :param backoff_seconds: Base delay of the exponential backoff.
+        :param max_backoff_seconds: Upper bound of a single backoff delay.
+        :param max_connections: Size of the connection pool.
+        :param compression: Request body encoding by endpoint path ("*" for all others); None sends uncompressed bodies.
+        :param min_compress_bytes: Bodies smaller than this are sent uncompressed.
+        """
         self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_connections = max_connections
+        self.compression = dict(compression or {})
+        self.min_compress_bytes = min_compress_bytes
+        # Endpoint path -> encoding agreed after a 415 response (None for uncompressed)
+        self._negotiated: Dict[str, Optional[str]] = {}
+
+        self.session = requests.Session()
+        # Retries are handled here, so the adapter only pools connections
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # httpx clients are bound to the event loop they first connect on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, base_url: str = None) -> "HttpClient":
+        """Create a client from the VIDEO_API_* settings."""
+        return cls(
+            base_url if base_url is not None else api_config.base_url,
+            connect_timeout=api_config.connect_timeout_seconds,
+            read_timeout=api_config.read_timeout_seconds,
+            max_retries=api_config.max_retries,
+            backoff_seconds=api_config.retry_backoff_seconds,
+            max_connections=api_config.max_connections,
+            compression=parse_compression(api_config.request_compression),
+            min_compress_bytes=api_config.compression_min_bytes,
+        )
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint}"
+
+    @staticmethod
+    def _path(endpoint: str) -> str:
+        return endpoint.split("?", 1)[0].strip("/")
+
+    def _encoding_for(self, endpoint: str) -> Optional[str]:
+        path = self._path(endpoint)
+        if path in self._negotiated:
+            return self._negotiated[path]
+        return self.compression.get(path, self.compression.get("*"))
+
+    def _body(self, endpoint: str, data) -> Tuple[Optional[bytes], Dict[str, str]]:
+        """
+        :return: The serialized (and possibly compressed) body and its headers.
+        """
+        if data is None:
+            return None, {}
+        body = dumps(data)
+        headers = {"Content-Type": "application/json"}
+        encoding = self._encoding_for(endpoint)
+        if encoding and len(body) >= self.min_compress_bytes:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return body, headers
+
+    def _renegotiate(self, endpoint: str, rejected: set, accept_encoding: str) -> None:
+        """
+        Pick the encoding for an endpoint that rejected a compressed body.
+
+        :param endpoint: The endpoint.
+        :param rejected: The encodings the endpoint rejected during this request.
+        :param accept_encoding: The Accept-Encoding header of the 415 response.
+        """
+        accepted = {item.split(";")[0].strip().lower() for item in (accept_encoding or "").split(",")}
+        fallback = next(
+            (
+                candidate for candidate in CONTENT_ENCODINGS
+                if candidate in accepted and candidate not in rejected and (candidate != "zstd" or zstandard is not None)
+            ),
+            None,
+        )
+        with self._lock:
+            self._negotiated[self._path(endpoint)] = fallback
+        logger.warning(
+            f"{self._path(endpoint)} does not accept {', '.join(sorted(rejected))} request bodies, using {fallback or 'none'}"
+        )
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """
+        :return: Seconds to wait before the next attempt; full jitter unless the server asked for a delay.
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff_seconds)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+
+    def _should_retry(self, method: str, attempt: int, status_code: int = None, connect_failed: bool = False) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if connect_failed:
+            return True
+        return method in IDEMPOTENT_METHODS and (status_code is None or status_code in RETRY_STATUS_CODES)
+
+    @staticmethod
+    def _connect_failed(error: requests.RequestException) -> bool:
+        """
+        :return: Whether the request failed before a connection was made, so it never reached the server.
+        """
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def request(self, method: str, endpoint: str, data=None):
+        """
+        Send a request, retrying transient failures.
+
+        :param method: The HTTP method.
+        :param endpoint: The endpoint relative to the base URL.
+        :param data: The JSON body, if any.
+        :return: The decoded JSON response.
+        :raises requests.HTTPError: For an error response that is not retried (any more).
+        """
+        method = method.upper()
+        attempt = 0
+        rejected = set()
+        while True:
+            body, headers = self._body(endpoint, data)
+            try:
+                response = self.session.request(
+                    method, self._url(endpoint), data=body, headers=headers,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not self._should_retry(method, attempt, connect_failed=self._connect_failed(e)):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{method} {endpoint} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code == 415 and "Content-Encoding" in headers:
+                    # Resend right away with an encoding the endpoint accepts; not counted as a retry
+                    rejected.add(headers["Content-Encoding"])
+                    self._renegotiate(endpoint, rejected, response.headers.get("Accept-Encoding"))
+                    continue
+                if response.status_code not in RETRY_STATUS_CODES or not self._should_retry(
+                    method, attempt, response.status_code
+                ):
+                    response.raise_for_status()
+                    return response.json()
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"{method} {endpoint} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
 
     def get(self, endpoint):
-        response = requests.get(f"{self.base_url}/{endpoint}")
-        response.raise_for_status()
-        return response.json()
+        return self.request("GET", endpoint)
 
     def post(self, endpoint, data):
-        response = requests.post(f"{self.base_url}/{endpoint}", json=data)
-        response.raise_for_status()
-        return response.json()
+        return self.request("POST", endpoint, data)
 
     def put(self, endpoint, data):
-        response = requests.put(f"{self.base_url}/{endpoint}", json=data)
-        response.raise_for_status()
-        return response.json()
+        return self.request("PUT", endpoint, data)
 
     def delete(self, endpoint):
-        response = requests.delete(f"{self.base_url}/{endpoint}")
-        response.raise_for_status()
-        return response.json()
+        return self.request("DELETE", endpoint)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                    ),
+                )
+                self._async_clients[loop] = client
+            return client
+
+    async def arequest(self, method: str, endpoint: str, data=None):
+        """
+        Async variant of ``request``.
+
+        :raises httpx.HTTPStatusError: For an error response that is not retried (any more).
+        """
+        method = method.upper()
+        client = self._async_client()
+        attempt = 0
+        rejected = set()
+        while True:
+            body, headers = self._body(endpoint, data)
+            try:
+                response = await client.request(method, self._url(endpoint), content=body, headers=headers)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                connect_failed = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not self._should_retry(method, attempt, connect_failed=connect_failed):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{method} {endpoint} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code == 415 and "Content-Encoding" in headers:
+                    rejected.add(headers["Content-Encoding"])
+                    self._renegotiate(endpoint, rejected, response.headers.get("Accept-Encoding"))
+                    continue
+                if response.status_code not in RETRY_STATUS_CODES or not self._should_retry(
+                    method, attempt, response.status_code
+                ):
+                    response.raise_for_status()
+                    return response.json()
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"{method} {endpoint} returned {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aget(self, endpoint):
+        return await self.arequest("GET", endpoint)
+
+    async def apost(self, endpoint, data):
+        return await self.arequest("POST", endpoint, data)
+
+    async def aput(self, endpoint, data):
+        return await self.arequest("PUT", endpoint, data)
+
+    async def adelete(self, endpoint):
+        return await self.arequest("DELETE", endpoint)
+
+    def close(self) -> None:
+        """Close the pooled sync connections."""
+        self.session.close()
+
+    async def aclose(self) -> None:
+        """Close the async client of the running event loop."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
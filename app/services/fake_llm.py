@@ -0,0 +1,136 @@
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+def _fake_value(schema: dict, root: dict, name: str = "value") -> Any:
+    """Build a placeholder value that satisfies the basic constraints of a JSON schema."""
+    if "$ref" in schema:
+        schema = root.get("$defs", {}).get(schema["$ref"].split("/")[-1], {})
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        schema = options[0] if options else {}
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    schema_type = schema.get("type", "object" if "properties" in schema else "string")
+    if schema_type == "object":
+        return {key: _fake_value(value, root, key) for key, value in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        count = max(schema.get("minItems", 1), 1)
+        return [_fake_value(schema.get("items", {}), root, name) for _ in range(count)]
+    if schema_type in ("integer", "number"):
+        return schema.get("minimum", 1)
+    if schema_type == "boolean":
+        return True
+    return f"fake {name}"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for local runs and tests; no API key or network needed.
+
+    Tool calls (and so structured output) and JSON schema response formats are answered with
+    placeholder values generated from the requested schema; plain calls echo the last message.
+    Streaming yields the reply in small chunks.
+    """
+
+    model_name: str = "fake"
+    latency_seconds: float = 0.0
+    timeout_seconds: Optional[float] = None  # Like a client request timeout: calls slower than this raise TimeoutError
+    stream_chunk_chars: int = 20
+    stream_chunk_delay_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: list, tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[list] = None,
+               response_format: Optional[dict] = None, **kwargs) -> ChatResult:
+        prompt = " ".join(str(message.content) for message in messages)
+        if response_format and response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            message = AIMessage(content=json.dumps(_fake_value(schema, schema)))
+        elif tools:
+            function = tools[0]["function"]
+            parameters = function.get("parameters", {})
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": function["name"],
+                    "args": _fake_value(parameters, parameters),
+                    "id": f"call_{uuid.uuid4().hex}",
+                }],
+            )
+        else:
+            message = AIMessage(content=f"Fake reply to: {messages[-1].content if messages else ''}")
+        message.response_metadata = {"model_name": self.model_name}
+        input_tokens = len(prompt) // 4
+        output_tokens = len(str(message.content or message.tool_calls)) // 4
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _timed_out(self) -> bool:
+        return self.timeout_seconds is not None and self.latency_seconds > self.timeout_seconds
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self._timed_out():
+            time.sleep(self.timeout_seconds)
+            raise TimeoutError(f"Request timed out after {self.timeout_seconds}s")
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._reply(messages, **kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self._timed_out():
+            await asyncio.sleep(self.timeout_seconds)
+            raise TimeoutError(f"Request timed out after {self.timeout_seconds}s")
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._reply(messages, **kwargs)
+
+    def _chunks(self, result: ChatResult) -> Iterator[ChatGenerationChunk]:
+        message = result.generations[0].message
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}],
+                response_metadata=message.response_metadata,
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        content = message.content
+        for start in range(0, len(content), self.stream_chunk_chars):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + self.stream_chunk_chars]))
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", response_metadata=message.response_metadata, usage_metadata=message.usage_metadata
+        ))
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        yield from self._chunks(self._reply(messages, **kwargs))
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        for chunk in self._chunks(self._reply(messages, **kwargs)):
+            # Yield control between chunks like a real token stream
+            await asyncio.sleep(self.stream_chunk_delay_seconds)
+            yield chunk
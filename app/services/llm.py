@@ -1,29 +1,874 @@
+import copy
+import json
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List
+
+import httpx
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import UsageMetadataCallbackHandler
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.language_models import BaseChatModel
+from langchain_core.tracers.context import register_configure_hook
+
+from app.config import llm_config
+from app.services.fake_llm import FakeChatModel
+from app.services.stats import percentile
+from app.services.llm_usage import llm_usage  # noqa: F401 - importing registers the process-wide usage ledger
+
+logger = logging.getLogger(__name__)
+
+
+class UsageTracker(UsageMetadataCallbackHandler):
+    """
+    Token usage collector that also reports every call to the enclosing tracker, so nested
+    ``track_usage`` blocks (e.g. a graph node around a rate-limited call) all see the usage.
+    """
+
+    def __init__(self, parent: "UsageTracker" = None):
+        super().__init__()
+        self.parent = parent
+        # Calls that joined another caller's in-flight call instead of making their own
+        self.coalesced = 0
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        super().on_llm_end(response, **kwargs)
+        if self.parent is not None:
+            self.parent.on_llm_end(response, **kwargs)
+
+    def on_coalesced(self) -> None:
+        self.coalesced += 1
+        if self.parent is not None:
+            self.parent.on_coalesced()
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(item.get("input_tokens", 0) for item in self.usage_metadata.values())
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(item.get("output_tokens", 0) for item in self.usage_metadata.values())
+
+    @property
+    def cached_input_tokens(self) -> int:
+        """Input tokens served from the provider's prompt prefix cache."""
+        return sum(
+            (item.get("input_token_details") or {}).get("cache_read", 0) for item in self.usage_metadata.values()
+        )
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+# Registered once: get_usage_metadata_callback registers a new hook on every call
+_usage_tracker_var: ContextVar = ContextVar("llm_usage_tracker", default=None)
+register_configure_hook(_usage_tracker_var, inheritable=True)
+
+
+@contextmanager
+def track_usage():
+    """
+    Collect the token usage of the LLM calls made inside the block.
+
+    Usage: ``with track_usage() as usage: ...; usage.total_tokens``
+    """
+    tracker = UsageTracker(_usage_tracker_var.get())
+    token = _usage_tracker_var.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _usage_tracker_var.reset(token)
+
+
+class LLMConcurrencyLimiter:
+    """
+    Caps the number of LLM calls in flight at once, shared by every caller in the process.
+    """
+
+    def __init__(self, max_concurrency: int):
+        """
+        :param max_concurrency: The maximum number of concurrent LLM calls.
+        """
+        self.max_concurrency = max_concurrency
+        # asyncio primitives are bound to one event loop, so keep one semaphore per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def slot(self) -> asyncio.Semaphore:
+        """
+        Get the semaphore to hold while an LLM call is in flight.
+
+        Usage: ``async with llm_concurrency.slot(): ...``
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+
+llm_concurrency = LLMConcurrencyLimiter(llm_config.max_concurrency)
+
+
+class _RateLimitWaiter:
+    def __init__(self, project_id: str, tokens: int):
+        self.project_id = project_id
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+
+class LLMRateLimiter:
+    """
+    Process-wide requests-per-minute and tokens-per-minute budgets for LLM calls.
+
+    Both budgets are token buckets holding one minute's worth of capacity. Waiting calls
+    are queued per project and served round-robin, so one busy project can't starve the others.
+    Token use is estimated before a call and settled with the actual usage afterwards.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 expected_output_tokens: int = 1000, max_wait_samples: int = 1000):
+        """
+        :param requests_per_minute: The request budget; 0 disables it.
+        :param tokens_per_minute: The token budget; 0 disables it.
+        :param expected_output_tokens: Output tokens assumed per call before the actual usage is known.
+        :param max_wait_samples: Number of recent queue waits kept for percentiles.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.expected_output_tokens = expected_output_tokens
+        self._cond = threading.Condition()
+        self._request_bucket = float(requests_per_minute)
+        self._token_bucket = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        # project_id -> waiting calls in arrival order; the OrderedDict order is the round-robin turn
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._waits = deque(maxlen=max_wait_samples)
+        self._granted = 0
+        self._total_wait = 0.0
+
+    @classmethod
+    def from_config(cls) -> "LLMRateLimiter":
+        """Create a limiter from the LLM_RPM / LLM_TPM settings."""
+        return cls(
+            requests_per_minute=llm_config.requests_per_minute,
+            tokens_per_minute=llm_config.tokens_per_minute,
+            expected_output_tokens=llm_config.expected_output_tokens,
+        )
+
+    def estimate_tokens(self, prompt) -> int:
+        """
+        Estimate the tokens of a call from its prompt, at roughly four characters per token.
+
+        :param prompt: The prompt string or list of messages.
+        :return: The estimated input plus expected output tokens.
+        """
+        if isinstance(prompt, str):
+            chars = len(prompt)
+        else:
+            chars = sum(len(str(getattr(message, "content", message))) for message in prompt)
+        return chars // 4 + self.expected_output_tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        if self.requests_per_minute:
+            self._request_bucket = min(
+                float(self.requests_per_minute), self._request_bucket + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute:
+            self._token_bucket = min(
+                float(self.tokens_per_minute), self._token_bucket + elapsed * self.tokens_per_minute / 60
+            )
+
+    def _delay_for(self, tokens: int) -> float:
+        """Seconds until both buckets can cover a call of the given tokens, 0 if they can now."""
+        delay = 0.0
+        if self.requests_per_minute and self._request_bucket < 1:
+            delay = max(delay, (1 - self._request_bucket) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._token_bucket < tokens:
+            delay = max(delay, (tokens - self._token_bucket) * 60 / self.tokens_per_minute)
+        return delay
+
+    def _dispatch(self) -> float:
+        """
+        Grant queued calls round-robin across projects while the budgets allow.
+        Must be called with the lock held.
+
+        :return: Seconds until the next queued call can be granted, 0 if the queue is empty.
+        """
+        self._refill()
+        granted = False
+        while self._queues:
+            project_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            delay = self._delay_for(waiter.tokens)
+            if delay > 0:
+                if granted:
+                    self._cond.notify_all()
+                return delay
+            if self.requests_per_minute:
+                self._request_bucket -= 1
+            if self.tokens_per_minute:
+                self._token_bucket -= waiter.tokens
+            queue.popleft()
+            waiter.granted = True
+            granted = True
+            wait = time.monotonic() - waiter.enqueued_at
+            self._waits.append(wait)
+            self._granted += 1
+            self._total_wait += wait
+            # The project's next call goes to the back of the turn order
+            del self._queues[project_id]
+            if queue:
+                self._queues[project_id] = queue
+        if granted:
+            self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self, project_id: str, tokens: int) -> _RateLimitWaiter:
+        # A call larger than the whole budget would never fit; let it drain the bucket instead
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        waiter = _RateLimitWaiter(project_id or "default", tokens)
+        self._queues.setdefault(waiter.project_id, deque()).append(waiter)
+        return waiter
+
+    def _abandon(self, waiter: _RateLimitWaiter) -> None:
+        queue = self._queues.get(waiter.project_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.project_id]
+
+    def acquire(self, tokens: int, project_id: str = None) -> float:
+        """
+        Block until a call of the given estimated tokens fits the budgets.
+
+        :param tokens: The estimated tokens of the call.
+        :param project_id: The project the call is made for, used for fair queuing.
+        :return: The seconds spent waiting in the queue.
+        """
+        with self._cond:
+            waiter = self._enqueue(project_id, tokens)
+            try:
+                while not waiter.granted:
+                    delay = self._dispatch()
+                    if not waiter.granted:
+                        self._cond.wait(timeout=delay or None)
+            finally:
+                if not waiter.granted:
+                    self._abandon(waiter)
+        return time.monotonic() - waiter.enqueued_at
+
+    async def aacquire(self, tokens: int, project_id: str = None) -> float:
+        """
+        Wait without blocking the event loop until a call of the given estimated tokens fits the budgets.
+
+        :param tokens: The estimated tokens of the call.
+        :param project_id: The project the call is made for, used for fair queuing.
+        :return: The seconds spent waiting in the queue.
+        """
+        with self._cond:
+            waiter = self._enqueue(project_id, tokens)
+        try:
+            while True:
+                with self._cond:
+                    delay = 0.0 if waiter.granted else self._dispatch()
+                    if waiter.granted:
+                        break
+                # Calls granted from other threads are noticed on the next wake-up
+                await asyncio.sleep(min(delay, 0.25))
+        finally:
+            if not waiter.granted:
+                with self._cond:
+                    self._abandon(waiter)
+        return time.monotonic() - waiter.enqueued_at
+
+    def settle(self, estimated_tokens: int, actual_tokens: int, refund_request: bool = False) -> None:
+        """
+        Correct the budgets once the actual usage of a call is known.
+
+        :param estimated_tokens: The tokens the call was admitted with.
+        :param actual_tokens: The tokens the call actually used.
+        :param refund_request: Return the call's request to the RPM budget, for calls that made no request.
+        """
+        if not self.tokens_per_minute and not (refund_request and self.requests_per_minute):
+            return
+        with self._cond:
+            if self.tokens_per_minute:
+                self._token_bucket = min(
+                    float(self.tokens_per_minute), self._token_bucket + estimated_tokens - actual_tokens
+                )
+            if refund_request and self.requests_per_minute:
+                self._request_bucket = min(float(self.requests_per_minute), self._request_bucket + 1)
+            self._dispatch()
+
+    def _settle_usage(self, estimated_tokens: int, usage: UsageTracker) -> None:
+        if usage.usage_metadata:
+            self.settle(estimated_tokens, usage.total_tokens)
+        elif usage.coalesced:
+            # Joined another caller's in-flight call, which is charged for the request and its tokens
+            self.settle(estimated_tokens, 0, refund_request=True)
+        # Otherwise the call failed or was rejected upstream without reporting usage; it keeps
+        # its estimate, so error storms still count against the budget
+
+    @contextmanager
+    def limit(self, project_id: str = None, estimated_tokens: int = None):
+        """
+        Hold a rate-limited slot for the LLM calls made inside the block.
+
+        Usage: ``with llm_rate_limiter.limit(project_id, tokens): model.invoke(...)``
+        """
+        estimated_tokens = estimated_tokens or self.expected_output_tokens
+        self.acquire(estimated_tokens, project_id)
+        with track_usage() as usage:
+            try:
+                yield usage
+            finally:
+                self._settle_usage(estimated_tokens, usage)
+
+    @asynccontextmanager
+    async def alimit(self, project_id: str = None, estimated_tokens: int = None):
+        """
+        Async version of ``limit``.
+
+        Usage: ``async with llm_rate_limiter.alimit(project_id, tokens): await model.ainvoke(...)``
+        """
+        estimated_tokens = estimated_tokens or self.expected_output_tokens
+        await self.aacquire(estimated_tokens, project_id)
+        with track_usage() as usage:
+            try:
+                yield usage
+            finally:
+                self._settle_usage(estimated_tokens, usage)
+
+    def stats(self) -> dict:
+        """
+        :return: The budgets, remaining capacity, queued calls per project and queue wait times.
+        """
+        with self._cond:
+            self._refill()
+            waits = list(self._waits)
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available_requests": round(self._request_bucket, 1) if self.requests_per_minute else None,
+                "available_tokens": round(self._token_bucket) if self.tokens_per_minute else None,
+                "queued": {project_id: len(queue) for project_id, queue in self._queues.items()},
+                "granted": self._granted,
+                "mean_wait_ms": round(self._total_wait / self._granted * 1000, 1) if self._granted else 0.0,
+                "p50_wait_ms": round(percentile(waits, 0.5) * 1000, 1),
+                "p95_wait_ms": round(percentile(waits, 0.95) * 1000, 1),
+                "max_wait_ms": round(max(waits) * 1000, 1) if waits else 0.0,
+            }
+
+
+llm_rate_limiter = LLMRateLimiter.from_config()
+
+
 class LLMService:
-    def __init__(self, provider_name: str,  model_name: str, api_key: str):
+    def __init__(self, provider_name: str,  model_name: str, api_key: str, temperature: float = None,
+                 http_client: httpx.Client = None, http_async_client: httpx.AsyncClient = None,
+                 timeout_seconds: float = None, max_retries: int = None):
         """
         Initialize the LLMService with a specific provider and API key.
 
         :param provider: The name of the LLM provider (e.g., OpenAI, Anthropic).
         :param api_key: The API key for authenticating with the LLM provider.
+        :param temperature: The sampling temperature, or None for the provider default.
+        :param http_client: An optional shared HTTP client for sync calls.
+        :param http_async_client: An optional shared HTTP client for async calls.
+        :param timeout_seconds: The request timeout, or None for the provider default.
+        :param max_retries: The client's retries of a failed request, or None for the provider default.
         """
         
         self.provider_name = provider_name
         self.api_key = api_key
         self.model_name = model_name
+        self.temperature = temperature
+        self.http_client = http_client
+        self.http_async_client = http_async_client
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
         self.model = self._initialize_model()
 
     def _initialize_model(self) -> BaseChatModel:
         """
-        Initialize the LLM model using LangChain.
+        Initialize the LLM model using the backend registered for the provider.
 
         :return: An instance of the LLM model.
         """
-        if self.provider_name.lower() == "openai":
-            return ChatOpenAI(
-                model_name=self.model_name,
-                openai_api_key=self.api_key)
-        else:
-            raise ValueError(f"Unsupported provider: {self.provider_name}, {self}")
\ No newline at end of file
+        factory = LLM_PROVIDERS.get(self.provider_name.lower())
+        if factory is None:
+            raise ValueError(f"Unsupported provider: {self.provider_name}, {self}")
+        return factory(self)
+
+
+def _openai_model(service: LLMService) -> BaseChatModel:
+    # Only pass the optional settings that were given, so provider defaults apply otherwise
+    options = {}
+    if service.temperature is not None:
+        options["temperature"] = service.temperature
+    if service.http_client is not None:
+        options["http_client"] = service.http_client
+    if service.http_async_client is not None:
+        options["http_async_client"] = service.http_async_client
+    if service.timeout_seconds is not None:
+        options["timeout"] = service.timeout_seconds
+    if service.max_retries is not None:
+        options["max_retries"] = service.max_retries
+    return ChatOpenAI(
+        model_name=service.model_name,
+        openai_api_key=service.api_key,
+        **options)
+
+
+def _fake_model(service: LLMService) -> BaseChatModel:
+    return FakeChatModel(model_name=service.model_name, timeout_seconds=service.timeout_seconds)
+
+
+# Provider name -> factory building the chat model for an LLMService
+LLM_PROVIDERS: Dict[str, Callable[[LLMService], BaseChatModel]] = {
+    "openai": _openai_model,
+    "fake": _fake_model,
+}
+
+
+def register_provider(name: str, factory: Callable[[LLMService], BaseChatModel]) -> None:
+    """
+    Register a chat model backend.
+
+    :param name: The provider name used in LLM_PROVIDER / LLM_FALLBACKS.
+    :param factory: Builds the chat model from an LLMService's settings.
+    """
+    LLM_PROVIDERS[name.lower()] = factory
+
+
+class LLMClientRegistry:
+    """
+    Process-wide cache of configured chat models and their structured-output wrappers.
+
+    Models are keyed by (provider, model, temperature, api_key) and share one pair of
+    HTTP clients, so connection pools survive across requests.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 timeout_seconds: float = 120):
+        """
+        :param max_connections: The maximum number of open connections per HTTP client.
+        :param max_keepalive_connections: The maximum number of idle connections kept alive.
+        :param timeout_seconds: The HTTP request timeout.
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._http_client = None
+        self._http_async_client = None
+        self._models = {}
+        self._structured = {}
+
+    @classmethod
+    def from_config(cls) -> "LLMClientRegistry":
+        """Create a registry from the LLM_HTTP_* settings."""
+        return cls(
+            max_connections=llm_config.http_max_connections,
+            max_keepalive_connections=llm_config.http_max_keepalive_connections,
+            timeout_seconds=llm_config.http_timeout_seconds,
+        )
+
+    def _http_clients(self) -> tuple:
+        # Created on first use so importing this module stays cheap
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self.limits, timeout=self.timeout_seconds)
+            self._http_async_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout_seconds)
+        return self._http_client, self._http_async_client
+
+    def get_model(self, provider_name: str, model_name: str, api_key: str, temperature: float = None,
+                  timeout_seconds: float = None, max_retries: int = None) -> BaseChatModel:
+        """
+        Get the cached chat model for a configuration, creating it on first use.
+
+        :param provider_name: The name of the LLM provider.
+        :param model_name: The model name.
+        :param api_key: The API key of the provider.
+        :param temperature: The sampling temperature, or None for the provider default.
+        :param timeout_seconds: The request timeout, or None for the HTTP client's.
+        :param max_retries: The client's retries of a failed request, or None for the provider default.
+        :return: The chat model.
+        """
+        key = (provider_name.lower(), model_name, temperature, api_key, timeout_seconds, max_retries)
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                http_client, http_async_client = self._http_clients()
+                model = LLMService(
+                    provider_name, model_name, api_key, temperature,
+                    http_client=http_client, http_async_client=http_async_client,
+                    timeout_seconds=timeout_seconds, max_retries=max_retries,
+                ).model
+                self._models[key] = model
+            return model
+
+    def structured(self, model: BaseChatModel, schema, **kwargs):
+        """
+        Get a cached ``model.with_structured_output(schema, **kwargs)`` runnable.
+
+        :param model: The chat model.
+        :param schema: A pydantic model class or a JSON schema dict.
+        :param kwargs: Extra arguments for ``with_structured_output``.
+        :return: The structured-output runnable.
+        """
+        schema_key = json.dumps(schema, sort_keys=True) if isinstance(schema, dict) else schema
+        # The model is kept in the value, so its id can't be reused by another object
+        key = (id(model), schema_key, tuple(sorted(kwargs.items())))
+        with self._lock:
+            entry = self._structured.get(key)
+            if entry is None:
+                entry = self._structured[key] = (model, model.with_structured_output(schema, **kwargs))
+            return entry[1]
+
+    def clear(self) -> None:
+        """Drop all cached models and wrappers."""
+        with self._lock:
+            self._models.clear()
+            self._structured.clear()
+
+
+llm_registry = LLMClientRegistry.from_config()
+
+
+def message_key(input) -> str:
+    """
+    Hash an LLM input with whitespace normalized, so equivalent prompts get the same key.
+
+    :param input: A prompt string, prompt value or list of messages.
+    :return: Hex SHA-256 digest.
+    """
+    if isinstance(input, str):
+        items = [("human", input)]
+    elif hasattr(input, "to_messages"):
+        items = [(message.type, message.content) for message in input.to_messages()]
+    else:
+        items = [(getattr(message, "type", ""), getattr(message, "content", message)) for message in input]
+    normalized = [(message_type, " ".join(str(content).split())) for message_type, content in items]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+def _note_coalesced() -> None:
+    """Tell the enclosing usage tracker (e.g. a rate-limited block) that its call was coalesced."""
+    tracker = _usage_tracker_var.get()
+    if tracker is not None:
+        tracker.on_coalesced()
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call between concurrent callers with the same key. Callers that
+    join an in-flight call get a copy of its result, or the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[object, _InFlightCall] = {}
+        # asyncio tasks are bound to one event loop, so keep the in-flight tasks per loop
+        self._tasks = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn: Callable):
+        """
+        Run ``fn()`` unless a call with the same key is in flight, in which case wait for its result.
+
+        :param key: The call key.
+        :param fn: The call to make.
+        :return: The call's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            _note_coalesced()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key, coro_fn: Callable):
+        """
+        Async version of ``do``; ``coro_fn()`` returns the coroutine making the call.
+
+        :param key: The call key.
+        :param coro_fn: Creates the coroutine to run.
+        :return: The call's result.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+            task = tasks.get(key)
+            leader = task is None
+            if leader:
+                # The task copies the leader's context, so its usage tracking sees the call
+                task = tasks[key] = loop.create_task(coro_fn())
+                task.add_done_callback(lambda _: tasks.pop(key, None))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            _note_coalesced()
+
+        # Shielded so a cancelled caller doesn't cancel the call the others are waiting for
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class LLMRoute:
+    """
+    One provider/model the router can send calls to.
+    """
+
+    def __init__(self, provider_name: str, model_name: str, api_key: str = "", temperature: float = None):
+        self.provider_name = provider_name
+        self.model_name = model_name
+        self.api_key = api_key
+        self.temperature = temperature
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider_name}:{self.model_name}"
+
+
+class LLMRouter:
+    """
+    Sends each call to the healthiest configured route, ordered by recent error rate and
+    p95 latency, and fails over to the next route on an error or when the per-call deadline passes.
+
+    Exposes ``with_structured_output`` / ``invoke`` / ``ainvoke`` so it can be used in place of a chat model.
+    """
+
+    def __init__(self, routes: List[LLMRoute], registry: LLMClientRegistry = None, deadline_seconds: float = 60,
+                 max_error_rate: float = 0.5, min_samples: int = 5, window_seconds: float = 300,
+                 coalesce: bool = True):
+        """
+        :param routes: The routes in preference order; the first is the primary.
+        :param registry: The registry the route models are taken from.
+        :param deadline_seconds: The time a single call may take before failing over; 0 disables it.
+            Sync calls enforce it as the route model's request timeout, without client retries
+            (failing over to the next route takes their place).
+        :param max_error_rate: Routes above this recent error rate are only tried after the healthy ones.
+        :param min_samples: Calls needed before a route's latency is used for ordering.
+        :param window_seconds: How far back call outcomes are considered.
+        :param coalesce: Whether concurrent identical calls share one upstream request.
+        """
+        if not routes:
+            raise ValueError("At least one LLM route is required")
+        self.routes = routes
+        self.registry = registry or llm_registry
+        self.deadline_seconds = deadline_seconds
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        # route key -> deque of (timestamp, latency seconds, succeeded)
+        self._outcomes: Dict[str, deque] = {route.key: deque() for route in routes}
+        self.coalesce = coalesce
+        self.single_flight = SingleFlight()
+
+    @classmethod
+    def from_config(cls) -> "LLMRouter":
+        """Create a router over LLM_PROVIDER/LLM_MODEL followed by the LLM_FALLBACKS routes."""
+        routes = [LLMRoute(llm_config.provider, llm_config.model_name, llm_config.api_key, llm_config.temperature)]
+        for entry in filter(None, (item.strip() for item in llm_config.fallbacks.split(","))):
+            provider_name, _, model_name = entry.partition(":")
+            routes.append(LLMRoute(provider_name, model_name or llm_config.model_name,
+                                   llm_config.api_key, llm_config.temperature))
+        return cls(
+            routes,
+            deadline_seconds=llm_config.call_deadline_seconds,
+            max_error_rate=llm_config.router_max_error_rate,
+            min_samples=llm_config.router_min_samples,
+            coalesce=llm_config.coalesce_calls,
+        )
+
+    def model_for(self, route: LLMRoute) -> BaseChatModel:
+        if not self.deadline_seconds:
+            return self.registry.get_model(route.provider_name, route.model_name, route.api_key, route.temperature)
+        # A blocking call can't be interrupted from outside, so the client itself gives up at the deadline
+        return self.registry.get_model(route.provider_name, route.model_name, route.api_key, route.temperature,
+                                       timeout_seconds=self.deadline_seconds, max_retries=0)
+
+    def _route_stats(self, route: LLMRoute, now: float) -> dict:
+        outcomes = self._outcomes[route.key]
+        while outcomes and now - outcomes[0][0] > self.window_seconds:
+            outcomes.popleft()
+        latencies = [latency for _, latency, ok in outcomes if ok]
+        errors = sum(1 for _, _, ok in outcomes if not ok)
+        return {
+            "calls": len(outcomes),
+            "errors": errors,
+            "error_rate": errors / len(outcomes) if outcomes else 0.0,
+            "p95_seconds": percentile(latencies, 0.95, default=None),
+        }
+
+    def ordered_routes(self) -> List[LLMRoute]:
+        """
+        :return: The routes in the order they should be tried for the next call.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = {route.key: self._route_stats(route, now) for route in self.routes}
+
+        def score(indexed):
+            index, route = indexed
+            route_stats = stats[route.key]
+            if route_stats["error_rate"] > self.max_error_rate and route_stats["calls"] >= self.min_samples:
+                return (1, 0.0, index)
+            measured = route_stats["calls"] >= self.min_samples and route_stats["p95_seconds"] is not None
+            # Unmeasured routes keep their configured order behind the measured healthy ones
+            return (0, route_stats["p95_seconds"] if measured else float("inf"), index)
+
+        return [route for _, route in sorted(enumerate(self.routes), key=score)]
+
+    def record(self, route: LLMRoute, latency_seconds: float, succeeded: bool) -> None:
+        """Record the outcome of a call on a route."""
+        with self._lock:
+            self._outcomes[route.key].append((time.monotonic(), latency_seconds, succeeded))
+
+    def stats(self) -> dict:
+        """
+        :return: Per-route calls, error rate and p95 latency, plus the current routing order.
+        """
+        now = time.monotonic()
+        with self._lock:
+            routes = {route.key: self._route_stats(route, now) for route in self.routes}
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "order": [route.key for route in self.ordered_routes()],
+            "routes": routes,
+            "single_flight": self.single_flight.stats(),
+        }
+
+    def _call(self, build: Callable, input, config=None, **kwargs):
+        errors = []
+        for route in self.ordered_routes():
+            runnable = build(self.model_for(route))
+            started = time.monotonic()
+            try:
+                result = runnable.invoke(input, config, **kwargs)
+            except Exception as e:
+                self.record(route, time.monotonic() - started, False)
+                logger.warning(f"LLM call on {route.key} failed, trying the next route: {type(e).__name__}: {str(e)}")
+                errors.append(e)
+                continue
+            self.record(route, time.monotonic() - started, True)
+            return result
+        raise errors[-1]
+
+    async def _acall(self, build: Callable, input, config=None, **kwargs):
+        errors = []
+        for route in self.ordered_routes():
+            runnable = build(self.model_for(route))
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    runnable.ainvoke(input, config, **kwargs), timeout=self.deadline_seconds or None
+                )
+            except Exception as e:
+                self.record(route, time.monotonic() - started, False)
+                logger.warning(f"LLM call on {route.key} failed, trying the next route: {type(e).__name__}: {str(e)}")
+                errors.append(e)
+                continue
+            self.record(route, time.monotonic() - started, True)
+            return result
+        raise errors[-1]
+
+    def invoke(self, input, config=None, **kwargs):
+        return RoutedRunnable(self, lambda model: model, ("chat",)).invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await RoutedRunnable(self, lambda model: model, ("chat",)).ainvoke(input, config, **kwargs)
+
+    def with_structured_output(self, schema, **kwargs) -> "RoutedRunnable":
+        """
+        Get a runnable returning structured output from whichever route serves the call.
+        """
+        schema_key = json.dumps(schema, sort_keys=True) if isinstance(schema, dict) else schema
+        return RoutedRunnable(
+            self,
+            lambda model: self.registry.structured(model, schema, **kwargs),
+            ("structured", schema_key, tuple(sorted(kwargs.items()))),
+        )
+
+
+class RoutedRunnable:
+    """
+    A runnable built per route (e.g. a structured-output wrapper) and called through an LLMRouter.
+    Concurrent identical calls are coalesced into one upstream request.
+    """
+
+    def __init__(self, router: LLMRouter, build: Callable, key: tuple):
+        """
+        :param router: The router the calls go through.
+        :param build: Builds the runnable for a route's model.
+        :param key: Identifies what the runnable does (e.g. the schema), combined with the input for coalescing.
+        """
+        self.router = router
+        self.build = build
+        self.key = key
+
+    def invoke(self, input, config=None, **kwargs):
+        if not self.router.coalesce or kwargs:
+            return self.router._call(self.build, input, config, **kwargs)
+        return self.router.single_flight.do(
+            (self.key, message_key(input)), lambda: self.router._call(self.build, input, config)
+        )
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if not self.router.coalesce or kwargs:
+            return await self.router._acall(self.build, input, config, **kwargs)
+        return await self.router.single_flight.ado(
+            (self.key, message_key(input)), lambda: self.router._acall(self.build, input, config)
+        )
+
+
+llm_router = LLMRouter.from_config()
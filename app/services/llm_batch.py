@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+import openai
+from langchain_core.messages import BaseMessage, convert_to_messages, convert_to_openai_messages
+from pydantic import BaseModel
+
+from app.config import llm_config, batch_config
+from app.services.llm import llm_registry
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+# Batch states shared by all backends (the OpenAI Batch API names)
+BATCH_COMPLETED = "completed"
+BATCH_FAILED_STATES = ("failed", "expired", "cancelled")
+
+
+class BatchBackend(ABC):
+    """
+    A provider batch API: takes a JSONL file of chat completion requests and,
+    once the batch has completed, returns a JSONL file with one result per request.
+    """
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """
+        Submit a batch.
+
+        :param input_path: Path of the JSONL request file.
+        :return: The batch ID.
+        """
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """
+        :return: The batch state, e.g. "in_progress", "completed" or "failed".
+        """
+
+    @abstractmethod
+    def download(self, batch_id: str, output_path: str) -> None:
+        """
+        Write the results of a completed batch to a JSONL file.
+
+        :param batch_id: The batch ID.
+        :param output_path: Path the results are written to.
+        """
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    Batches through the OpenAI Batch API (files upload, batches.create/retrieve).
+    """
+
+    def __init__(self, api_key: str, base_url: str = None, completion_window: str = "24h"):
+        """
+        :param api_key: The OpenAI API key.
+        :param base_url: Base URL of an OpenAI compatible API; None uses the OpenAI default.
+        :param completion_window: The completion window requested for each batch.
+        """
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        self.completion_window = completion_window
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, "w", encoding="utf-8") as f:
+            # Successful requests end up in the output file, failed ones in the error file
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).text.rstrip("\n") + "\n")
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    In-process stand-in for a provider batch API, for tests and local runs.
+
+    The requests are sent one by one through the shared LLM clients when the batch is
+    submitted, and the results are written in the OpenAI batch output format.
+    """
+
+    def __init__(self, provider_name: str = None, api_key: str = None):
+        """
+        :param provider_name: The LLM provider the requests are sent to (default: LLM_PROVIDER).
+        :param api_key: API key of the provider (default: LLM_API_KEY).
+        """
+        self.provider_name = provider_name or llm_config.provider
+        self.api_key = api_key if api_key is not None else llm_config.api_key
+        self._results: Dict[str, List[dict]] = {}
+
+    def _run_request(self, request: dict) -> dict:
+        body = request["body"]
+        model = llm_registry.get_model(self.provider_name, body["model"], self.api_key, body.get("temperature"))
+        if "response_format" in body:
+            model = model.bind(response_format=body["response_format"])
+        message = model.invoke(convert_to_messages(body["messages"]))
+        usage = message.usage_metadata or {}
+        return {
+            "status_code": 200,
+            "body": {
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": message.content}}],
+                "usage": {
+                    "prompt_tokens": usage.get("input_tokens", 0),
+                    "completion_tokens": usage.get("output_tokens", 0),
+                    "total_tokens": usage.get("total_tokens", 0),
+                },
+            },
+        }
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        results = []
+        with open(input_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                result = {"id": f"local_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"]}
+                try:
+                    result.update(response=self._run_request(request), error=None)
+                except Exception as e:
+                    result.update(response=None, error={"code": type(e).__name__, "message": str(e)})
+                results.append(result)
+        self._results[batch_id] = results
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return BATCH_COMPLETED if batch_id in self._results else "failed"
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for result in self._results.pop(batch_id):
+                f.write(json.dumps(result) + "\n")
+
+
+def _openai_backend() -> BatchBackend:
+    return OpenAIBatchBackend(api_key=llm_config.api_key, completion_window=batch_config.completion_window)
+
+
+# Backend name -> factory, selected with LLM_BATCH_BACKEND
+BATCH_BACKENDS: Dict[str, Callable[[], BatchBackend]] = {
+    "openai": _openai_backend,
+    "local": LocalBatchBackend,
+}
+
+
+class BatchRunner:
+    """
+    Collects chat completion requests into a JSONL batch file, submits it through a
+    batch backend and polls until the results are available.
+    """
+
+    def __init__(self, backend: BatchBackend, batch_dir: str, poll_interval_seconds: float = 60,
+                 timeout_seconds: float = 24 * 3600, model_name: str = None, temperature: float = None):
+        """
+        :param backend: The batch backend the requests are submitted to.
+        :param batch_dir: Directory the request and result files are kept in.
+        :param poll_interval_seconds: Seconds between batch status checks.
+        :param timeout_seconds: How long to wait for a batch before giving up.
+        :param model_name: The model the requests are sent to (default: LLM_MODEL).
+        :param temperature: Sampling temperature of the requests (default: LLM_TEMPERATURE).
+        """
+        self.backend = backend
+        self.batch_dir = batch_dir
+        self.poll_interval_seconds = poll_interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.model_name = model_name or llm_config.model_name
+        self.temperature = temperature if temperature is not None else llm_config.temperature
+
+    @classmethod
+    def from_config(cls) -> "BatchRunner":
+        """Create a runner from the LLM_BATCH_* settings."""
+        if batch_config.backend not in BATCH_BACKENDS:
+            raise ValueError(f"Unsupported batch backend: {batch_config.backend}")
+        return cls(
+            backend=BATCH_BACKENDS[batch_config.backend](),
+            batch_dir=batch_config.batch_dir,
+            poll_interval_seconds=batch_config.poll_interval_seconds,
+            timeout_seconds=batch_config.timeout_seconds,
+        )
+
+    def chat_request(self, custom_id: str, messages: List[BaseMessage], schema: type[BaseModel]) -> dict:
+        """
+        Build one batch line asking for a structured response.
+
+        :param custom_id: ID the result is matched back with.
+        :param messages: The prompt messages.
+        :param schema: The pydantic model the response must follow.
+        :return: The request line in the OpenAI batch input format.
+        """
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_URL,
+            "body": {
+                "model": self.model_name,
+                "temperature": self.temperature,
+                "messages": convert_to_openai_messages(messages),
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema(), "strict": False},
+                },
+            },
+        }
+
+    def run(self, requests: List[dict], name: str = "batch") -> Dict[str, dict]:
+        """
+        Submit the requests as one batch and wait for the results.
+
+        :param requests: Request lines built with ``chat_request``.
+        :param name: Prefix of the batch files.
+        :return: The result lines by custom ID; requests without a result are missing.
+        :raises RuntimeError: If the batch failed, expired or was cancelled.
+        :raises TimeoutError: If the batch did not complete within the timeout.
+        """
+        os.makedirs(self.batch_dir, exist_ok=True)
+        file_prefix = os.path.join(self.batch_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+        input_path = f"{file_prefix}.input.jsonl"
+        with open(input_path, "w", encoding="utf-8") as f:
+            for request in requests:
+                f.write(json.dumps(request) + "\n")
+
+        batch_id = self.backend.submit(input_path)
+        logger.info(f"Submitted batch {batch_id} with {len(requests)} requests ({input_path})")
+        deadline = time.monotonic() + self.timeout_seconds
+        while (state := self.backend.status(batch_id)) != BATCH_COMPLETED:
+            if state in BATCH_FAILED_STATES:
+                raise RuntimeError(f"Batch {batch_id} ended in state {state}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Batch {batch_id} did not complete within {self.timeout_seconds}s")
+            logger.info(f"Batch {batch_id} is {state}, checking again in {self.poll_interval_seconds}s")
+            time.sleep(self.poll_interval_seconds)
+
+        output_path = f"{file_prefix}.output.jsonl"
+        self.backend.download(batch_id, output_path)
+        results = {}
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    results[result["custom_id"]] = result
+        logger.info(f"Batch {batch_id} completed with {len(results)}/{len(requests)} results")
+        return results
+
+    @staticmethod
+    def content(result: Optional[dict]) -> str:
+        """
+        :param result: A result line of ``run``, or None if the request has no result.
+        :return: The message content of the response.
+        :raises RuntimeError: If the request failed.
+        """
+        if result is None:
+            raise RuntimeError("Request has no result in the batch output")
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            error = result.get("error") or response.get("body", {}).get("error")
+            raise RuntimeError(f"Batch request {result['custom_id']} failed: {error}")
+        return response["body"]["choices"][0]["message"]["content"]
+
+    @staticmethod
+    def parse(result: Optional[dict], schema: type[BaseModel]) -> BaseModel:
+        """
+        :param result: A result line of ``run``.
+        :param schema: The pydantic model the response follows.
+        :return: The validated response.
+        :raises RuntimeError: If the request failed.
+        :raises pydantic.ValidationError: If the response doesn't match the schema.
+        """
+        return schema.model_validate_json(BatchRunner.content(result))
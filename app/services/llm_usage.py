@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from app.config import usage_config
+from app.services.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens: (input, cached input, output)
+DEFAULT_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+USAGE_GROUP_KEYS = ("project_id", "endpoint", "node", "model")
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    ts REAL NOT NULL,
+    project_id TEXT,
+    endpoint TEXT,
+    node TEXT,
+    model TEXT,
+    input_tokens INTEGER NOT NULL,
+    cached_input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    latency_ms REAL NOT NULL,
+    error TEXT
+)
+"""
+
+_usage_labels_var: ContextVar = ContextVar("llm_usage_labels", default={})
+
+
+@contextmanager
+def usage_labels(**labels):
+    """
+    Attribute the LLM calls made inside the block to a project, endpoint and/or graph node.
+    Labels of enclosing blocks are kept unless overridden; None values are ignored.
+
+    Usage: ``with usage_labels(project_id="p1", endpoint="/mcq"): ...``
+    """
+    merged = dict(_usage_labels_var.get())
+    merged.update({key: value for key, value in labels.items() if value is not None})
+    token = _usage_labels_var.set(merged)
+    try:
+        yield merged
+    finally:
+        _usage_labels_var.reset(token)
+
+
+class LLMUsageLedger(BaseCallbackHandler):
+    """
+    Callback handler that records the tokens, cost and latency of every LLM call in the
+    process, labelled with the project, endpoint and node from ``usage_labels``.
+
+    Records are aggregated in memory and periodically appended to a JSONL or SQLite store.
+    """
+
+    # Recording is cheap and lock protected, so it doesn't need an executor thread
+    run_inline = True
+
+    def __init__(self, store_path: str = None, flush_interval_seconds: float = 60,
+                 prices: Dict[str, Tuple[float, float, float]] = None, max_samples: int = 1000):
+        """
+        :param store_path: A .jsonl or .sqlite/.db file the records are flushed to; None keeps them in memory only.
+        :param flush_interval_seconds: Seconds between background flushes to the store.
+        :param prices: USD per 1M tokens by model as (input, cached input, output); defaults to DEFAULT_PRICES.
+        :param max_samples: Number of most recent latencies kept per group for percentiles.
+        """
+        super().__init__()
+        self.store_path = store_path
+        self.flush_interval_seconds = flush_interval_seconds
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._runs: Dict = {}
+        self._pending: List[dict] = []
+        self._flusher: Optional[threading.Thread] = None
+        self.reset()
+
+    @classmethod
+    def from_config(cls) -> "LLMUsageLedger":
+        """Create a ledger from the LLM_USAGE_* and LLM_PRICES settings."""
+        prices = dict(DEFAULT_PRICES)
+        if usage_config.prices:
+            prices.update({model: tuple(price) for model, price in json.loads(usage_config.prices).items()})
+        return cls(
+            store_path=usage_config.store_path or None,
+            flush_interval_seconds=usage_config.flush_interval_seconds,
+            prices=prices,
+        )
+
+    def reset(self) -> None:
+        """Drop the in-memory aggregates (records already flushed stay in the store)."""
+        with self._lock:
+            self._groups = defaultdict(self._new_group)
+
+    def _new_group(self) -> dict:
+        return {
+            "calls": 0,
+            "errors": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+            "cost_usd": 0.0,
+            "samples": deque(maxlen=self.max_samples),
+        }
+
+    def cost(self, model: str, input_tokens: int, cached_input_tokens: int, output_tokens: int) -> float:
+        """
+        :return: The USD cost of a call; 0 for models without a known price.
+        """
+        # Versioned model names (e.g. gpt-4.1-mini-2025-04-14) use the price of their base model
+        price = self.prices.get(model) or next(
+            (self.prices[name] for name in sorted(self.prices, key=len, reverse=True) if model.startswith(name + "-")),
+            None,
+        )
+        if price is None:
+            return 0.0
+        input_price, cached_price, output_price = price
+        uncached = max(input_tokens - cached_input_tokens, 0)
+        return (uncached * input_price + cached_input_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+    # Callback handler hooks
+
+    def _start(self, run_id, kwargs) -> None:
+        params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            self._runs[run_id] = (
+                time.perf_counter(),
+                dict(_usage_labels_var.get()),
+                params.get("model_name") or params.get("model") or "",
+            )
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        usage, model = {}, ""
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None:
+                    usage = getattr(message, "usage_metadata", None) or usage
+                    model = (message.response_metadata or {}).get("model_name") or model
+        self._finish(run_id, usage, model, None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._finish(run_id, {}, "", f"{type(error).__name__}: {str(error)}")
+
+    def _finish(self, run_id, usage: dict, model: str, error: Optional[str]) -> None:
+        with self._lock:
+            started, labels, start_model = self._runs.pop(run_id, (None, {}, ""))
+        if started is None:
+            return
+        input_tokens = usage.get("input_tokens", 0)
+        cached_input_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        model = model or start_model
+        self.record({
+            "ts": time.time(),
+            "project_id": labels.get("project_id"),
+            "endpoint": labels.get("endpoint"),
+            "node": labels.get("node"),
+            "model": model,
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": self.cost(model, input_tokens, cached_input_tokens, output_tokens),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": error,
+        })
+
+    # Aggregation and queries
+
+    def record(self, entry: dict) -> None:
+        """
+        Add one call record to the aggregates and the pending store writes.
+
+        :param entry: The call record, see ``_finish`` for its keys.
+        """
+        with self._lock:
+            group = self._groups[tuple(entry.get(key) for key in USAGE_GROUP_KEYS)]
+            group["calls"] += 1
+            group["errors"] += 1 if entry.get("error") else 0
+            group["input_tokens"] += entry["input_tokens"]
+            group["cached_input_tokens"] += entry["cached_input_tokens"]
+            group["output_tokens"] += entry["output_tokens"]
+            group["cost_usd"] += entry["cost_usd"]
+            group["samples"].append(entry["latency_ms"])
+            if self.store_path:
+                self._pending.append(entry)
+        if self.store_path:
+            self._ensure_flusher()
+
+    def summary(self, project_id: str = None, endpoint: str = None, node: str = None,
+                group_by: Tuple[str, ...] = ("project_id", "endpoint", "node")) -> List[dict]:
+        """
+        Aggregate the recorded calls since start (or the last reset).
+
+        :param project_id: Only include calls of this project.
+        :param endpoint: Only include calls made by this endpoint.
+        :param node: Only include calls made by this graph node.
+        :param group_by: Labels to group by, out of project_id, endpoint, node and model.
+        :return: Per-group calls, errors, token counts, cost and p50/p95 latency, costliest first.
+        """
+        unknown = set(group_by) - set(USAGE_GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported usage grouping: {', '.join(sorted(unknown))}")
+        filters = {"project_id": project_id, "endpoint": endpoint, "node": node}
+        with self._lock:
+            groups = {key: dict(stats, samples=list(stats["samples"])) for key, stats in self._groups.items()}
+
+        merged = {}
+        for key, stats in groups.items():
+            labels = dict(zip(USAGE_GROUP_KEYS, key))
+            if any(value is not None and labels[name] != value for name, value in filters.items()):
+                continue
+            out = merged.setdefault(tuple(labels[name] for name in group_by), {**self._new_group(), "samples": []})
+            for name in ("calls", "errors", "input_tokens", "cached_input_tokens", "output_tokens", "cost_usd"):
+                out[name] += stats[name]
+            out["samples"].extend(stats["samples"])
+
+        rows = [
+            {
+                **dict(zip(group_by, key)),
+                **{name: value for name, value in stats.items() if name != "samples"},
+                "cost_usd": round(stats["cost_usd"], 6),
+                "p50_ms": round(percentile(stats["samples"], 0.5), 1),
+                "p95_ms": round(percentile(stats["samples"], 0.95), 1),
+            }
+            for key, stats in merged.items()
+        ]
+        return sorted(rows, key=lambda row: row["cost_usd"], reverse=True)
+
+    # Persistence
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._flush_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name="llm-usage-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing LLM usage records: {str(e)}")
+
+    def flush(self) -> int:
+        """
+        Append the records collected since the last flush to the store.
+
+        :return: The number of records written.
+        """
+        if not self.store_path:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+            if not entries:
+                return 0
+            try:
+                self._write(entries)
+            except Exception:
+                # Keep the records for the next attempt
+                with self._lock:
+                    self._pending[:0] = entries
+                raise
+        logger.debug(f"Flushed {len(entries)} LLM usage records to {self.store_path}")
+        return len(entries)
+
+    def _write(self, entries: List[dict]) -> None:
+        directory = os.path.dirname(self.store_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.store_path.endswith(".jsonl"):
+            with open(self.store_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+            return
+        conn = sqlite3.connect(self.store_path)
+        try:
+            with conn:
+                conn.execute(_SQLITE_SCHEMA)
+                conn.executemany(
+                    "INSERT INTO llm_usage VALUES (:ts, :project_id, :endpoint, :node, :model, :input_tokens, "
+                    ":cached_input_tokens, :output_tokens, :cost_usd, :latency_ms, :error)",
+                    entries,
+                )
+        finally:
+            conn.close()
+
+
+llm_usage = LLMUsageLedger.from_config()
+
+# The default makes the ledger see every LLM call in the process without passing callbacks around
+_usage_ledger_var: ContextVar = ContextVar("llm_usage_ledger", default=llm_usage)
+register_configure_hook(_usage_ledger_var, inheritable=True)
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import random
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+from app.config import storage_config, mcq_config
+from app.models import MCQQuestion
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SHINGLE_SIZE = 5
+_ROWS_PER_BAND = 4
+
+# Serialises index file updates for the same project within this process
+_project_locks: Dict[str, threading.Lock] = {}
+_project_locks_guard = threading.Lock()
+
+
+def _project_lock(project_id: str) -> threading.Lock:
+    with _project_locks_guard:
+        return _project_locks.setdefault(project_id, threading.Lock())
+
+
+class MCQDedupIndex:
+    """
+    MinHash/LSH index of MCQ questions for one project, persisted as JSON
+    """
+
+    def __init__(self, project_id: str, threshold: float = None, num_perm: int = None):
+        """
+        Initialize an empty index for a project
+
+        Args:
+            project_id (str): The project ID
+            threshold (float, optional): Estimated Jaccard similarity at which two questions are duplicates
+            num_perm (int, optional): Number of MinHash permutations (must be a multiple of 4)
+        """
+        self.project_id = project_id
+        self.threshold = mcq_config.dedup_threshold if threshold is None else threshold
+        self.num_perm = num_perm or mcq_config.dedup_num_perm
+        if self.num_perm % _ROWS_PER_BAND:
+            raise ValueError(f"num_perm must be a multiple of {_ROWS_PER_BAND}, got {self.num_perm}")
+
+        # Fixed seed so signatures stay comparable across processes and restarts
+        rng = random.Random(self.num_perm)
+        self._perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(self.num_perm)
+        ]
+        self.entries: List[Dict[str, Any]] = []
+        self._new_entries: List[Dict[str, Any]] = []
+        self._buckets: Dict[Tuple[int, tuple], List[int]] = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(storage_config.mcq_files_path, self.project_id, "dedup_index.json")
+
+    @classmethod
+    def load(cls, project_id: str, threshold: float = None, num_perm: int = None) -> "MCQDedupIndex":
+        """
+        Load the persisted index of a project, or an empty one if none exists
+
+        Args:
+            project_id (str): The project ID
+            threshold (float, optional): Duplicate similarity threshold
+            num_perm (int, optional): Number of MinHash permutations
+
+        Returns:
+            MCQDedupIndex: The loaded index
+        """
+        index = cls(project_id, threshold, num_perm)
+        for entry in index._read_entries():
+            index._insert(entry)
+        logger.info(f"Loaded dedup index for project {project_id} with {len(index.entries)} questions")
+        return index
+
+    @staticmethod
+    def question_text(question: MCQQuestion) -> str:
+        """Text used to fingerprint a question."""
+        return f"{question.question} {question.correctAnswer}"
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+        if len(normalized) <= _SHINGLE_SIZE:
+            return {normalized}
+        return {normalized[i:i + _SHINGLE_SIZE] for i in range(len(normalized) - _SHINGLE_SIZE + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        """
+        Compute the MinHash signature of a text
+
+        Args:
+            text (str): The text to fingerprint
+
+        Returns:
+            List[int]: One minimum hash value per permutation
+        """
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in self._shingles(text)
+        ]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def _bands(self, signature: List[int]):
+        for band in range(0, self.num_perm, _ROWS_PER_BAND):
+            yield band, tuple(signature[band:band + _ROWS_PER_BAND])
+
+    @staticmethod
+    def _similarity(first: List[int], second: List[int]) -> float:
+        return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+    def find_duplicate(self, signature: List[int]) -> Optional[Dict[str, Any]]:
+        """
+        Find an indexed question that is a near-duplicate of the given signature
+
+        Args:
+            signature (List[int]): MinHash signature of the candidate question
+
+        Returns:
+            Optional[Dict[str, Any]]: The matching entry, or None
+        """
+        candidates = set()
+        for key in self._bands(signature):
+            candidates.update(self._buckets.get(key, ()))
+        for position in sorted(candidates):
+            entry = self.entries[position]
+            if self._similarity(signature, entry["signature"]) >= self.threshold:
+                return entry
+        return None
+
+    def _insert(self, entry: Dict[str, Any]) -> None:
+        position = len(self.entries)
+        self.entries.append(entry)
+        for key in self._bands(entry["signature"]):
+            self._buckets.setdefault(key, []).append(position)
+
+    def filter(self, questions: List[MCQQuestion]) -> Tuple[List[MCQQuestion], List[MCQQuestion]]:
+        """
+        Split questions into unique ones and near-duplicates
+
+        Unique questions are added to the in-memory index so later questions in
+        the same batch are compared against them too; call ``save`` to persist them.
+
+        Args:
+            questions (List[MCQQuestion]): The generated questions
+
+        Returns:
+            Tuple[List[MCQQuestion], List[MCQQuestion]]: Unique questions and dropped duplicates
+        """
+        unique, duplicates = [], []
+        for question in questions:
+            text = self.question_text(question)
+            signature = self.signature(text)
+            match = self.find_duplicate(signature)
+            if match:
+                logger.info(f"Dropping near-duplicate MCQ '{question.question}' (matches '{match['question']}')")
+                duplicates.append(question)
+                continue
+            entry = {"question": text, "signature": signature}
+            self._insert(entry)
+            self._new_entries.append(entry)
+            unique.append(question)
+        return unique, duplicates
+
+    def _read_entries(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading dedup index {self.path}: {str(e)}")
+            return []
+        if data.get("num_perm") != self.num_perm:
+            logger.warning(f"Ignoring dedup index {self.path} built with num_perm={data.get('num_perm')}")
+            return []
+        return data.get("entries", [])
+
+    def save(self) -> None:
+        """
+        Persist questions added since loading, merging with entries written concurrently
+        """
+        if not self._new_entries:
+            return
+        with _project_lock(self.project_id):
+            entries = self._read_entries()
+            known = {entry["question"] for entry in entries}
+            entries.extend(entry for entry in self._new_entries if entry["question"] not in known)
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"num_perm": self.num_perm, "entries": entries}, f)
+            os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(self._new_entries)} questions to dedup index for project {self.project_id}")
+        self._new_entries = []
@@ -1,13 +1,19 @@
 import os
 import logging
 import json
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.json import parse_partial_json
+from pydantic import ValidationError
 from app.services.s3_service import S3Service
 from app.services.ocr_service import OCRService
-from app.services.llm import LLMService
+from app.services.llm import llm_registry, llm_router, llm_rate_limiter
+from app.services.llm_batch import BatchRunner
+from app.services.mcq_dedup import MCQDedupIndex
 from app.config import storage_config, llm_config
-from app.models import MCQOption, MCQQuestion, MCQList
+from app.models import MCQOption, MCQQuestion, MCQList, MCQRepairList, MCQ_MIN_QUESTIONS, MCQ_MAX_QUESTIONS
 from app.tools.video_creation_tool import create_video
 
 logger = logging.getLogger(__name__)
@@ -17,6 +23,17 @@ class MCQService:
     Service to handle multiple-choice question generation from documents
     """
 
+    # Process-wide counters for structured output validation failures and repairs
+    _repair_stats_lock = threading.Lock()
+    _repair_stats = {
+        "generations": 0,
+        "validation_failures": 0,
+        "repaired": 0,
+        "repair_failures": 0,
+        "questions_salvaged": 0,
+        "questions_repaired": 0,
+    }
+
     @staticmethod
     def _write_debug_files(project_id: str, full_prompt: str, llm_response: Any, debug_info: dict = None) -> None:
         """
@@ -117,32 +134,7 @@ class MCQService:
             Dict[str, Any]: Generated MCQ content
         """
         try:
-            # Create project directory
-            project_dir = os.path.join(storage_config.mcq_files_path, project_id)
-            os.makedirs(project_dir, exist_ok=True)
-            
-            # Download and process each asset file
-            processed_texts = []
-            downloaded_files = []
-            
-            logger.info(f"Processing {len(asset_files)} asset files for project {project_id}")
-            
-            for file_url in asset_files:
-                try:
-                    # Download the file
-                    local_path = S3Service.download_from_public_url(file_url, project_dir)
-                    downloaded_files.append(local_path)
-                    
-                    # Extract text using OCR
-                    text_content = OCRService.extract_text(local_path)
-                    processed_texts.append(text_content)
-                    
-                    logger.info(f"Successfully processed file: {file_url}")
-                except Exception as e:
-                    logger.error(f"Error processing file {file_url}: {str(e)}")
-            
-            # Combine all extracted texts
-            combined_text = "\n\n".join(processed_texts)
+            combined_text, downloaded_files = MCQService._extract_asset_texts(project_id, asset_files)
             
             # Generate MCQs using LLM
             mcqs: MCQList = MCQService._generate_mcqs(system_prompt, combined_text, user_prompt, mcq_count, project_id)
@@ -154,29 +146,169 @@ class MCQService:
                 
             logger.info(f"MCQ generation complete for project {project_id}")
             # Call the video creation tool to create a video from the MCQs
-
-            mcq_list = mcqs.raw # Extract the raw MCQ list from the MCQList object
-            video_result = create_video(
-                title=f"MCQ Video - {project_id}",
-                desc="Automatically generated multiple choice questions video",
-                thumbnail_text="MCQ Quiz",
-                thumbnail_visual_desc="Educational quiz thumbnail with question marks and colorful design",
-                video_type="mcq",
-                raw=mcq_list,  # Pass the MCQList object
-                project_id=project_id
-            )
-
-            logger.info(f"Video creation result: {video_result}")
+            _, unique, duplicates = MCQService.create_mcq_video(project_id, mcqs.raw)
             # Return the results
             return {
                 "project_id": project_id,
-                "mcqs": mcqs,
+                "mcqs": MCQService._with_questions(mcqs, unique),
                 "processed_files": len(downloaded_files),
+                "duplicates_removed": len(duplicates),
             }
             
         except Exception as e:
             logger.error(f"Error processing MCQ request: {str(e)}")
             raise
+
+    @staticmethod
+    def process_mcq_batch(jobs: List[Dict[str, Any]], runner: BatchRunner = None) -> List[Dict[str, Any]]:
+        """
+        Process many MCQ requests through a provider batch API, for bulk runs that
+        don't need interactive latency
+        
+        The generation requests of all jobs are submitted as one batch; each result is
+        validated (and repaired with a regular call if needed) and then turned into a video.
+        
+        Args:
+            jobs (List[Dict[str, Any]]): Requests with project_id, system_prompt, asset_files,
+                user_prompt and optionally mcq_count
+            runner (BatchRunner, optional): The batch runner (default: from the LLM_BATCH_* settings)
+            
+        Returns:
+            List[Dict[str, Any]]: Per-job results, with status "success" or "failed"
+        """
+        runner = runner or BatchRunner.from_config()
+        prepared = []
+        for index, job in enumerate(jobs):
+            combined_text, downloaded_files = MCQService._extract_asset_texts(job["project_id"], job.get("asset_files", []))
+            document_text = MCQService.truncate_document(combined_text)
+            full_prompt = MCQService.build_mcq_prompt(
+                job["system_prompt"],
+                document_text,
+                job["user_prompt"],
+                MCQService.generation_instructions(job.get("mcq_count", 20)),
+            )
+            request = runner.chat_request(f"mcq-{index}", full_prompt, MCQList)
+            prepared.append((job, document_text, downloaded_files, request))
+        
+        logger.info(f"Submitting {len(jobs)} MCQ generation requests as one batch")
+        results = runner.run([request for *_, request in prepared], name="mcq")
+        
+        outcomes = []
+        for index, (job, document_text, downloaded_files, _) in enumerate(prepared):
+            project_id = job["project_id"]
+            try:
+                raw_response = {
+                    "raw": AIMessage(content=BatchRunner.content(results.get(f"mcq-{index}"))),
+                    "parsed": None,
+                    "parsing_error": None,
+                }
+                mcqs, _ = MCQService._validate_or_repair(
+                    llm_router, raw_response, job["system_prompt"], document_text, job["user_prompt"],
+                    job.get("mcq_count", 20), project_id
+                )
+                _, unique, duplicates = MCQService.create_mcq_video(project_id, mcqs.raw)
+            except Exception as e:
+                logger.error(f"Batch MCQ generation for project {project_id} failed: {str(e)}")
+                outcomes.append({"project_id": project_id, "status": "failed", "error": str(e)})
+                continue
+            outcomes.append({
+                "project_id": project_id,
+                "status": "success",
+                "mcqs": MCQService._with_questions(mcqs, unique),
+                "processed_files": len(downloaded_files),
+                "duplicates_removed": len(duplicates),
+            })
+        return outcomes
+
+    @staticmethod
+    def _extract_asset_texts(project_id: str, asset_files: List[str]) -> Tuple[str, List[str]]:
+        """
+        Download the asset files into the project directory and extract their text with OCR
+        
+        Args:
+            project_id (str): The project ID
+            asset_files (List[str]): List of S3 file URLs
+            
+        Returns:
+            Tuple[str, List[str]]: The combined text and the paths of the downloaded files
+        """
+        # Create project directory
+        project_dir = os.path.join(storage_config.mcq_files_path, project_id)
+        os.makedirs(project_dir, exist_ok=True)
+        
+        # Download and process each asset file
+        processed_texts = []
+        downloaded_files = []
+        
+        logger.info(f"Processing {len(asset_files)} asset files for project {project_id}")
+        
+        for file_url in asset_files:
+            try:
+                # Download the file
+                local_path = S3Service.download_from_public_url(file_url, project_dir)
+                downloaded_files.append(local_path)
+                
+                # Extract text using OCR
+                text_content = OCRService.extract_text(local_path)
+                processed_texts.append(text_content)
+                
+                logger.info(f"Successfully processed file: {file_url}")
+            except Exception as e:
+                logger.error(f"Error processing file {file_url}: {str(e)}")
+        
+        # Combine all extracted texts
+        return "\n\n".join(processed_texts), downloaded_files
+
+    @staticmethod
+    def create_mcq_video(project_id: str, mcq_list: List[MCQQuestion]) -> Tuple[Any, List[MCQQuestion], List[MCQQuestion]]:
+        """
+        Drop near-duplicate questions and create the MCQ video from the rest
+        
+        Args:
+            project_id (str): The project ID
+            mcq_list (List[MCQQuestion]): The generated questions
+            
+        Returns:
+            Tuple[Any, List[MCQQuestion], List[MCQQuestion]]: The video creation result, the questions
+                in the video and the removed duplicates
+        """
+        # Drop near-duplicates within this batch and of questions already used for this project
+        dedup_index = MCQDedupIndex.load(project_id)
+        mcq_list, duplicates = dedup_index.filter(mcq_list)
+        logger.info(f"Removed {len(duplicates)} near-duplicate MCQs, {len(mcq_list)} remaining")
+        if not mcq_list:
+            raise ValueError(f"All generated MCQs duplicate earlier questions for project {project_id}")
+        
+        video_result = create_video(
+            title=f"MCQ Video - {project_id}",
+            desc="Automatically generated multiple choice questions video",
+            thumbnail_text="MCQ Quiz",
+            thumbnail_visual_desc="Educational quiz thumbnail with question marks and colorful design",
+            video_type="mcq",
+            raw=mcq_list,  # Pass the MCQList object
+            project_id=project_id
+        )
+
+        logger.info(f"Video creation result: {video_result}")
+        # Only remember the questions once the video was created, so a failed run can be retried
+        dedup_index.save()
+        return video_result, mcq_list, duplicates
+
+    @staticmethod
+    def _with_questions(mcqs: MCQList, questions: List[MCQQuestion]) -> MCQList:
+        """
+        Copy of the MCQ list holding only the given questions, e.g. those left after deduplication
+        
+        Skips validation, since dropping duplicates may leave fewer than the minimum question count.
+        
+        Args:
+            mcqs (MCQList): The generated MCQs
+            questions (List[MCQQuestion]): The questions to keep
+            
+        Returns:
+            MCQList: The MCQ list with just those questions
+        """
+        return mcqs.model_copy(update={"raw": questions, "count": len(questions)})
     
     @staticmethod
     def debug_write_mcq_data(project_id: str, prompt: str, response: Any, additional_info: dict = None) -> str:
@@ -212,37 +344,33 @@ class MCQService:
             dict: Generated MCQs
         """
         try:
-            # Truncate document text if it's too long (context window limits)
-            max_chars = 20000  # Approximate limit - adjust based on your model
-            if len(document_text) > max_chars:
-                document_text = document_text[:max_chars] + "...[truncated]"
+            document_text = MCQService.truncate_document(document_text)
             
             # Prepare content for the LLM
-            full_prompt = f"""
-            {system_prompt}
-            
-            DOCUMENT CONTENT:
-            {document_text}
-            
-            USER QUERY:
-            {user_prompt}
-            
-            INSTRUCTIONS:
-            Generate exactly {mcq_count} multiple choice questions based on the document content.
-            Each question should have between 2-6 options with exactly one correct answer.
-            Ensure the questions are relevant to the document content and user query.
-            """
+            full_prompt = MCQService.build_mcq_prompt(
+                system_prompt,
+                document_text,
+                user_prompt,
+                MCQService.generation_instructions(mcq_count),
+            )
             
-            # Call the LLM for MCQ generation
-            llm = LLMService(llm_config.provider, llm_config.model_name, llm_config.api_key)
-            model = llm.model
+            # Call the LLM for MCQ generation; the router picks the healthiest provider and
+            # fails over on errors and timeouts, and clients are shared across requests
+            model = llm_router
             logger.info("Generating MCQs using LLM (structured output)...")
-            logger.info(f"Full prompt length: {len(full_prompt)} characters")
-            logger.debug(f"Full prompt content: {full_prompt[:500]}...")  # Log first 500 chars for debugging
+            prompt_text = MCQService._prompt_text(full_prompt)
+            logger.info(f"Full prompt length: {len(prompt_text)} characters")
+            logger.debug(f"Full prompt content: {prompt_text[:500]}...")  # Log first 500 chars for debugging
             
-            # Use structured output
-            structured_llm = model.with_structured_output(MCQList)
-            response = structured_llm.invoke(full_prompt)
+            # Use structured output with the plain JSON schema so that one malformed
+            # question does not fail the whole batch; validation happens in _validate_or_repair
+            structured_llm = llm_registry.structured(model, MCQList.model_json_schema(), include_raw=True)
+            with llm_rate_limiter.limit(project_id, llm_rate_limiter.estimate_tokens(full_prompt)) as usage:
+                raw_response = structured_llm.invoke(full_prompt)
+            cache_usage = MCQService.log_cache_usage("MCQ generation", usage)
+            response, repair_info = MCQService._validate_or_repair(
+                model, raw_response, system_prompt, document_text, user_prompt, mcq_count, project_id
+            )
             
             # Debug: Check what we got from the LLM
             logger.info(f"LLM response type: {type(response)}")
@@ -250,20 +378,22 @@ class MCQService:
             
             # Write debug files
             debug_info = {
-                "prompt_length": len(full_prompt),
+                "prompt_length": len(prompt_text),
                 "document_text_length": len(document_text),
                 "mcq_count_requested": mcq_count,
                 "llm_provider": llm_config.provider,
                 "llm_model": llm_config.model_name,
-                "temperature": llm_config.temperature
+                "temperature": llm_config.temperature,
+                **cache_usage,
+                **repair_info,
             }
             
             if project_id:
-                MCQService._write_debug_files(project_id, full_prompt, response, debug_info)
+                MCQService._write_debug_files(project_id, prompt_text, response, debug_info)
             else:
                 # Fallback to a generic project ID if not provided
                 fallback_project_id = f"mcq_debug_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                MCQService._write_debug_files(fallback_project_id, full_prompt, response, debug_info)
+                MCQService._write_debug_files(fallback_project_id, prompt_text, response, debug_info)
             
             result = response
             
@@ -271,3 +401,259 @@ class MCQService:
         except Exception as e:
             logger.error(f"Error generating MCQs: {str(e)}")
             raise
+
+    @staticmethod
+    def truncate_document(document_text: str, max_chars: int = 20000) -> str:
+        """
+        Truncate document text if it's too long (context window limits)
+        
+        Args:
+            document_text (str): Extracted document text
+            max_chars (int): Approximate limit - adjust based on your model
+            
+        Returns:
+            str: The document text, truncated if needed
+        """
+        if len(document_text) > max_chars:
+            return document_text[:max_chars] + "...[truncated]"
+        return document_text
+
+    @staticmethod
+    def generation_instructions(mcq_count: int) -> str:
+        """Instructions for generating a full batch of MCQs."""
+        return f"""Generate exactly {mcq_count} multiple choice questions based on the document content.
+            Each question should have between 2-6 options with exactly one correct answer.
+            Ensure the questions are relevant to the document content and user query."""
+
+    @staticmethod
+    def build_mcq_prompt(system_prompt: str, document_text: str, user_prompt: str, instructions: str) -> List[BaseMessage]:
+        """
+        Build the MCQ generation prompt from its parts
+        
+        The system prompt and the document come first as separate messages, so every
+        query, question count or repair on the same document shares a stable prefix
+        the provider can serve from its prompt cache; only the last message varies.
+        
+        Args:
+            system_prompt (str): System prompt for the LLM
+            document_text (str): Extracted (and truncated) document text
+            user_prompt (str): User prompt for the LLM
+            instructions (str): Generation instructions appended at the end
+            
+        Returns:
+            List[BaseMessage]: The prompt messages, stable prefix first
+        """
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"DOCUMENT CONTENT:\n{document_text}"),
+            HumanMessage(content=f"USER QUERY:\n{user_prompt}\n\nINSTRUCTIONS:\n{instructions}"),
+        ]
+
+    @staticmethod
+    def _prompt_text(messages: List[BaseMessage]) -> str:
+        """Render prompt messages as plain text for logs and debug files."""
+        return "\n\n".join(f"[{message.type}]\n{message.content}" for message in messages)
+
+    @staticmethod
+    def log_cache_usage(call: str, usage) -> Dict[str, int]:
+        """
+        Log how much of a call's input was served from the provider's prompt cache
+        
+        Args:
+            call (str): Name of the call for the log
+            usage (UsageTracker): Token usage of the call
+            
+        Returns:
+            Dict[str, int]: The input and cached input token counts
+        """
+        logger.info(
+            f"{call}: {usage.cached_input_tokens} of {usage.input_tokens} input tokens served from the prompt cache"
+        )
+        return {"input_tokens": usage.input_tokens, "cached_input_tokens": usage.cached_input_tokens}
+
+    @staticmethod
+    def _extract_payload(response: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the JSON payload from an ``include_raw`` structured output response
+        
+        Falls back to a partial JSON parse of the raw message content so that
+        complete questions can still be recovered from a truncated response.
+        
+        Args:
+            response (Dict[str, Any]): Dict with ``raw``, ``parsed`` and ``parsing_error`` keys
+            
+        Returns:
+            Dict[str, Any]: The parsed payload, or an empty dict if nothing could be recovered
+        """
+        parsed = response.get("parsed")
+        if isinstance(parsed, dict):
+            return parsed
+        
+        content = getattr(response.get("raw"), "content", None)
+        if isinstance(content, str) and content:
+            try:
+                salvaged = parse_partial_json(content)
+            except Exception as e:
+                logger.warning(f"Could not parse raw MCQ response: {str(e)}")
+                salvaged = None
+            if isinstance(salvaged, dict):
+                return salvaged
+        return {}
+
+    @staticmethod
+    def _tolerant_parse(payload: Dict[str, Any]) -> Tuple[List[MCQQuestion], int]:
+        """
+        Validate each question of a payload individually
+        
+        Args:
+            payload (Dict[str, Any]): Payload with a ``raw`` list of question dicts
+            
+        Returns:
+            Tuple[List[MCQQuestion], int]: The valid questions and the number of invalid ones
+        """
+        valid_questions = []
+        invalid_count = 0
+        items = payload.get("raw")
+        for item in items if isinstance(items, list) else []:
+            try:
+                valid_questions.append(MCQQuestion.model_validate(item))
+            except ValidationError:
+                invalid_count += 1
+        return valid_questions, invalid_count
+
+    @staticmethod
+    def _validate_or_repair(model, response: Dict[str, Any], system_prompt: str, document_text: str,
+                            user_prompt: str, mcq_count: int, project_id: str = None) -> Tuple[MCQList, Dict[str, Any]]:
+        """
+        Validate the structured output and repair it when validation fails
+        
+        Valid questions are kept and only the missing or invalid ones are
+        requested again in a small follow-up call.
+        
+        Args:
+            model: The chat model used for the follow-up call
+            response (Dict[str, Any]): The ``include_raw`` structured output response
+            system_prompt (str): System prompt for the LLM
+            document_text (str): Extracted (and truncated) document text
+            user_prompt (str): User prompt for the LLM
+            mcq_count (int): Number of MCQs requested
+            project_id (str, optional): Project the follow-up call is rate limited under
+            
+        Returns:
+            Tuple[MCQList, Dict[str, Any]]: The validated MCQs and repair details for debugging
+        """
+        payload = MCQService._extract_payload(response)
+        try:
+            mcqs = MCQList.model_validate(payload)
+            MCQService.record_repair_stats(validation_failed=False)
+            return mcqs, {"repaired": False}
+        except ValidationError as e:
+            logger.warning(f"MCQ structured output failed validation ({e.error_count()} errors), repairing")
+        
+        valid_questions, invalid_count = MCQService._tolerant_parse(payload)
+        valid_questions = valid_questions[:MCQ_MAX_QUESTIONS]
+        target_count = min(max(mcq_count, MCQ_MIN_QUESTIONS), MCQ_MAX_QUESTIONS)
+        missing_count = max(target_count - len(valid_questions), 0)
+        logger.info(
+            f"Kept {len(valid_questions)} valid questions, {invalid_count} invalid, "
+            f"requesting {missing_count} replacements"
+        )
+        
+        replacements = []
+        try:
+            if missing_count:
+                replacements = MCQService.request_replacements(
+                    model, system_prompt, document_text, user_prompt, valid_questions, missing_count, project_id
+                )[:missing_count]
+            questions = valid_questions + replacements
+            mcqs = MCQList(count=len(questions), raw=questions)
+        except Exception:
+            MCQService.record_repair_stats(validation_failed=True, repaired=False)
+            raise
+        
+        MCQService.record_repair_stats(
+            validation_failed=True,
+            repaired=True,
+            questions_salvaged=len(valid_questions),
+            questions_repaired=len(replacements),
+        )
+        return mcqs, {
+            "repaired": True,
+            "questions_salvaged": len(valid_questions),
+            "questions_invalid": invalid_count,
+            "questions_repaired": len(replacements),
+        }
+
+    @staticmethod
+    def request_replacements(model, system_prompt: str, document_text: str, user_prompt: str,
+                              existing_questions: List[MCQQuestion], missing_count: int,
+                              project_id: str = None) -> List[MCQQuestion]:
+        """
+        Request replacement questions for the ones that were missing or invalid
+        
+        Args:
+            model: The chat model used for the follow-up call
+            system_prompt (str): System prompt for the LLM
+            document_text (str): Extracted (and truncated) document text
+            user_prompt (str): User prompt for the LLM
+            existing_questions (List[MCQQuestion]): Questions already kept, to avoid repeats
+            missing_count (int): Number of questions to request
+            project_id (str, optional): Project the call is rate limited under
+            
+        Returns:
+            List[MCQQuestion]: The valid replacement questions
+        """
+        existing = "\n".join(f"- {question.question}" for question in existing_questions)
+        repair_prompt = MCQService.build_mcq_prompt(
+            system_prompt,
+            document_text,
+            user_prompt,
+            f"""Generate exactly {missing_count} additional multiple choice questions based on the document content.
+            Each question should have between 2-6 options with exactly one correct answer.
+            Do not repeat any of these existing questions:
+            {existing}""",
+        )
+        logger.info(
+            f"Requesting {missing_count} replacement MCQs "
+            f"(prompt length: {len(MCQService._prompt_text(repair_prompt))} characters)"
+        )
+        
+        structured_llm = llm_registry.structured(model, MCQRepairList.model_json_schema(), include_raw=True)
+        with llm_rate_limiter.limit(project_id, llm_rate_limiter.estimate_tokens(repair_prompt)) as usage:
+            response = structured_llm.invoke(repair_prompt)
+        MCQService.log_cache_usage("MCQ repair", usage)
+        replacements, invalid_count = MCQService._tolerant_parse(MCQService._extract_payload(response))
+        if invalid_count:
+            logger.warning(f"Dropped {invalid_count} invalid replacement questions")
+        return replacements
+
+    @staticmethod
+    def record_repair_stats(validation_failed: bool, repaired: bool = False,
+                             questions_salvaged: int = 0, questions_repaired: int = 0) -> None:
+        """Update the process-wide repair counters."""
+        with MCQService._repair_stats_lock:
+            stats = MCQService._repair_stats
+            stats["generations"] += 1
+            if validation_failed:
+                stats["validation_failures"] += 1
+                stats["repaired" if repaired else "repair_failures"] += 1
+                stats["questions_salvaged"] += questions_salvaged
+                stats["questions_repaired"] += questions_repaired
+
+    @staticmethod
+    def get_repair_stats() -> Dict[str, Any]:
+        """
+        Get the structured output repair counters
+        
+        Returns:
+            Dict[str, Any]: The counters plus validation failure and repair rates
+        """
+        with MCQService._repair_stats_lock:
+            stats = dict(MCQService._repair_stats)
+        stats["validation_failure_rate"] = (
+            stats["validation_failures"] / stats["generations"] if stats["generations"] else 0.0
+        )
+        stats["repair_rate"] = (
+            stats["repaired"] / stats["validation_failures"] if stats["validation_failures"] else 0.0
+        )
+        return stats
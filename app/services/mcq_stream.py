@@ -0,0 +1,229 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.models import MCQList, MCQQuestion, MCQ_MIN_QUESTIONS, MCQ_MAX_QUESTIONS
+from app.services.llm import llm_router, llm_rate_limiter, llm_concurrency
+from app.services.mcq_service import MCQService
+
+logger = logging.getLogger(__name__)
+
+
+class MCQStreamParser:
+    """
+    Incremental parser for a streamed MCQList JSON document
+
+    Feed the text chunks as they arrive; each question object of the ``raw``
+    array is returned as soon as its closing brace has been received.
+    """
+
+    def __init__(self, array_key: str = "raw"):
+        """
+        Initialize the parser
+
+        Args:
+            array_key (str): Key of the top-level array holding the questions
+        """
+        self.array_key = array_key
+        self._stack: List[str] = []  # Open containers, '{' or '['
+        self._keys: List[Optional[str]] = []  # Current key of each open container
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_string: Optional[str] = None
+        self._capture: Optional[List[str]] = None  # Text of the question being received
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Parse the next chunk of the stream
+
+        Args:
+            text (str): The next chunk of JSON text
+
+        Returns:
+            List[Any]: The question objects completed by this chunk; None for one that is not valid JSON
+        """
+        completed = []
+        for char in text:
+            if self._capture is not None:
+                self._capture.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string)
+                elif len(self._stack) == 1:
+                    # Only keys of the top-level object are needed
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char == ":" and self._stack and self._stack[-1] == "{":
+                self._keys[-1] = self._last_string
+            elif char in "{[":
+                if (char == "{" and self._capture is None and self._stack == ["{", "["]
+                        and self._keys[0] == self.array_key):
+                    self._capture = ["{"]
+                self._stack.append(char)
+                self._keys.append(None)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                self._keys.pop()
+                if self._capture is not None and len(self._stack) == 2:
+                    try:
+                        completed.append(json.loads("".join(self._capture)))
+                    except ValueError:
+                        completed.append(None)
+                    self._capture = None
+        return completed
+
+
+def _response_format() -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "MCQList", "schema": MCQList.model_json_schema(), "strict": False},
+    }
+
+
+def _chunk_text(chunk) -> str:
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+async def astream_mcqs(system_prompt: str, document_text: str, user_prompt: str, mcq_count: int = 20,
+                       project_id: str = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate MCQs and yield each question as soon as it has been received and validated
+
+    Questions that fail validation are reported and, once the stream ends, replaced
+    in a follow-up call like the non-streaming path does.
+
+    Args:
+        system_prompt (str): System prompt for the LLM
+        document_text (str): Extracted document text
+        user_prompt (str): User prompt for the LLM
+        mcq_count (int): Number of MCQs to generate
+        project_id (str, optional): Project the calls are rate limited under
+
+    Yields:
+        Dict[str, Any]: "question" and "invalid" events, then a "done" event with the
+        validated MCQList and timings, or an "error" event
+    """
+    started = time.perf_counter()
+    first_question_ms = None
+    questions: List[MCQQuestion] = []
+    invalid_count = 0
+    document_text = MCQService.truncate_document(document_text)
+    full_prompt = MCQService.build_mcq_prompt(
+        system_prompt, document_text, user_prompt, MCQService.generation_instructions(mcq_count)
+    )
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    # Streams can't fail over once output has been used, so take the currently preferred route
+    route = llm_router.ordered_routes()[0]
+    model = llm_router.model_for(route).bind(response_format=_response_format())
+    parser = MCQStreamParser()
+    # The call runs in its own task and hands events over through a queue, so the rate limiter
+    # reservation and the concurrency slot aren't held while a slow client reads the stream
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def generate():
+        nonlocal invalid_count, first_question_ms
+        try:
+            async with llm_rate_limiter.alimit(project_id, llm_rate_limiter.estimate_tokens(full_prompt)) as usage:
+                async with llm_concurrency.slot():
+                    # Ask for the usage chunk so streamed calls report (cached) tokens too
+                    async for chunk in model.astream(full_prompt, stream_usage=True):
+                        for index, item in enumerate(parser.feed(_chunk_text(chunk)), start=len(questions) + invalid_count):
+                            try:
+                                question = MCQQuestion.model_validate(item)
+                            except ValidationError as e:
+                                invalid_count += 1
+                                events.put_nowait({
+                                    "event": "invalid", "index": index, "error": str(e), "elapsed_ms": elapsed_ms(),
+                                })
+                                continue
+                            if len(questions) >= MCQ_MAX_QUESTIONS:
+                                continue
+                            questions.append(question)
+                            if first_question_ms is None:
+                                first_question_ms = elapsed_ms()
+                            events.put_nowait({
+                                "event": "question",
+                                "index": len(questions) - 1,
+                                "question": question.model_dump(),
+                                "elapsed_ms": elapsed_ms(),
+                            })
+            return usage
+        finally:
+            events.put_nowait(None)
+
+    generation = asyncio.create_task(generate())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        usage = await generation
+        llm_router.record(route, time.perf_counter() - started, True)
+        cache_usage = MCQService.log_cache_usage("Streamed MCQ generation", usage)
+
+        target_count = min(max(mcq_count, MCQ_MIN_QUESTIONS), MCQ_MAX_QUESTIONS)
+        missing_count = max(target_count - len(questions), 0)
+        repaired_count = 0
+        if missing_count:
+            logger.info(f"Streamed {len(questions)} valid MCQs, requesting {missing_count} replacements")
+            replacements = await asyncio.to_thread(
+                MCQService.request_replacements,
+                llm_router, system_prompt, document_text, user_prompt, questions, missing_count, project_id,
+            )
+            for question in replacements[:missing_count]:
+                questions.append(question)
+                repaired_count += 1
+                yield {
+                    "event": "question",
+                    "index": len(questions) - 1,
+                    "question": question.model_dump(),
+                    "repaired": True,
+                    "elapsed_ms": elapsed_ms(),
+                }
+
+        mcqs = MCQList(count=len(questions), raw=questions)
+    except Exception as e:
+        if not questions and first_question_ms is None:
+            llm_router.record(route, time.perf_counter() - started, False)
+        logger.error(f"Error streaming MCQs: {str(e)}")
+        yield {"event": "error", "error": str(e), "elapsed_ms": elapsed_ms()}
+        return
+    finally:
+        # The client may have gone away mid-stream
+        generation.cancel()
+
+    # Reaching a valid MCQList means any shortfall was repaired
+    MCQService.record_repair_stats(
+        validation_failed=bool(invalid_count or missing_count),
+        repaired=True,
+        questions_salvaged=len(questions) - repaired_count,
+        questions_repaired=repaired_count,
+    )
+    yield {
+        "event": "done",
+        "mcqs": mcqs,
+        "count": mcqs.count,
+        "invalid": invalid_count,
+        "repaired": repaired_count,
+        **cache_usage,
+        "first_question_ms": first_question_ms,
+        "elapsed_ms": elapsed_ms(),
+    }
@@ -1,8 +1,249 @@
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Tuple
+
 from langchain_core.prompts import ChatPromptTemplate
 
+from app.config import prompt_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_VERSION = "v1"
+
+# Built-in chat prompt templates: name -> version -> (role, template) messages.
+# System messages hold no variables, so they form a stable prefix that providers can
+# serve from their prompt cache; the topic and other inputs go into the user message.
+PROMPT_TEMPLATES: Dict[str, Dict[str, List[Tuple[str, str]]]] = {
+    "create_titles_thumbnails": {
+        "v1": [
+            (
+                "system",
+                "you are expert youtube content creator specialized in creating quotes types of video data like, Generating good list of title and thumbnail text for given topics.",
+            ),
+            (
+                "user",
+                "create list of titles and a list of thumbnail texts for this  {topic}. each list should contains 10 items.",
+            ),
+        ],
+    },
+    "find_best_title_thumbnail": {
+        "v1": [
+            (
+                "system",
+                "you are expert youtube content creator specialized in creating quotes types of video data like, selecting best title and thumbnail text for given list of titles and thumbnail texts for a topic.",
+            ),
+            (
+                "user",
+                "select best title and thumbnail text from given list of titles and thumbnail texts for this {topic}. \n\n **Title List:** {titles} \n\n **Thumbnail Text List:** {thumbnail_text_list}",
+            ),
+        ],
+    },
+    "create_and_select_title_thumbnail": {
+        "v1": [
+            (
+                "system",
+                "you are expert youtube content creator specialized in creating quotes types of video data like, Generating good list of title and thumbnail text for given topics and selecting the best of them.",
+            ),
+            (
+                "user",
+                "create list of titles and a list of thumbnail texts for this  {topic}. each list should contains 10 items. then select best title and thumbnail text from these lists.",
+            ),
+        ],
+    },
+    "create_quotes": {
+        "v1": [
+            (
+                "system",
+                "you are expert youtube content creator specialized in creating quotes types of video data like, generating good list of quotes for given title and thumbnail text for a topic.",
+            ),
+            (
+                "user",
+                "create a list of 40-50 quotes for this {topic} with **Title:** {best_title} and **Thumbnail_text:** {best_thumbnail_text}.",
+            ),
+        ],
+    },
+    "create_thumbnail_visual_desc": {
+        "v1": [
+            (
+                "system",
+                "you are an expert midjourney prompt creator specialized in creating youtube thumbnails images with small and concise prompts. Use oil painting style  and black, red, yellow, white colors scheme",
+            ),
+            (
+                "user",
+                "create a image description for youtube thumbnail image for title {best_title} and a place in image to write thumbnail text \"{best_thumbnail_text}\" manually after generating the image.",
+            ),
+        ],
+    },
+    "create_description": {
+        "v1": [
+            (
+                "system",
+                "you are expert youtube content creator specialized in creating description for given title and thumbnail text for a topic.",
+            ),
+            (
+                "user",
+                "create a description for the youtube video about this *{topic}* topic for this **Title: {best_title} ** and **Thumbnail_text: {best_thumbnail_text}**.",
+            ),
+        ],
+    },
+}
+
+
+class PromptRegistry:
+    """
+    Chat prompt templates by name and version, each compiled once and shared by all callers.
+
+    The version used for a name is selected with PROMPT_VERSIONS, and further versions can be
+    added from a JSON file (PROMPT_TEMPLATES_PATH), so prompt versions can be compared without
+    code changes.
+    """
+
+    def __init__(self, templates: Dict[str, Dict[str, List[Tuple[str, str]]]] = None,
+                 versions: Dict[str, str] = None):
+        """
+        Initialize the registry
+
+        Args:
+            templates (dict, optional): name -> version -> (role, template) messages
+            versions (dict, optional): name -> version to use instead of the default version
+        """
+        self._templates = {name: dict(by_version) for name, by_version in (templates or {}).items()}
+        self._versions = dict(versions or {})
+        self._compiled: Dict[Tuple[str, str], ChatPromptTemplate] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "PromptRegistry":
+        """Create a registry with the built-in templates and the PROMPT_* settings."""
+        registry = cls(PROMPT_TEMPLATES, cls.parse_versions(prompt_config.versions))
+        if prompt_config.templates_path:
+            registry.load(prompt_config.templates_path)
+        return registry
+
+    @staticmethod
+    def parse_versions(value: str) -> Dict[str, str]:
+        """
+        Parse a version selection like "create_quotes=v2,create_description=v3"
+
+        Args:
+            value (str): Comma separated name=version pairs
+
+        Returns:
+            Dict[str, str]: The selected version per prompt name
+        """
+        versions = {}
+        for item in filter(None, (part.strip() for part in value.split(","))):
+            name, _, version = item.partition("=")
+            if not version:
+                raise ValueError(f"Invalid prompt version selection: {item}")
+            versions[name.strip()] = version.strip()
+        return versions
+
+    def load(self, path: str) -> None:
+        """
+        Add the templates of a JSON file shaped like {name: {version: [[role, template], ...]}}
+
+        Args:
+            path (str): Path of the JSON file
+        """
+        with open(path, encoding="utf-8") as f:
+            templates = json.load(f)
+        for name, by_version in templates.items():
+            for version, messages in by_version.items():
+                self.register(name, version, [tuple(message) for message in messages])
+        logger.info(f"Loaded prompt templates from {path}")
+
+    def register(self, name: str, version: str, messages: List[Tuple[str, str]]) -> None:
+        """
+        Add or replace a template version
+
+        Args:
+            name (str): The prompt name
+            version (str): The version label
+            messages (List[Tuple[str, str]]): The (role, template) messages
+        """
+        with self._lock:
+            self._templates.setdefault(name, {})[version] = list(messages)
+            self._compiled.pop((name, version), None)
+
+    def names(self) -> List[str]:
+        """
+        Returns:
+            List[str]: The registered prompt names
+        """
+        return list(self._templates)
+
+    def versions(self, name: str) -> List[str]:
+        """
+        Returns:
+            List[str]: The registered versions of a prompt
+        """
+        return list(self._templates.get(name, {}))
+
+    def selected_version(self, name: str) -> str:
+        """
+        Returns:
+            str: The version used for a prompt when none is given
+        """
+        return self._versions.get(name, DEFAULT_PROMPT_VERSION)
+
+    def get(self, name: str, version: str = None) -> ChatPromptTemplate:
+        """
+        Get the compiled template of a prompt, compiling it on first use
+
+        Args:
+            name (str): The prompt name
+            version (str, optional): The version; the selected version by default
+
+        Returns:
+            ChatPromptTemplate: The shared compiled template
+        """
+        version = version or self.selected_version(name)
+        key = (name, version)
+        template = self._compiled.get(key)
+        if template is not None:
+            return template
+        with self._lock:
+            if key not in self._compiled:
+                messages = self._templates.get(name, {}).get(version)
+                if messages is None:
+                    raise ValueError(f"Unknown prompt: {name} version {version}")
+                self._compiled[key] = ChatPromptTemplate(messages)
+            return self._compiled[key]
+
+    def validate(self, variables: Iterable[str], names: Iterable[str] = None) -> None:
+        """
+        Compile the selected version of each prompt and check that every variable it
+        uses is available, e.g. the keys of the graph state
+
+        Args:
+            variables (Iterable[str]): The available variable names
+            names (Iterable[str], optional): The prompts to check; all by default
+
+        Raises:
+            ValueError: If a prompt is unknown or uses a variable that isn't available
+        """
+        available = set(variables)
+        problems = []
+        for name in names if names is not None else self.names():
+            template = self.get(name)
+            missing = sorted(set(template.input_variables) - available)
+            if missing:
+                problems.append(f"{name} ({self.selected_version(name)}): {', '.join(missing)}")
+        if problems:
+            raise ValueError(f"Prompt templates use unknown variables: {'; '.join(problems)}")
+
+
+prompt_registry = PromptRegistry.from_config()
+
+
 class Prompts:
     """
     This class contains the prompts used in the application.
+
+    The chat prompts come from the prompt registry, so each call returns the same
+    compiled template instead of building a new one.
     """
 
     @staticmethod
@@ -20,75 +261,24 @@ class Prompts:
 
     @staticmethod
     def create_titles_thumbnails_prompt() -> ChatPromptTemplate:
-        return ChatPromptTemplate(
-            [
-                (
-                    "system",
-                    "you are expert youtube content creator specialized in creating quotes types of video data like, Generating good list of title and thumbnail text for given topics.",
-                ),
-                (
-                    "user",
-                    "create list of titles and a list of thumbnail texts for this  {topic}. each list should contains 10 items.",
-                ),
-            ]
-        )
+        return prompt_registry.get("create_titles_thumbnails")
 
     @staticmethod
     def find_best_title_thumbnail_prompt() -> ChatPromptTemplate:
-        return ChatPromptTemplate(
-            [
-                (
-                    "system",
-                    "you are expert youtube content creator specialized in creating quotes types of video data like, selecting best title and thumbnail text for given list of titles and thumbnail texts for this {topic}.",
-                ),
-                (
-                    "user",
-                    "select best title and thumbnail text from given list of titles and thumbnail texts. \n\n **Title List:** {titles} \n\n **Thumbnail Text List:** {thumbnail_text_list}",
-                ),
-            ]
-        )
+        return prompt_registry.get("find_best_title_thumbnail")
+
+    @staticmethod
+    def create_and_select_title_thumbnail_prompt() -> ChatPromptTemplate:
+        return prompt_registry.get("create_and_select_title_thumbnail")
 
     @staticmethod
     def create_quotes_prompt() -> ChatPromptTemplate:
-        return ChatPromptTemplate(
-            [
-                (
-                    "system",
-                    "you are expert youtube content creator specialized in creating quotes types of video data like, generating good list of quotes for given title and thumbnail text for this {topic}.",
-                ),
-                (
-                    "user",
-                    "create a list of 40-50 quotes for this **Title:** {best_title} and **Thumbnail_text:** {best_thumbnail_text}.",
-                ),
-            ]
-        )
+        return prompt_registry.get("create_quotes")
 
     @staticmethod
     def create_thumbnail_visual_desc_prompt() -> ChatPromptTemplate:
-        return ChatPromptTemplate(
-            [
-                (
-                    "system",
-                    "you are an expert midjourney prompt creator specialized in creating youtube thumbnails images with small and concise prompts. Use oil painting style  and black, red, yellow, white colors scheme",
-                ),
-                (
-                    "user",                    
-                    "create a image description for youtube thumbnail image for title {best_title} and a place in image to write thumbnail text \"{best_thumbnail_text}\" manually after generating the image.",
-                ),
-            ]
-        )
+        return prompt_registry.get("create_thumbnail_visual_desc")
 
     @staticmethod
     def create_description_prompt() -> ChatPromptTemplate:
-        return ChatPromptTemplate(
-            [
-                (
-                    "system",
-                    "you are expert youtube content creator specialized in creating description for given title and thumbnail text for this *{topic}* topic.",
-                ),
-                (
-                    "user",
-                    "create a description for the youtube video for this **Title: {best_title} ** and **Thumbnail_text: {best_thumbnail_text}**.",
-                ),
-            ]
-        )
\ No newline at end of file
+        return prompt_registry.get("create_description")
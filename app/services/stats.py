@@ -0,0 +1,20 @@
+"""
+Summary statistics shared by the latency and wait-time metrics.
+"""
+
+from typing import Iterable, Optional
+
+
+def percentile(samples: Iterable[float], fraction: float, default: Optional[float] = 0.0) -> Optional[float]:
+    """
+    Nearest-rank percentile of a set of samples.
+
+    :param samples: The samples, in any order.
+    :param fraction: The percentile as a fraction, e.g. 0.95 for p95.
+    :param default: The value returned when there are no samples.
+    :return: The sample at that rank.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return default
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,144 @@
+import os
+import base64
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+from app.config import llm_config, thumbnail_config
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailService:
+    """
+    Async thumbnail image generation, stored under a content hash of the visual prompt
+    """
+
+    def __init__(
+        self,
+        image_dir: str,
+        api_key: str,
+        model: str = "dall-e-3",
+        size: str = "1792x1024",
+        quality: str = "standard",
+        base_url: Optional[str] = None,
+        timeout_seconds: float = 120,
+    ):
+        """
+        Initialize the service
+
+        Args:
+            image_dir (str): Directory the generated images are stored in
+            api_key (str): API key of the image API
+            model (str): Image model name
+            size (str): Image size
+            quality (str): Image quality
+            base_url (str, optional): Base URL of an OpenAI compatible image API
+            timeout_seconds (float): Timeout for the generation and download requests
+        """
+        self.image_dir = image_dir
+        self.api_key = api_key
+        self.model = model
+        self.size = size
+        self.quality = quality
+        self.base_url = base_url
+        self.timeout_seconds = timeout_seconds
+        # Generations in flight, so concurrent runs with the same prompt share one API call
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_config(cls) -> "ThumbnailService":
+        """Create a service from the THUMBNAIL_* settings."""
+        return cls(
+            image_dir=thumbnail_config.image_dir,
+            api_key=llm_config.api_key,
+            model=thumbnail_config.model,
+            size=thumbnail_config.size,
+            quality=thumbnail_config.quality,
+            base_url=thumbnail_config.api_base_url or None,
+            timeout_seconds=thumbnail_config.timeout_seconds,
+        )
+
+    def content_hash(self, prompt: str) -> str:
+        """
+        Hash a visual prompt together with the settings that affect the image
+
+        Args:
+            prompt (str): The visual description of the thumbnail
+
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        key = "\n".join([self.model, self.size, self.quality, prompt.strip()])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def image_path(self, prompt: str) -> str:
+        """
+        Get the path a prompt's image is stored at
+
+        Args:
+            prompt (str): The visual description of the thumbnail
+
+        Returns:
+            str: Path of the PNG file
+        """
+        return os.path.join(self.image_dir, f"{self.content_hash(prompt)}.png")
+
+    async def get_or_create(self, prompt: str) -> str:
+        """
+        Get the stored image for a prompt, generating it if it doesn't exist yet
+
+        Args:
+            prompt (str): The visual description of the thumbnail
+
+        Returns:
+            str: Path of the PNG file
+        """
+        path = self.image_path(prompt)
+        if os.path.exists(path):
+            logger.info(f"Reusing stored thumbnail {path}")
+            return path
+
+        digest = os.path.basename(path)
+        task = self._pending.get(digest)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._generate(prompt, path))
+            self._pending[digest] = task
+            task.add_done_callback(lambda _: self._pending.pop(digest, None))
+        return await asyncio.shield(task)
+
+    async def _generate(self, prompt: str, path: str) -> str:
+        logger.info(f"Generating thumbnail image for prompt: {prompt}")
+        client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout_seconds)
+        try:
+            response = await client.images.generate(
+                model=self.model,
+                prompt=prompt,
+                size=self.size,
+                quality=self.quality,
+                n=1,
+            )
+        finally:
+            await client.close()
+
+        image = response.data[0]
+        if image.b64_json:
+            content = base64.b64decode(image.b64_json)
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout_seconds) as http_client:
+                image_response = await http_client.get(image.url)
+                image_response.raise_for_status()
+                content = image_response.content
+
+        # Write to a temporary file first so readers never see a partial image
+        os.makedirs(self.image_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logger.info(f"Thumbnail image saved to {path}")
+        return path
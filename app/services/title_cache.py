@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.config import graph_config
+
+logger = logging.getLogger(__name__)
+
+
+class TitleCache:
+    """
+    Per-topic pool of generated titles and thumbnail texts with a used-title history
+
+    In memory unless a path is given. The async methods write the file in a worker
+    thread so graph nodes don't block the event loop on disk I/O.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600, min_unused: int = 3):
+        """
+        Initialize the cache, loading persisted pools if a path is given
+
+        Args:
+            path (str, optional): JSON file to persist the cache to; in-memory only if None
+            ttl_seconds (float): How long a generated pool may be reused; 0 disables reuse
+            min_unused (int): Minimum number of unused titles for a pool to be reused
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.min_unused = min_unused
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._version = 0  # Bumped per snapshot, so an older snapshot never overwrites a newer one
+        self._written_version = 0
+        self._topics: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._topics = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading title cache {path}: {str(e)}")
+
+    @classmethod
+    def from_config(cls) -> "TitleCache":
+        """Create a cache from the TITLE_CACHE_* settings."""
+        return cls(
+            path=graph_config.title_cache_path or None,
+            ttl_seconds=graph_config.title_cache_ttl_seconds,
+            min_unused=graph_config.title_cache_min_unused,
+        )
+
+    def _entry(self, topic: str) -> dict:
+        return self._topics.setdefault(topic, {
+            "created_at": 0.0,
+            "titles": [],
+            "thumbnail_text_list": [],
+            "used_titles": [],
+            "used_thumbnail_texts": [],
+        })
+
+    @staticmethod
+    def _unused(entry: dict) -> Dict[str, List[str]]:
+        return {
+            "titles": [title for title in entry["titles"] if title not in entry["used_titles"]],
+            "thumbnail_text_list": [
+                text for text in entry["thumbnail_text_list"] if text not in entry["used_thumbnail_texts"]
+            ],
+        }
+
+    def get_pool(self, topic: str) -> Optional[Dict[str, List[str]]]:
+        """
+        Get the unused titles and thumbnail texts of a fresh pool
+
+        Args:
+            topic (str): The topic
+
+        Returns:
+            Optional[Dict[str, List[str]]]: ``titles`` and ``thumbnail_text_list``, or None
+            if the pool is missing, expired or has too few unused titles
+        """
+        with self._lock:
+            entry = self._topics.get(topic)
+            if not entry or time.time() - entry["created_at"] > self.ttl_seconds:
+                return None
+            pool = self._unused(entry)
+        if len(pool["titles"]) < self.min_unused or not pool["thumbnail_text_list"]:
+            return None
+        return pool
+
+    def store_pool(self, topic: str, titles: List[str], thumbnail_text_list: List[str]) -> Dict[str, List[str]]:
+        """
+        Store a newly generated pool, keeping the topic's used-title history
+
+        Args:
+            topic (str): The topic
+            titles (List[str]): Generated titles
+            thumbnail_text_list (List[str]): Generated thumbnail texts
+
+        Returns:
+            Dict[str, List[str]]: The titles and thumbnail texts of the pool that were not used before
+        """
+        pool, snapshot = self._store_pool(topic, titles, thumbnail_text_list)
+        self._write(snapshot)
+        return pool
+
+    async def astore_pool(self, topic: str, titles: List[str], thumbnail_text_list: List[str]) -> Dict[str, List[str]]:
+        """Async version of ``store_pool``; the file is written in a worker thread."""
+        pool, snapshot = self._store_pool(topic, titles, thumbnail_text_list)
+        await asyncio.to_thread(self._write, snapshot)
+        return pool
+
+    def mark_used(self, topic: str, title: str, thumbnail_text: str) -> None:
+        """
+        Record a title and thumbnail text as used so later runs pick different ones
+
+        Args:
+            topic (str): The topic
+            title (str): The selected title
+            thumbnail_text (str): The selected thumbnail text
+        """
+        self._write(self._mark_used(topic, title, thumbnail_text))
+
+    async def amark_used(self, topic: str, title: str, thumbnail_text: str) -> None:
+        """Async version of ``mark_used``; the file is written in a worker thread."""
+        await asyncio.to_thread(self._write, self._mark_used(topic, title, thumbnail_text))
+
+    def _store_pool(self, topic: str, titles: List[str],
+                    thumbnail_text_list: List[str]) -> Tuple[Dict[str, List[str]], Optional[tuple]]:
+        with self._lock:
+            entry = self._entry(topic)
+            entry.update(created_at=time.time(), titles=list(titles), thumbnail_text_list=list(thumbnail_text_list))
+            pool = self._unused(entry)
+            snapshot = self._snapshot()
+        # Fall back to the full lists if everything generated was used before
+        return {
+            "titles": pool["titles"] or list(titles),
+            "thumbnail_text_list": pool["thumbnail_text_list"] or list(thumbnail_text_list),
+        }, snapshot
+
+    def _mark_used(self, topic: str, title: str, thumbnail_text: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entry(topic)
+            if title not in entry["used_titles"]:
+                entry["used_titles"].append(title)
+            if thumbnail_text not in entry["used_thumbnail_texts"]:
+                entry["used_thumbnail_texts"].append(thumbnail_text)
+            return self._snapshot()
+
+    def _snapshot(self) -> Optional[tuple]:
+        # Called with the lock held; serializing here keeps the file write itself lock-free
+        if not self.path:
+            return None
+        self._version += 1
+        return self._version, json.dumps(self._topics, indent=2, ensure_ascii=False)
+
+    def _write(self, snapshot: Optional[tuple]) -> None:
+        if snapshot is None:
+            return
+        version, data = snapshot
+        with self._write_lock:
+            if version < self._written_version:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+                self._written_version = version
+            except OSError as e:
+                logger.error(f"Error writing title cache {self.path}: {str(e)}")
@@ -66,4 +66,17 @@ def get_random_topic():
     Returns:
         str: A randomly selected topic
     """
-    return random.choice(TOPICS)
\ No newline at end of file
+    return random.choice(TOPICS)
+
+
+def get_random_topics(count):
+    """
+    Returns distinct random topics from the TOPICS list.
+    
+    Args:
+        count (int): Number of topics to pick, capped at the number of topics
+    
+    Returns:
+        list: The randomly selected topics
+    """
+    return random.sample(TOPICS, min(count, len(TOPICS)))
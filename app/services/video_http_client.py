@@ -1,8 +1,403 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+import httpx
+import requests
+
 from app.services.api_calls import HttpClient
+from app.services.stats import percentile
 from app.config import api_config
 
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the circuit is open."""
+
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(f"Video API circuit is open, retry in {retry_after_seconds:.0f}s")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class BulkheadFullError(RuntimeError):
+    """Raised when no call slot became free within the bulkhead wait time."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcomes of recent calls and opens when their error rate or p95 latency
+    is too high, so callers fail fast instead of piling up on a degraded backend.
+
+    After ``open_seconds`` the circuit is half-open and lets a single probe call through;
+    its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, max_error_rate: float = 0.5, slow_call_seconds: float = 60, min_calls: int = 5,
+                 window_seconds: float = 120, open_seconds: float = 30):
+        """
+        :param max_error_rate: The circuit opens above this error rate.
+        :param slow_call_seconds: The circuit opens when the p95 latency exceeds this; 0 disables it.
+        :param min_calls: Calls in the window needed before the circuit can open.
+        :param window_seconds: How far back call outcomes are considered.
+        :param open_seconds: How long the circuit stays open before a probe call is allowed.
+        """
+        self.max_error_rate = max_error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        # deque of (timestamp, latency seconds, succeeded)
+        self._outcomes = deque()
+        self._state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+
+    @classmethod
+    def from_config(cls) -> "CircuitBreaker":
+        """Create a breaker from the VIDEO_API_BREAKER_* settings."""
+        return cls(
+            max_error_rate=api_config.breaker_error_rate,
+            slow_call_seconds=api_config.breaker_slow_call_seconds,
+            min_calls=api_config.breaker_min_calls,
+            window_seconds=api_config.breaker_window_seconds,
+            open_seconds=api_config.breaker_open_seconds,
+        )
+
+    def _current_state(self, now: float) -> str:
+        if self._state == CIRCUIT_OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = CIRCUIT_HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def _window_stats(self, now: float) -> dict:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        errors = sum(1 for _, _, ok in self._outcomes if not ok)
+        return {
+            "calls": len(self._outcomes),
+            "errors": errors,
+            "error_rate": errors / len(self._outcomes) if self._outcomes else 0.0,
+            "p95_seconds": percentile((latency for _, latency, _ in self._outcomes), 0.95, default=None),
+        }
+
+    def _open(self, now: float, reason: str) -> None:
+        self._state = CIRCUIT_OPEN
+        self._opened_at = now
+        self._probing = False
+        self._trips += 1
+        logger.warning(f"Video API circuit opened: {reason}")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def retry_after(self) -> float:
+        """
+        :return: Seconds until the open circuit lets a probe call through; 0 if it isn't open.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) != CIRCUIT_OPEN:
+                return 0.0
+            return max(self.open_seconds - (now - self._opened_at), 0.0)
+
+    def accepting(self) -> bool:
+        """
+        :return: Whether calls are currently let through, without claiming the half-open probe.
+        """
+        return self.state != CIRCUIT_OPEN
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go ahead. A True result must be followed by ``record`` or ``release``.
+
+        :return: False while the circuit is open, or half-open with the probe call in flight.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CIRCUIT_CLOSED:
+                return True
+            if state == CIRCUIT_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._rejected += 1
+            return False
+
+    def release(self) -> None:
+        """
+        Give up an allowed call without an outcome, e.g. when it was cancelled. A half-open
+        circuit then lets the next call probe instead of waiting for this one forever.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record(self, latency_seconds: float, succeeded: bool) -> None:
+        """Record the outcome of an allowed call."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            slow = bool(self.slow_call_seconds) and latency_seconds > self.slow_call_seconds
+            if state == CIRCUIT_HALF_OPEN:
+                if succeeded and not slow:
+                    self._state = CIRCUIT_CLOSED
+                    self._outcomes.clear()
+                    logger.info("Video API circuit closed after a successful probe call")
+                else:
+                    self._open(now, "probe call failed" if not succeeded else f"probe call took {latency_seconds:.1f}s")
+                return
+            self._outcomes.append((now, latency_seconds, succeeded))
+            if state == CIRCUIT_OPEN:
+                return
+            stats = self._window_stats(now)
+            if stats["calls"] < self.min_calls:
+                return
+            if stats["error_rate"] > self.max_error_rate:
+                self._open(now, f"error rate {stats['error_rate']:.0%} over {stats['calls']} calls")
+            elif self.slow_call_seconds and stats["p95_seconds"] > self.slow_call_seconds:
+                self._open(now, f"p95 latency {stats['p95_seconds']:.1f}s over {stats['calls']} calls")
+
+    def stats(self) -> dict:
+        """
+        :return: The circuit state, recent error rate and p95 latency, and rejected calls.
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "retry_after_seconds": round(max(self.open_seconds - (now - self._opened_at), 0.0), 1)
+                if state == CIRCUIT_OPEN else 0.0,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                **self._window_stats(now),
+            }
+
+
+class Bulkhead:
+    """
+    Caps the number of video API calls in flight at once, shared by sync and async callers,
+    so a slow backend can't tie up every worker thread and connection.
+    """
+
+    def __init__(self, max_concurrent: int, max_wait_seconds: float = 10):
+        """
+        :param max_concurrent: The maximum number of concurrent calls.
+        :param max_wait_seconds: How long a call waits for a free slot before it is rejected.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_config(cls) -> "Bulkhead":
+        """Create a bulkhead from the VIDEO_API_MAX_CONCURRENCY settings."""
+        return cls(api_config.max_concurrency, api_config.bulkhead_wait_seconds)
+
+    def _acquired(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    def _reject(self):
+        with self._lock:
+            self._rejected += 1
+        return BulkheadFullError(
+            f"No video API call slot became free within {self.max_wait_seconds}s ({self.max_concurrent} in flight)"
+        )
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a call slot for the block. Blocks the calling thread while waiting, so it must
+        not be used on an event loop thread; there it fails at once when the bulkhead is full.
+
+        :raises BulkheadFullError: If no slot became free within the wait time.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            wait_seconds = self.max_wait_seconds
+        else:
+            # Blocking here would freeze the whole event loop; async callers must use aslot
+            logger.warning("Bulkhead.slot() called on an event loop thread, not waiting for a free slot")
+            wait_seconds = 0
+        if not self._semaphore.acquire(timeout=wait_seconds):
+            raise self._reject()
+        self._acquired()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        Async variant of ``slot``; waits without blocking the event loop.
+        """
+        deadline = time.monotonic() + self.max_wait_seconds
+        # Polling keeps the wait cancellable without leaking a slot to a worker thread
+        while not self._semaphore.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                raise self._reject()
+            await asyncio.sleep(0.05)
+        self._acquired()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_concurrent": self.max_concurrent, "in_flight": self._in_flight, "rejected": self._rejected}
+
+
+video_breaker = CircuitBreaker.from_config()
+video_bulkhead = Bulkhead.from_config()
+
 
 class VideoHttpClient:
+    _deferred_lock = threading.Lock()
+    _resubmitting = False
+
+    @staticmethod
+    def _client() -> HttpClient:
+        """
+        Return the client shared by all video API calls, so connections are pooled and kept alive.
+        """
+        global _client
+        if _client is None:
+            with _client_lock:
+                if _client is None:
+                    _client = HttpClient.from_config(api_config.base_url)
+        return _client
+
+    @staticmethod
+    def _endpoint() -> str:
+        return f"/videos/create-with-scenes?key={api_config.api_key}"
+
+    @staticmethod
+    def _payload(title: str, desc: str, thumbnail_visual_desc: str, raw: list, video_type: str, project_id: str) -> dict:
+        return {
+            "projectId": project_id, # Use the passed project_id
+            "name": title,
+            "description": desc,
+            "visualPrompt": thumbnail_visual_desc,  # Rename to visual_prompt for the API
+            "raw": raw,
+            "videoType": video_type,  # 'message' or 'mcq'
+        }
+
+    @staticmethod
+    def _result(response: dict) -> dict:
+        return {
+            "video_id": response["id"],
+            "video_url": f"https://example.com/video/{response['id']}",
+        }
+
+    @staticmethod
+    def _is_outage(error: Exception) -> bool:
+        """
+        :return: Whether a failed call counts against the circuit: transport errors (connection
+            failures and timeouts) and 5xx or 429 responses do; client errors (4xx) don't.
+        """
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+            return True
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+        return status_code is not None and (status_code >= 500 or status_code == 429)
+
+    @staticmethod
+    def _record_error(error: Exception, latency_seconds: float) -> None:
+        """
+        Record a failed call with the circuit breaker. Errors that say nothing about the API's
+        health, e.g. a payload that failed to serialize before it was sent, record no outcome.
+        """
+        if VideoHttpClient._is_outage(error):
+            video_breaker.record(latency_seconds, False)
+        elif getattr(error, "response", None) is not None:
+            # The API answered, just not with a success
+            video_breaker.record(latency_seconds, True)
+        else:
+            video_breaker.release()
+
+    @staticmethod
+    def _reject(payload: dict) -> dict:
+        """
+        Handle a submission while the circuit is open: defer it or fail fast, per VIDEO_API_BREAKER_MODE.
+        """
+        if api_config.breaker_mode == "defer":
+            VideoHttpClient._defer(payload)
+            return {"video_id": None, "video_url": None, "deferred": True}
+        raise CircuitOpenError(video_breaker.retry_after())
+
+    @staticmethod
+    def _post(payload: dict) -> Optional[dict]:
+        """
+        Post a video through the bulkhead and circuit breaker.
+
+        :return: The API response, or None if the circuit rejected the call.
+        """
+        if not video_breaker.accepting():
+            return None
+        with video_bulkhead.slot():
+            if not video_breaker.allow():
+                return None
+            started = time.monotonic()
+            try:
+                response = VideoHttpClient._client().post(VideoHttpClient._endpoint(), payload)
+            except Exception as e:
+                VideoHttpClient._record_error(e, time.monotonic() - started)
+                raise
+            except BaseException:
+                # Cancelled, e.g. the client disconnected: no outcome, but free the probe if this was it
+                video_breaker.release()
+                raise
+            video_breaker.record(time.monotonic() - started, True)
+        return response
+
+    @staticmethod
+    async def _apost(payload: dict) -> Optional[dict]:
+        if not video_breaker.accepting():
+            return None
+        async with video_bulkhead.aslot():
+            if not video_breaker.allow():
+                return None
+            started = time.monotonic()
+            try:
+                response = await VideoHttpClient._client().apost(VideoHttpClient._endpoint(), payload)
+            except Exception as e:
+                VideoHttpClient._record_error(e, time.monotonic() - started)
+                raise
+            except BaseException:
+                # Cancelled, e.g. the client disconnected: no outcome, but free the probe if this was it
+                video_breaker.release()
+                raise
+            video_breaker.record(time.monotonic() - started, True)
+        return response
+
     @staticmethod
     def create_video(
         title: str,
@@ -22,20 +417,126 @@ class VideoHttpClient:
         :param thumbnail_visual_desc: The visual description for the thumbnail.
         :param quotes: A list of quotes to include in the video.
         :param project_id: The ID of the project for video creation.
-        :return: A dictionary containing the API response.
+        :return: A dictionary containing the API response; with "deferred" set when the
+            circuit is open and the submission was queued for later.
+        :raises CircuitOpenError: If the circuit is open and submissions are not deferred.
+        :raises BulkheadFullError: If too many video API calls are already in flight.
+        """
+        payload = VideoHttpClient._payload(title, desc, thumbnail_visual_desc, raw, video_type, project_id)
+        response = VideoHttpClient._post(payload)
+        if response is None:
+            return VideoHttpClient._reject(payload)
+        VideoHttpClient._resubmit_deferred_in_background()
+
+        return VideoHttpClient._result(response)
+
+    @staticmethod
+    async def acreate_video(
+        title: str,
+        desc: str,
+        thumbnail_text: str,
+        thumbnail_visual_desc: str,
+        raw: list,
+        video_type: str,
+        project_id: str,
+    ) -> dict:
+        """
+        Async variant of ``create_video``; the request doesn't block the event loop.
+        """
+        payload = VideoHttpClient._payload(title, desc, thumbnail_visual_desc, raw, video_type, project_id)
+        response = await VideoHttpClient._apost(payload)
+        if response is None:
+            return VideoHttpClient._reject(payload)
+        VideoHttpClient._resubmit_deferred_in_background()
+
+        return VideoHttpClient._result(response)
+
+    @staticmethod
+    def _defer(payload: dict) -> None:
+        with VideoHttpClient._deferred_lock:
+            directory = os.path.dirname(api_config.deferred_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(api_config.deferred_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload) + "\n")
+        logger.warning(f"Video API circuit is open, deferred video '{payload['name']}' of project {payload['projectId']}")
+
+    @staticmethod
+    def deferred_count() -> int:
+        """
+        :return: The number of submissions waiting for the circuit to close.
+        """
+        with VideoHttpClient._deferred_lock:
+            if not os.path.exists(api_config.deferred_path):
+                return 0
+            with open(api_config.deferred_path, encoding="utf-8") as f:
+                return sum(1 for line in f if line.strip())
+
+    @staticmethod
+    def submit_deferred() -> int:
+        """
+        Submit the deferred videos, stopping at the first one that fails or is rejected again.
+
+        :return: The number of videos submitted.
+        """
+        with VideoHttpClient._deferred_lock:
+            if not os.path.exists(api_config.deferred_path):
+                return 0
+            with open(api_config.deferred_path, encoding="utf-8") as f:
+                pending = [json.loads(line) for line in f if line.strip()]
+            os.remove(api_config.deferred_path)
+
+        submitted = 0
+        try:
+            for payload in pending:
+                try:
+                    response = VideoHttpClient._post(payload)
+                except Exception as e:
+                    logger.error(f"Error submitting deferred video '{payload['name']}': {str(e)}")
+                    break
+                if response is None:
+                    break
+                logger.info(f"Submitted deferred video '{payload['name']}' as {response['id']}")
+                submitted += 1
+        finally:
+            # Put the rest back in front of anything deferred in the meantime
+            remaining = pending[submitted:]
+            if remaining:
+                with VideoHttpClient._deferred_lock:
+                    newer = []
+                    if os.path.exists(api_config.deferred_path):
+                        with open(api_config.deferred_path, encoding="utf-8") as f:
+                            newer = [line for line in f if line.strip()]
+                    with open(api_config.deferred_path, "w", encoding="utf-8") as f:
+                        f.writelines([json.dumps(payload) + "\n" for payload in remaining] + newer)
+        return submitted
+
+    @staticmethod
+    def _resubmit_deferred_in_background() -> None:
+        if VideoHttpClient._resubmitting or not os.path.exists(api_config.deferred_path):
+            return
+        with VideoHttpClient._deferred_lock:
+            if VideoHttpClient._resubmitting:
+                return
+            VideoHttpClient._resubmitting = True
+
+        def resubmit():
+            try:
+                VideoHttpClient.submit_deferred()
+            except Exception as e:
+                logger.error(f"Error submitting deferred videos: {str(e)}")
+            finally:
+                VideoHttpClient._resubmitting = False
+
+        threading.Thread(target=resubmit, name="video-deferred-submit", daemon=True).start()
+
+    @staticmethod
+    def health() -> dict:
+        """
+        :return: The circuit breaker and bulkhead state of the video API and the deferred submissions.
         """
-        client = HttpClient(api_config.base_url)
-        payload = {
-            "projectId": project_id, # Use the passed project_id
-            "name": title,
-            "description": desc,
-            "visualPrompt": thumbnail_visual_desc,  # Rename to visual_prompt for the API
-            "raw": raw,
-            "videoType": video_type,  # 'message' or 'mcq'
-        }
-        response = client.post(f"/videos/create-with-scenes?key={api_config.api_key}", payload)
-        
         return {
-            "video_id": response["id"],
-            "video_url": f"https://example.com/video/{response['id']}",
+            "circuit": video_breaker.stats(),
+            "bulkhead": video_bulkhead.stats(),
+            "deferred": VideoHttpClient.deferred_count(),
         }
@@ -19,6 +19,23 @@ class CreateVideoArgs(BaseModel):
     project_id: str # Add project_id field
 
 
+def _tool_result(title: str, resp: dict) -> dict:
+    if resp.get("deferred"):
+        # The video API circuit is open; the submission is sent once it recovers
+        return {
+            "status": "deferred",
+            "message": f"Video '{title}' queued until the video API recovers",
+            "video_id": None,
+            "video_url": None,
+        }
+    return {
+        "status": "success",
+        "message": f"Video '{title}' created successfully",
+        "video_id": resp["video_id"],
+        "video_url": resp["video_url"]
+    }
+
+
 def create_video(
     title: str,
     desc: str,
@@ -60,16 +77,43 @@ def create_video(
     )
     
     
-    return {
-        "status": "success",
-        "message": f"Video '{title}' created successfully",
-        "video_id": resp["video_id"],
-        "video_url": resp["video_url"]
-    }
+    return _tool_result(title, resp)
+
+
+async def acreate_video(
+    title: str,
+    desc: str,
+    thumbnail_text: str,
+    thumbnail_visual_desc: str,
+    video_type: Literal['message', 'mcq'],
+    raw: Union[List[str], List[MCQQuestion]],
+    project_id: str,
+) -> str:
+    """
+    Async variant of ``create_video``, used when the tool is awaited.
+    """
+    logger.info(f"Creating video with title: {title} for project: {project_id}")
+
+    serializable_raw = raw
+    if video_type == 'mcq' and raw and isinstance(raw[0], MCQQuestion):
+        serializable_raw = [question.model_dump() for question in raw]
+
+    resp = await VideoHttpClient.acreate_video(
+        title=title,
+        desc=desc,
+        thumbnail_text=thumbnail_text,
+        thumbnail_visual_desc=thumbnail_visual_desc,
+        raw=serializable_raw,
+        project_id=project_id,
+        video_type=video_type
+    )
+
+    return _tool_result(title, resp)
 
 
 create_video_tool = StructuredTool.from_function(
     func=create_video,
+    coroutine=acreate_video,
     name="create_video",
     description="Create a video with the given title, description, and quotes.",
     args_schema=CreateVideoArgs,
@@ -0,0 +1,65 @@
+"""
+Measure cold-start time: importing app.main in a fresh interpreter, and the
+startup warm-up (LLM client creation and graph compilation) separately.
+
+Each run starts a new Python process, so module caches don't carry over.
+Pass --max-import-seconds to fail (exit code 1) when the median import time
+regresses past a threshold, e.g. in CI.
+
+Usage:
+    PYTHONPATH=$PWD python benchmarks/cold_start_bench.py --runs 5 --max-import-seconds 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json
+import time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.graphs.quotes_video_graph import warm_up
+warm_up()
+warmed = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "warm_up_s": warmed - imported}))
+"""
+
+
+def measure_once() -> dict:
+    """Import app.main and warm up in a fresh interpreter and return the timings."""
+    # The warm-up only constructs the client, so a placeholder key avoids any network call
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, LLM_API_KEY=os.getenv("LLM_API_KEY") or "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int) -> dict:
+    samples = [measure_once() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "median": {
+            key: round(statistics.median(sample[key] for sample in samples), 3)
+            for key in ("import_s", "warm_up_s")
+        },
+        "samples": samples,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to measure")
+    parser.add_argument("--max-import-seconds", type=float, default=None, help="Fail if the median import time exceeds this")
+    args = parser.parse_args()
+    results = main(args.runs)
+    print(json.dumps(results, indent=2))
+    if args.max_import_seconds is not None and results["median"]["import_s"] > args.max_import_seconds:
+        sys.exit(1)
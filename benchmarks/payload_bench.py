@@ -0,0 +1,107 @@
+"""
+Compare the size and encoding time of video API submissions per serializer and compression.
+
+Builds typical create-with-scenes payloads (an MCQ batch of full questions with long
+descriptions, and a quotes video) and measures the standard json encoder against
+orjson, each uncompressed and with gzip and zstd, as sent by HttpClient.
+
+Usage:
+    PYTHONPATH=$PWD python benchmarks/payload_bench.py --questions 30 --runs 200
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.models import MCQOption, MCQQuestion
+from app.services import api_calls
+from app.services.video_http_client import VideoHttpClient
+
+WORDS = (
+    "answer definition section document process energy cell membrane protein function value equation force "
+    "mass velocity market price demand supply policy history century empire treaty reform theory evidence "
+    "experiment result sample analysis method structure system network signal pattern example concept"
+).split()
+
+
+def text(rng: random.Random, sentences: int) -> str:
+    """Generated prose, varied enough that compression ratios resemble real LLM output."""
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 18))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def mcq_payload(questions: int) -> dict:
+    rng = random.Random(0)
+    raw = []
+    for index in range(questions):
+        options = [text(rng, 1) for _ in range(4)]
+        raw.append(MCQQuestion(
+            question=text(rng, 1),
+            questionDescription=text(rng, 3),
+            options=[MCQOption(text=option, isCorrect=position == 0) for position, option in enumerate(options)],
+            optionsDescription=text(rng, 2),
+            correctAnswer=options[0],
+            correctAnswerDescription=text(rng, 3),
+            explanation=text(rng, 4),
+            explanationDescription=text(rng, 4),
+        ).model_dump())
+    return VideoHttpClient._payload("MCQ Video - benchmark", "Automatically generated multiple choice questions video",
+                                    "Educational quiz thumbnail", raw, "mcq", "benchmark")
+
+
+def quotes_payload(quotes: int) -> dict:
+    rng = random.Random(0)
+    raw = [text(rng, 1) for _ in range(quotes)]
+    return VideoHttpClient._payload("Life Quotes", "A collection of life quotes", "Oil painting of a sunrise",
+                                    raw, "message", "benchmark")
+
+
+def std_dumps(data) -> bytes:
+    # What requests' json= argument sends
+    return json.dumps(data).encode("utf-8")
+
+
+SERIALIZERS = {"json": std_dumps}
+if api_calls.orjson is not None:
+    SERIALIZERS["orjson"] = api_calls.orjson.dumps
+
+ENCODINGS = [None, "gzip"] + (["zstd"] if api_calls.zstandard is not None else [])
+
+
+def measure(payload: dict, serializer, encoding: str, runs: int) -> dict:
+    """Median time to serialize and compress one payload, and the bytes sent."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = serializer(payload)
+        if encoding:
+            body = api_calls.compress(body, encoding)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"bytes": len(body), "median_ms": round(statistics.median(timings), 3)}
+
+
+def main(questions: int, quotes: int, runs: int) -> dict:
+    results = {}
+    for name, payload in (("mcq", mcq_payload(questions)), ("quotes", quotes_payload(quotes))):
+        rows = {}
+        for serializer_name, serializer in SERIALIZERS.items():
+            for encoding in ENCODINGS:
+                rows[f"{serializer_name}+{encoding or 'none'}"] = measure(payload, serializer, encoding, runs)
+        baseline = rows["json+none"]["bytes"]
+        for row in rows.values():
+            row["ratio"] = round(row["bytes"] / baseline, 3)
+        results[name] = rows
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=30, help="Questions in the MCQ payload")
+    parser.add_argument("--quotes", type=int, default=50, help="Quotes in the quotes payload")
+    parser.add_argument("--runs", type=int, default=200, help="Timing runs per combination")
+    args = parser.parse_args()
+    print(json.dumps(main(args.questions, args.quotes, args.runs), indent=2))
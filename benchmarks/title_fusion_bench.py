@@ -0,0 +1,76 @@
+"""
+Compare end-to-end latency and token use of the two-step and fused quotes video graphs.
+
+Runs both graph variants against the configured LLM (LLM_PROVIDER / LLM_MODEL /
+LLM_API_KEY) with video creation stubbed out, so no videos are created.
+
+Usage:
+    PYTHONPATH=$PWD python benchmarks/title_fusion_bench.py --runs 5 --topic "Life Quotes"
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+from unittest.mock import MagicMock, patch
+
+from langchain_core.callbacks import get_usage_metadata_callback
+
+from app.graphs import quotes_video_graph
+from app.services.title_cache import TitleCache
+from app.services.topics import get_random_topic
+
+TITLE_NODES = {"find_best_title_thumbnail_text", "create_and_select_title_thumbnail_text"}
+
+
+async def _fake_create_video(input):
+    return {"video_id": "benchmark", "video_url": "https://example.com/video/benchmark"}
+
+
+async def run_variant(variant: str, topic: str) -> dict:
+    """Run one graph and return its latency and token usage."""
+    config = quotes_video_graph.new_thread_config()
+    title_ms = total_ms = None
+    with get_usage_metadata_callback() as usage:
+        async for event in quotes_video_graph.astream_progress(
+            {"topic": topic, "project_id": "benchmark"}, config, variant
+        ):
+            if event["event"] == "error":
+                raise RuntimeError(event["error"])
+            if event.get("node") in TITLE_NODES:
+                title_ms = event["elapsed_ms"]
+            total_ms = event["elapsed_ms"]
+    return {
+        "title_ms": title_ms,
+        "total_ms": total_ms,
+        "input_tokens": sum(item["input_tokens"] for item in usage.usage_metadata.values()),
+        "output_tokens": sum(item["output_tokens"] for item in usage.usage_metadata.values()),
+    }
+
+
+def summarize(samples: list[dict]) -> dict:
+    return {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ("title_ms", "total_ms", "input_tokens", "output_tokens")
+    }
+
+
+async def main(runs: int, topic: str) -> dict:
+    video_tool = MagicMock()
+    video_tool.ainvoke.side_effect = _fake_create_video
+    results = {}
+    # Disable title pool reuse so every run pays for title generation
+    with patch.object(quotes_video_graph, "create_video_tool", video_tool), \
+            patch.object(quotes_video_graph, "title_cache", TitleCache(ttl_seconds=0)):
+        for variant in quotes_video_graph.GRAPH_VARIANTS:
+            samples = [await run_variant(variant, topic) for _ in range(runs)]
+            results[variant] = {"runs": runs, "median": summarize(samples), "samples": samples}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Runs per variant")
+    parser.add_argument("--topic", default=None, help="Topic to use (random by default)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.runs, args.topic or get_random_topic())), indent=2))
@@ -0,0 +1,15 @@
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+
+from app.config import storage_config
+
+
+@pytest.fixture(autouse=True)
+def isolated_mcq_files_path(tmp_path):
+    """Keep the MCQ debug files and dedup indexes written by tests out of the repo's data directory"""
+    config = replace(storage_config, mcq_files_path=str(tmp_path / "mcq"))
+    with patch('app.services.mcq_service.storage_config', config), \
+            patch('app.services.mcq_dedup.storage_config', config):
+        yield tmp_path / "mcq"
@@ -0,0 +1 @@
+# This file makes the services test directory a proper Python package
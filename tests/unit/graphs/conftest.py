@@ -0,0 +1,60 @@
+import re
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app.graphs import quotes_video_graph
+from app.services.title_cache import TitleCache
+
+
+class FakeStructuredRunnable:
+    """Structured-output runnable that fills every field from the topic found in the prompt"""
+
+    def __init__(self, llm, schema):
+        self.llm = llm
+        self.schema = schema
+
+    async def ainvoke(self, messages):
+        self.llm.in_flight += 1
+        self.llm.max_in_flight = max(self.llm.max_in_flight, self.llm.in_flight)
+        self.llm.calls.append(self.schema.__name__)
+        try:
+            await asyncio.sleep(0.01)  # Give concurrent calls a chance to interleave
+        finally:
+            self.llm.in_flight -= 1
+        text = " ".join(message.content for message in messages)
+        topic = re.search(r"topic-\d+", text).group(0)
+        values = {}
+        for name, field in self.schema.model_fields.items():
+            values[name] = [f"{topic} {name}"] if field.annotation == list[str] else f"{topic} {name}"
+        return self.schema(**values)
+
+
+class FakeLLM:
+    """Chat model stand-in supporting with_structured_output"""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def with_structured_output(self, schema):
+        return FakeStructuredRunnable(self, schema)
+
+
+@pytest.fixture
+def fake_graph_dependencies():
+    """Replace the LLM and video tool used by the graph nodes"""
+    async def create_video(input):
+        return {
+            "video_id": f"video-{input['project_id']}",
+            "video_url": f"https://example.com/video/{input['project_id']}",
+        }
+
+    llm = FakeLLM()
+    video_tool = MagicMock()
+    video_tool.ainvoke.side_effect = create_video
+    with patch.object(quotes_video_graph, 'get_llm_model', lambda: llm), \
+            patch.object(quotes_video_graph, 'create_video_tool', video_tool), \
+            patch.object(quotes_video_graph, 'title_cache', TitleCache()):
+        yield llm, video_tool
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph, START, END
+from app.graphs.checkpointer import BoundedMemorySaver
+
+
+class CounterState(TypedDict):
+    value: int
+    doubled: int
+
+
+def _build_graph(checkpointer, calls, fail_double=False):
+    """Build a two-node graph that records node calls"""
+
+    def increment(state: CounterState):
+        calls.append("increment")
+        return {"value": state["value"] + 1}
+
+    def double(state: CounterState):
+        calls.append("double")
+        if fail_double:
+            raise RuntimeError("double failed")
+        return {"doubled": state["value"] * 2}
+
+    builder = StateGraph(CounterState)
+    builder.add_node("increment", increment)
+    builder.add_node("double", double)
+    builder.add_edge(START, "increment")
+    builder.add_edge("increment", "double")
+    builder.add_edge("double", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+class TestBoundedMemorySaver:
+    """
+    Unit tests for the BoundedMemorySaver class
+    """
+
+    def test_lru_eviction(self):
+        """Test that the least recently used thread is evicted above max_threads"""
+        saver = BoundedMemorySaver(max_threads=2)
+        graph = _build_graph(saver, [])
+
+        for thread_id in ("a", "b", "c"):
+            graph.invoke({"value": 1}, config=_config(thread_id))
+
+        assert saver.thread_count == 2
+        assert "a" not in saver.storage
+        assert graph.get_state(_config("c")).values["doubled"] == 4
+
+    def test_recent_access_protects_thread(self):
+        """Test that reading a thread makes it most recently used"""
+        saver = BoundedMemorySaver(max_threads=2)
+        graph = _build_graph(saver, [])
+        graph.invoke({"value": 1}, config=_config("a"))
+        graph.invoke({"value": 1}, config=_config("b"))
+
+        graph.get_state(_config("a"))
+        graph.invoke({"value": 1}, config=_config("c"))
+
+        assert "a" in saver.storage
+        assert "b" not in saver.storage
+
+    def test_ttl_expiry(self):
+        """Test that idle threads are deleted after the TTL"""
+        saver = BoundedMemorySaver(ttl_seconds=0.05)
+        graph = _build_graph(saver, [])
+        graph.invoke({"value": 1}, config=_config("a"))
+
+        time.sleep(0.1)
+        graph.invoke({"value": 1}, config=_config("b"))
+
+        assert "a" not in saver.storage
+        assert saver.thread_count == 1
+
+    def test_invalid_max_threads(self):
+        """Test that at least one thread must be kept"""
+        with pytest.raises(ValueError):
+            BoundedMemorySaver(max_threads=0)
+
+    def test_sqlite_offload_reloads_evicted_thread(self, tmp_path):
+        """Test that evicted threads are loaded back from SQLite on access"""
+        saver = BoundedMemorySaver(max_threads=1, sqlite_path=str(tmp_path / "checkpoints.db"))
+        graph = _build_graph(saver, [])
+        graph.invoke({"value": 1}, config=_config("a"))
+        graph.invoke({"value": 5}, config=_config("b"))
+
+        assert "a" not in saver.storage
+        assert graph.get_state(_config("a")).values == {"value": 2, "doubled": 4}
+
+    def test_sqlite_resume_after_restart(self, tmp_path):
+        """Test that an interrupted run resumes from the failed node in a new process"""
+        db_path = str(tmp_path / "checkpoints.db")
+        calls = []
+        graph = _build_graph(BoundedMemorySaver(sqlite_path=db_path), calls, fail_double=True)
+        with pytest.raises(RuntimeError):
+            graph.invoke({"value": 1}, config=_config("a"))
+
+        calls.clear()
+        restarted = _build_graph(BoundedMemorySaver(sqlite_path=db_path), calls)
+        result = restarted.invoke(None, config=_config("a"))
+
+        assert calls == ["double"]
+        assert result == {"value": 2, "doubled": 4}
+
+    def test_async_run_writes_sqlite_off_the_event_loop(self, tmp_path):
+        """Test that an async run writes its checkpoints through from worker threads, and they can be reloaded"""
+        db_path = str(tmp_path / "checkpoints.db")
+        saver = BoundedMemorySaver(sqlite_path=db_path)
+        execute = saver._execute
+        threads = []
+
+        def record_thread(statements):
+            threads.append(threading.current_thread())
+            execute(statements)
+
+        with patch.object(saver, "_execute", side_effect=record_thread):
+            asyncio.run(_build_graph(saver, []).ainvoke({"value": 1}, config=_config("a")))
+
+        assert threads and threading.main_thread() not in threads
+        restarted = _build_graph(BoundedMemorySaver(sqlite_path=db_path), [])
+        assert restarted.get_state(_config("a")).values == {"value": 2, "doubled": 4}
+
+    def test_delete_thread_removes_stored_checkpoints(self, tmp_path):
+        """Test that deleting a thread also removes it from SQLite"""
+        db_path = str(tmp_path / "checkpoints.db")
+        saver = BoundedMemorySaver(sqlite_path=db_path)
+        _build_graph(saver, []).invoke({"value": 1}, config=_config("a"))
+
+        saver.delete_thread("a")
+
+        restarted = _build_graph(BoundedMemorySaver(sqlite_path=db_path), [])
+        assert restarted.get_state(_config("a")).values == {}
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from typing_extensions import TypedDict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+
+from app.graphs import instrumentation
+from app.graphs.instrumentation import NodeMetrics, instrument_node
+
+
+class ReplyState(TypedDict):
+    question: str
+    reply: str
+
+
+def _build_graph(model, failures):
+    async def answer(state: ReplyState):
+        if failures:
+            raise failures.pop(0)
+        message = await model.ainvoke(state["question"])
+        return {"reply": message.content}
+
+    builder = StateGraph(ReplyState)
+    builder.add_node("answer", instrument_node("answer", answer))
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    return builder.compile(checkpointer=MemorySaver())
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    node_metrics = NodeMetrics()
+    monkeypatch.setattr(instrumentation, "node_metrics", node_metrics)
+    return node_metrics
+
+
+def _fake_model(replies):
+    return GenericFakeChatModel(messages=iter([
+        AIMessage(
+            content=reply,
+            response_metadata={"model_name": "fake-model"},
+            usage_metadata={
+                "input_tokens": 10,
+                "output_tokens": 5,
+                "total_tokens": 15,
+                "input_token_details": {"cache_read": 8},
+            },
+        )
+        for reply in replies
+    ]))
+
+
+class TestNodeInstrumentation:
+    """
+    Unit tests for the graph node instrumentation
+    """
+
+    def test_records_latency_and_tokens_per_thread(self, metrics):
+        """Test that a node run records its wall time and LLM token usage under its thread"""
+        graph = _build_graph(_fake_model(["hello"]), [])
+        config = {"configurable": {"thread_id": "t1"}}
+
+        asyncio.run(graph.ainvoke({"question": "hi"}, config=config))
+
+        summary = metrics.summary()["answer"]
+        assert summary["count"] == 1
+        assert summary["input_tokens"] == 10
+        assert summary["output_tokens"] == 5
+        assert summary["cached_input_tokens"] == 8
+        assert summary["errors"] == 0
+        assert sum(summary["histogram_ms"].values()) == 1
+        runs = metrics.thread("t1")
+        assert [run["node"] for run in runs] == ["answer"]
+        assert runs[0]["wall_ms"] >= 0
+
+    def test_records_errors_and_retries(self, metrics):
+        """Test that a failed node is recorded as an error and its resumed run as a retry"""
+        graph = _build_graph(_fake_model(["hello"]), [RuntimeError("model down")])
+        config = {"configurable": {"thread_id": "t1"}}
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(graph.ainvoke({"question": "hi"}, config=config))
+        asyncio.run(graph.ainvoke(None, config=config))
+
+        summary = metrics.summary()["answer"]
+        assert summary["count"] == 2
+        assert summary["errors"] == 1
+        assert summary["error_rate"] == 0.5
+        assert summary["retries"] == 1
+        runs = metrics.thread("t1")
+        assert runs[0]["error"] == "RuntimeError: model down"
+        assert runs[1]["retry"] is True
+
+    def test_concurrent_threads_keep_separate_token_counts(self, metrics):
+        """Test that token usage of concurrent runs is attributed to the right thread"""
+        graph = _build_graph(_fake_model(["a", "b", "c"]), [])
+
+        async def run_all():
+            await asyncio.gather(*(
+                graph.ainvoke({"question": "hi"}, config={"configurable": {"thread_id": f"t{index}"}})
+                for index in range(3)
+            ))
+
+        asyncio.run(run_all())
+
+        for index in range(3):
+            assert metrics.thread(f"t{index}")[0]["input_tokens"] == 10
+        assert metrics.summary()["answer"]["input_tokens"] == 30
+
+    def test_summary_percentiles_and_buckets(self):
+        """Test latency percentiles and histogram bucket placement"""
+        metrics = NodeMetrics()
+        for wall_ms in (10, 20, 30, 40, 2000):
+            metrics.record("node", "t1", wall_ms)
+
+        summary = metrics.summary()["node"]
+        assert summary["p50_ms"] == 30
+        assert summary["p95_ms"] == 2000
+        assert summary["histogram_ms"]["le_50"] == 4
+        assert summary["histogram_ms"]["le_2500"] == 1
+
+    def test_oldest_threads_are_dropped(self):
+        """Test that only the most recent threads keep their node runs"""
+        metrics = NodeMetrics(max_threads=2)
+        for thread_id in ("a", "b", "c"):
+            metrics.record("node", thread_id, 1.0)
+
+        assert metrics.thread("a") == []
+        assert len(metrics.thread("c")) == 1
+        assert metrics.summary()["node"]["count"] == 3
@@ -0,0 +1,123 @@
+import asyncio
+from dataclasses import replace
+from unittest.mock import patch
+
+from app.config import graph_config
+from app.graphs import quotes_video_batch
+from app.services.llm import LLMConcurrencyLimiter
+from app.services.llm_batch import BatchRunner, LocalBatchBackend
+
+
+class FailingTopicBackend(LocalBatchBackend):
+    """Local batch backend whose requests for the second topic fail"""
+
+    def _run_request(self, request):
+        if request["custom_id"].startswith("1:"):
+            raise RuntimeError("request rejected")
+        return super()._run_request(request)
+
+
+class TestQuotesVideoBatch:
+    """
+    Unit tests for concurrent quote video batches
+    """
+
+    def test_batch_runs_all_topics(self, fake_graph_dependencies):
+        """Test that every topic gets its own run and result"""
+        _, video_tool = fake_graph_dependencies
+        topics = [f"topic-{index}" for index in range(6)]
+
+        result = asyncio.run(quotes_video_batch.run_quotes_video_batch(topics, "p1"))
+
+        assert result["succeeded"] == 6
+        assert result["failed"] == 0
+        assert [item["topic"] for item in result["results"]] == topics
+        assert all(item["video_id"] == "video-p1" for item in result["results"])
+        assert len({item["thread_id"] for item in result["results"]}) == 6
+        assert result["videos_per_minute"] > 0
+        assert video_tool.ainvoke.call_count == 6
+
+    def test_batch_respects_llm_concurrency_cap(self, fake_graph_dependencies):
+        """Test that concurrent runs never exceed the shared LLM concurrency cap"""
+        llm, _ = fake_graph_dependencies
+        topics = [f"topic-{index}" for index in range(5)]
+
+        with patch('app.graphs.quotes_video_graph.llm_concurrency', LLMConcurrencyLimiter(2)):
+            result = asyncio.run(quotes_video_batch.run_quotes_video_batch(topics, "p1"))
+
+        assert result["succeeded"] == 5
+        assert llm.max_in_flight == 2
+
+    def test_batch_caps_concurrent_graph_runs(self, fake_graph_dependencies):
+        """Test that no more than GRAPH_BATCH_MAX_CONCURRENCY graphs run at once"""
+        _, video_tool = fake_graph_dependencies
+        in_flight = max_in_flight = 0
+
+        async def create_video(input):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"video_id": "video-ok", "video_url": "https://example.com/video/ok"}
+
+        video_tool.ainvoke.side_effect = create_video
+        topics = [f"topic-{index}" for index in range(6)]
+
+        with patch.object(quotes_video_batch, "graph_config", replace(graph_config, batch_max_concurrency=2)):
+            result = asyncio.run(quotes_video_batch.run_quotes_video_batch(topics, "p1"))
+
+        assert result["succeeded"] == 6
+        assert max_in_flight == 2
+
+    def test_batch_reports_failures_per_topic(self, fake_graph_dependencies):
+        """Test that one failing topic doesn't fail the others"""
+        _, video_tool = fake_graph_dependencies
+
+        async def create_video(input):
+            if input["title"].startswith("topic-1 "):
+                raise RuntimeError("video API down")
+            return {"video_id": "video-ok", "video_url": "https://example.com/video/ok"}
+
+        video_tool.ainvoke.side_effect = create_video
+
+        result = asyncio.run(quotes_video_batch.run_quotes_video_batch(["topic-0", "topic-1", "topic-2"], "p1"))
+
+        assert result["succeeded"] == 2
+        assert result["failed"] == 1
+        failed = result["results"][1]
+        assert failed["status"] == "failed"
+        assert "video API down" in failed["error"]
+        assert failed["thread_id"]
+
+    def test_offline_batch_feeds_create_video(self, fake_graph_dependencies, tmp_path):
+        """Test that the offline batch generates every topic in two batches and creates the videos"""
+        _, video_tool = fake_graph_dependencies
+        runner = BatchRunner(LocalBatchBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake")
+        topics = [f"topic-{index}" for index in range(3)]
+
+        result = asyncio.run(quotes_video_batch.run_quotes_video_offline_batch(topics, "p1", runner))
+
+        assert result["succeeded"] == 3
+        assert [item["topic"] for item in result["results"]] == topics
+        assert all(item["video_id"] == "video-p1" for item in result["results"])
+        assert video_tool.ainvoke.call_count == 3
+        video_input = video_tool.ainvoke.call_args.kwargs["input"]
+        assert video_input["title"] == "fake best_title"
+        assert video_input["raw"] == ["fake quotes"]
+        assert len(list(tmp_path.glob("quotes-titles-*.input.jsonl"))) == 1
+        assert len(list(tmp_path.glob("quotes-content-*.input.jsonl"))) == 1
+
+    def test_offline_batch_reports_failed_requests_per_topic(self, fake_graph_dependencies, tmp_path):
+        """Test that a failed batch request only fails its own topic"""
+        _, video_tool = fake_graph_dependencies
+        runner = BatchRunner(FailingTopicBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake")
+
+        result = asyncio.run(
+            quotes_video_batch.run_quotes_video_offline_batch(["topic-0", "topic-1", "topic-2"], "p1", runner)
+        )
+
+        assert result["succeeded"] == 2
+        assert result["results"][1]["status"] == "failed"
+        assert "request rejected" in result["results"][1]["error"]
+        assert video_tool.ainvoke.call_count == 2
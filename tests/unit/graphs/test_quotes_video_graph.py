@@ -0,0 +1,209 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.graphs import quotes_video_graph
+
+
+class TestQuotesVideoGraph:
+    """
+    Unit tests for the quotes video graph
+    """
+
+    def test_new_thread_config_generates_unique_ids(self):
+        """Test that each new config gets its own thread ID"""
+        first = quotes_video_graph.new_thread_config()
+        second = quotes_video_graph.new_thread_config()
+
+        assert first["configurable"]["thread_id"] != second["configurable"]["thread_id"]
+
+    def test_new_thread_config_uses_given_id(self):
+        """Test that a client supplied thread ID is kept for resumption"""
+        config = quotes_video_graph.new_thread_config("client-thread")
+
+        assert config == {"configurable": {"thread_id": "client-thread"}}
+
+    def test_concurrent_runs_are_isolated(self, fake_graph_dependencies):
+        """Test that concurrent runs on separate threads don't overwrite each other's state"""
+        _, video_tool = fake_graph_dependencies
+        graph = quotes_video_graph.get_graph()
+
+        async def run(index):
+            config = quotes_video_graph.new_thread_config()
+            await graph.ainvoke({"topic": f"topic-{index}", "project_id": f"project-{index}"}, config=config)
+            return index, config, (await graph.aget_state(config=config)).values
+
+        async def run_all():
+            return await asyncio.gather(*(run(index) for index in range(20)))
+
+        results = asyncio.run(run_all())
+
+        thread_ids = {config["configurable"]["thread_id"] for _, config, _ in results}
+        assert len(thread_ids) == 20
+        for index, _, values in results:
+            assert values["topic"] == f"topic-{index}"
+            assert values["best_title"] == f"topic-{index} best_title"
+            assert values["quotes"] == [f"topic-{index} quotes"]
+            assert values["description"] == f"topic-{index} description"
+            assert values["video_id"] == f"video-project-{index}"
+        assert video_tool.ainvoke.call_count == 20
+
+    def test_parallel_branches_overlap(self, fake_graph_dependencies):
+        """Test that quotes, description and visual description LLM calls run concurrently"""
+        llm, _ = fake_graph_dependencies
+        config = quotes_video_graph.new_thread_config()
+
+        asyncio.run(quotes_video_graph.get_graph().ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+
+        assert llm.calls[:2] == ["TitleAndThumbnailTextLists", "BestTitleAndThumbnailText"]
+        assert sorted(llm.calls[2:]) == ["Description", "Quotes", "ThumbnailVisualDesc"]
+        assert llm.max_in_flight == 3
+
+    def test_astream_progress_emits_node_events(self, fake_graph_dependencies):
+        """Test that each node's output is streamed as it finishes, followed by a done event"""
+        config = quotes_video_graph.new_thread_config()
+
+        async def collect():
+            return [
+                event
+                async for event in quotes_video_graph.astream_progress(
+                    {"topic": "topic-1", "project_id": "p1"}, config
+                )
+            ]
+
+        events = asyncio.run(collect())
+
+        nodes = [event["node"] for event in events if event["event"] == "node"]
+        assert nodes[:2] == ["create_titles_thumbnails_list", "find_best_title_thumbnail_text"]
+        assert sorted(nodes[2:5]) == ["create_description", "create_quotes", "create_thumbnail_visual_desc"]
+        assert nodes[5] == "create_video"
+        assert events[1]["output"]["best_title"] == "topic-1 best_title"
+        assert events[5]["output"]["video_id"] == "video-p1"
+        assert events[-1]["event"] == "done"
+        assert all(event["thread_id"] == config["configurable"]["thread_id"] for event in events)
+        assert events[-1]["elapsed_ms"] >= events[5]["elapsed_ms"]
+
+    def test_astream_progress_emits_error_event(self, fake_graph_dependencies):
+        """Test that a failing node ends the stream with an error event"""
+        _, video_tool = fake_graph_dependencies
+        video_tool.ainvoke.side_effect = RuntimeError("video API down")
+
+        async def collect():
+            return [
+                event
+                async for event in quotes_video_graph.astream_progress(
+                    {"topic": "topic-1", "project_id": "p1"}, quotes_video_graph.new_thread_config()
+                )
+            ]
+
+        events = asyncio.run(collect())
+
+        assert events[-1]["event"] == "error"
+        assert "video API down" in events[-1]["error"]
+        assert len([event for event in events if event["event"] == "node"]) == 5
+
+    def test_fused_variant_selects_title_in_one_call(self, fake_graph_dependencies):
+        """Test that the fused variant generates and picks the title in a single LLM call"""
+        llm, _ = fake_graph_dependencies
+        config = quotes_video_graph.new_thread_config()
+        graph = quotes_video_graph.get_graph("fused")
+
+        asyncio.run(graph.ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+        values = graph.get_state(config=config).values
+
+        assert llm.calls[0] == "TitleCandidatesAndBest"
+        assert len(llm.calls) == 4
+        assert values["best_title"] == "topic-1 best_title"
+        assert values["titles"] == ["topic-1 titles"]
+        assert values["video_id"] == "video-p1"
+
+    def test_build_graph_unknown_variant(self):
+        """Test that an unknown graph variant is rejected"""
+        with pytest.raises(ValueError):
+            quotes_video_graph.build_graph("three_step")
+
+    def test_cached_title_pool_skips_title_generation(self, fake_graph_dependencies):
+        """Test that a fresh cached pool is reused and used titles are not offered again"""
+        llm, _ = fake_graph_dependencies
+        title_cache = quotes_video_graph.title_cache
+        title_cache.store_pool(
+            "topic-1",
+            ["topic-1 best_title", "title a", "title b", "title c"],
+            ["topic-1 best_thumbnail_text", "text a"],
+        )
+        config = quotes_video_graph.new_thread_config()
+
+        asyncio.run(quotes_video_graph.get_graph().ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+        values = quotes_video_graph.get_graph().get_state(config=config).values
+
+        assert "TitleAndThumbnailTextLists" not in llm.calls
+        assert values["titles"] == ["topic-1 best_title", "title a", "title b", "title c"]
+        assert title_cache.get_pool("topic-1")["titles"] == ["title a", "title b", "title c"]
+
+    def test_resume_reruns_only_failed_node(self, fake_graph_dependencies):
+        """Test that resuming a thread after a video API failure doesn't repeat the LLM nodes"""
+        llm, video_tool = fake_graph_dependencies
+        create_video = video_tool.ainvoke.side_effect
+
+        async def fail_once(input):
+            if video_tool.ainvoke.call_count == 1:
+                raise RuntimeError("video API down")
+            return await create_video(input=input)
+
+        video_tool.ainvoke.side_effect = fail_once
+        graph = quotes_video_graph.get_graph()
+        config = quotes_video_graph.new_thread_config()
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(graph.ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+        assert graph.get_state(config=config).next == ("create_video",)
+        llm_calls = len(llm.calls)
+
+        asyncio.run(graph.ainvoke(None, config=config))
+        snapshot = graph.get_state(config=config)
+
+        assert len(llm.calls) == llm_calls
+        assert video_tool.ainvoke.call_count == 2
+        assert snapshot.next == ()
+        assert snapshot.values["video_id"] == "video-p1"
+        assert snapshot.values["quotes"] == ["topic-1 quotes"]
+
+    def test_thumbnail_image_branch_joins_before_video(self, fake_graph_dependencies):
+        """Test that the thumbnail image runs after the visual description and create_video runs once"""
+        _, video_tool = fake_graph_dependencies
+        thumbnail_service = MagicMock()
+        thumbnail_service.get_or_create = AsyncMock(return_value="/thumbnails/abc.png")
+        graph = quotes_video_graph.build_graph("two_step", thumbnail_image=True).compile(
+            checkpointer=quotes_video_graph.memory
+        )
+        config = quotes_video_graph.new_thread_config()
+
+        with patch.object(quotes_video_graph, "thumbnail_service", thumbnail_service):
+            asyncio.run(graph.ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+        values = graph.get_state(config=config).values
+
+        thumbnail_service.get_or_create.assert_awaited_once_with("topic-1 thumbnail_visual_desc")
+        assert video_tool.ainvoke.call_count == 1
+        assert values["thumbnail_image_path"] == "/thumbnails/abc.png"
+        assert values["video_id"] == "video-p1"
+
+    def test_thumbnail_image_failure_does_not_block_video(self, fake_graph_dependencies):
+        """Test that a failed image generation still creates the video"""
+        thumbnail_service = MagicMock()
+        thumbnail_service.get_or_create = AsyncMock(side_effect=RuntimeError("image API down"))
+        graph = quotes_video_graph.build_graph("two_step", thumbnail_image=True).compile(
+            checkpointer=quotes_video_graph.memory
+        )
+        config = quotes_video_graph.new_thread_config()
+
+        with patch.object(quotes_video_graph, "thumbnail_service", thumbnail_service):
+            asyncio.run(graph.ainvoke({"topic": "topic-1", "project_id": "p1"}, config=config))
+        values = graph.get_state(config=config).values
+
+        assert values["thumbnail_image_path"] == ""
+        assert values["video_id"] == "video-p1"
+
+    def test_get_graph_compiles_once_per_variant(self):
+        """Test that compiled graphs are cached per variant"""
+        assert quotes_video_graph.get_graph("fused") is quotes_video_graph.get_graph("fused")
+        assert quotes_video_graph.get_graph("fused") is not quotes_video_graph.get_graph("two_step")
@@ -1,6 +1,23 @@
+import asyncio
+import gzip
+import json
+
+import httpx
 import pytest
+import requests
+import zstandard
 from unittest.mock import patch, MagicMock
-from app.services.api_calls import HttpClient
+from app.services.api_calls import HttpClient, dumps, compress, parse_compression
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _response(status_code=200, json_data=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = json_data
+    return response
 
 
 class TestHttpClient:
@@ -11,98 +28,214 @@ class TestHttpClient:
     def setup_method(self):
         """Setup method to run before each test"""
         self.base_url = "https://api.example.com"
-        self.client = HttpClient(self.base_url)
+        self.client = HttpClient(self.base_url, connect_timeout=2, read_timeout=30, backoff_seconds=0)
+        self.timeout = (2, 30)
 
-    @patch('app.services.api_calls.requests.get')
-    def test_get(self, mock_get):
+    def test_get(self):
         """Test GET request"""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"data": "test"}
-        mock_get.return_value = mock_response
-        
-        # Call the method
-        result = self.client.get("endpoint")
-        
-        # Verify request was made correctly
-        mock_get.assert_called_once_with(f"{self.base_url}/endpoint")
+        with patch.object(self.client.session, "request", return_value=_response(json_data={"data": "test"})) as mock_request:
+            result = self.client.get("endpoint")
+
+        # Verify request was made correctly, with the configured timeouts
+        mock_request.assert_called_once_with(
+            "GET", f"{self.base_url}/endpoint", data=None, headers={}, timeout=self.timeout
+        )
         assert result == {"data": "test"}
 
-    @patch('app.services.api_calls.requests.post')
-    def test_post(self, mock_post):
+    def test_post(self):
         """Test POST request"""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"id": 123}
-        mock_post.return_value = mock_response
-        
-        # Test data
         data = {"name": "test"}
-        
-        # Call the method
-        result = self.client.post("endpoint", data)
-        
-        # Verify request was made correctly
-        mock_post.assert_called_once_with(f"{self.base_url}/endpoint", json=data)
+        with patch.object(self.client.session, "request", return_value=_response(json_data={"id": 123})) as mock_request:
+            result = self.client.post("endpoint", data)
+
+        mock_request.assert_called_once_with(
+            "POST", f"{self.base_url}/endpoint", data=dumps(data), headers=JSON_HEADERS, timeout=self.timeout
+        )
         assert result == {"id": 123}
 
-    @patch('app.services.api_calls.requests.put')
-    def test_put(self, mock_put):
+    def test_put(self):
         """Test PUT request"""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"updated": True}
-        mock_put.return_value = mock_response
-        
-        # Test data
         data = {"id": 123, "name": "updated"}
-        
-        # Call the method
-        result = self.client.put("endpoint", data)
-        
-        # Verify request was made correctly
-        mock_put.assert_called_once_with(f"{self.base_url}/endpoint", json=data)
+        with patch.object(self.client.session, "request", return_value=_response(json_data={"updated": True})) as mock_request:
+            result = self.client.put("endpoint", data)
+
+        mock_request.assert_called_once_with(
+            "PUT", f"{self.base_url}/endpoint", data=dumps(data), headers=JSON_HEADERS, timeout=self.timeout
+        )
         assert result == {"updated": True}
 
-    @patch('app.services.api_calls.requests.delete')
-    def test_delete(self, mock_delete):
+    def test_delete(self):
         """Test DELETE request"""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"deleted": True}
-        mock_delete.return_value = mock_response
-        
-        # Call the method
-        result = self.client.delete("endpoint")
-        
-        # Verify request was made correctly
-        mock_delete.assert_called_once_with(f"{self.base_url}/endpoint")
+        with patch.object(self.client.session, "request", return_value=_response(json_data={"deleted": True})) as mock_request:
+            result = self.client.delete("endpoint")
+
+        mock_request.assert_called_once_with(
+            "DELETE", f"{self.base_url}/endpoint", data=None, headers={}, timeout=self.timeout
+        )
         assert result == {"deleted": True}
 
-    @patch('app.services.api_calls.requests.get')
-    def test_get_error_handling(self, mock_get):
+    def test_get_error_handling(self):
         """Test error handling in GET request"""
-        # Mock the request to raise an error
-        mock_response = MagicMock()
+        mock_response = _response(status_code=404)
         mock_response.raise_for_status.side_effect = Exception("HTTP Error")
-        mock_get.return_value = mock_response
-        
-        # Verify the error is propagated
-        with pytest.raises(Exception) as excinfo:
-            self.client.get("endpoint")
-            
+
+        with patch.object(self.client.session, "request", return_value=mock_response):
+            with pytest.raises(Exception) as excinfo:
+                self.client.get("endpoint")
+
         assert "HTTP Error" in str(excinfo.value)
 
-    @patch('app.services.api_calls.requests.post')
-    def test_post_error_handling(self, mock_post):
+    def test_post_error_handling(self):
         """Test error handling in POST request"""
-        # Mock the request to raise an error
-        mock_response = MagicMock()
+        mock_response = _response(status_code=500)
         mock_response.raise_for_status.side_effect = Exception("HTTP Error")
-        mock_post.return_value = mock_response
-        
-        # Verify the error is propagated
-        with pytest.raises(Exception) as excinfo:
-            self.client.post("endpoint", {})
-            
+
+        with patch.object(self.client.session, "request", return_value=mock_response):
+            with pytest.raises(Exception) as excinfo:
+                self.client.post("endpoint", {})
+
         assert "HTTP Error" in str(excinfo.value)
+
+    def test_get_retries_transient_failures(self):
+        """Test that an idempotent request is retried on timeouts and retryable responses"""
+        responses = [requests.ReadTimeout("slow"), _response(status_code=503), _response(json_data={"ok": True})]
+        with patch.object(self.client.session, "request", side_effect=responses) as mock_request, \
+                patch("app.services.api_calls.time.sleep") as mock_sleep:
+            result = self.client.get("endpoint")
+
+        assert result == {"ok": True}
+        assert mock_request.call_count == 3
+        assert mock_sleep.call_count == 2
+
+    def test_post_is_not_retried_after_reaching_the_server(self):
+        """Test that a POST is not sent again once the server may have processed it"""
+        mock_response = _response(status_code=503)
+        mock_response.raise_for_status.side_effect = requests.HTTPError("503")
+
+        with patch.object(self.client.session, "request", return_value=mock_response) as mock_request:
+            with pytest.raises(requests.HTTPError):
+                self.client.post("endpoint", {})
+
+        assert mock_request.call_count == 1
+
+    def test_post_is_retried_when_the_connection_failed(self):
+        """Test that a POST is retried when it never reached the server"""
+        responses = [requests.ConnectTimeout("connect"), _response(json_data={"id": 1})]
+        with patch.object(self.client.session, "request", side_effect=responses) as mock_request, \
+                patch("app.services.api_calls.time.sleep"):
+            result = self.client.post("endpoint", {})
+
+        assert result == {"id": 1}
+        assert mock_request.call_count == 2
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the last failure is raised once the retries are used up"""
+        client = HttpClient(self.base_url, max_retries=2, backoff_seconds=0)
+        with patch.object(client.session, "request", side_effect=requests.ReadTimeout("slow")) as mock_request, \
+                patch("app.services.api_calls.time.sleep"):
+            with pytest.raises(requests.ReadTimeout):
+                client.get("endpoint")
+
+        assert mock_request.call_count == 3
+
+    def test_backoff_honours_retry_after(self):
+        """Test that the server's Retry-After wins over the jittered backoff, up to the cap"""
+        assert self.client._backoff(0, "2") == 2
+        assert self.client._backoff(0, "3600") == self.client.max_backoff_seconds
+        assert 0 <= HttpClient(self.base_url, backoff_seconds=1)._backoff(3) <= 8
+
+    def test_async_request_retries_and_reuses_client(self):
+        """Test the async variant against a mock transport"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(502)
+            return httpx.Response(200, json={"method": request.method})
+
+        async def run():
+            client = self.client._async_client()
+            client._transport = httpx.MockTransport(handler)
+            result = await self.client.aget("endpoint")
+            assert self.client._async_client() is client
+            await self.client.aclose()
+            return result
+
+        assert asyncio.run(run()) == {"method": "GET"}
+        assert len(calls) == 2
+        assert str(calls[0].url) == f"{self.base_url}/endpoint"
+
+
+class TestRequestCompression:
+    """
+    Unit tests for request body serialization and compression
+    """
+
+    def setup_method(self):
+        self.payload = {"raw": [{"question": f"Question {index}?", "explanation": "because " * 50} for index in range(30)]}
+
+    def test_parse_compression(self):
+        """Test parsing the per-endpoint compression setting"""
+        assert parse_compression("videos/create-with-scenes=zstd, *=gzip") == {
+            "videos/create-with-scenes": "zstd", "*": "gzip",
+        }
+        assert parse_compression("") == {}
+        with pytest.raises(ValueError):
+            parse_compression("videos=brotli")
+
+    def test_dumps_matches_json(self):
+        """Test that the fast serializer produces the same JSON document"""
+        assert json.loads(dumps(self.payload)) == self.payload
+
+    def test_compresses_configured_endpoints_only(self):
+        """Test that bodies are compressed for the configured endpoint and left alone elsewhere"""
+        client = HttpClient("https://api.example.com", compression={"videos/create-with-scenes": "zstd"})
+
+        body, headers = client._body("/videos/create-with-scenes?key=k", self.payload)
+        plain_body, plain_headers = client._body("/other", self.payload)
+
+        assert headers["Content-Encoding"] == "zstd"
+        assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(body)) == self.payload
+        assert len(body) < len(plain_body)
+        assert plain_headers == JSON_HEADERS
+
+    def test_small_bodies_are_not_compressed(self):
+        """Test that bodies under the size threshold are sent as plain JSON"""
+        client = HttpClient("https://api.example.com", compression={"*": "gzip"}, min_compress_bytes=1024)
+
+        _, headers = client._body("endpoint", {"id": 1})
+
+        assert "Content-Encoding" not in headers
+
+    def test_unsupported_encoding_falls_back(self):
+        """Test that a 415 switches the endpoint to an encoding it accepts, without using a retry"""
+        client = HttpClient("https://api.example.com", compression={"*": "zstd"}, max_retries=0)
+        rejected = _response(status_code=415, headers={"Accept-Encoding": "gzip, identity"})
+        responses = [rejected, _response(json_data={"id": 1})]
+
+        with patch.object(client.session, "request", side_effect=responses) as mock_request:
+            result = client.post("videos/create-with-scenes", self.payload)
+
+        assert result == {"id": 1}
+        first, second = mock_request.call_args_list
+        assert first.kwargs["headers"]["Content-Encoding"] == "zstd"
+        assert second.kwargs["headers"]["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(second.kwargs["data"])) == self.payload
+        # Remembered for the next request to the endpoint
+        assert client._encoding_for("videos/create-with-scenes") == "gzip"
+
+    def test_endpoint_rejecting_every_encoding_gets_plain_json(self):
+        """Test that an endpoint rejecting all encodings ends up with uncompressed bodies"""
+        client = HttpClient("https://api.example.com", compression={"*": "gzip"})
+        responses = [_response(status_code=415), _response(json_data={"id": 1})]
+
+        with patch.object(client.session, "request", side_effect=responses) as mock_request:
+            client.post("endpoint", self.payload)
+
+        assert mock_request.call_args.kwargs["headers"] == JSON_HEADERS
+
+    def test_compress_rejects_unknown_encoding(self):
+        """Test that an unknown encoding is reported"""
+        with pytest.raises(ValueError):
+            compress(b"{}", "brotli")
@@ -1,6 +1,16 @@
+import time
+import asyncio
+import threading
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.llm import LLMService
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel
+from app.services.llm import (
+    LLM_PROVIDERS, LLMClientRegistry, LLMRateLimiter, LLMRoute, LLMRouter, LLMService, SingleFlight,
+    message_key, track_usage,
+)
+from app.services.fake_llm import FakeChatModel
 
 
 class TestLLMService:
@@ -46,3 +56,460 @@ class TestLLMService:
             
             assert result == "Predicted response"
             mock_model.predict.assert_called_once_with("Test prompt")
+
+    def test_init_with_temperature_and_http_clients(self):
+        """Test that the optional temperature and shared HTTP clients are passed through"""
+        with patch('app.services.llm.ChatOpenAI') as mock_chat_openai:
+            http_client = MagicMock()
+            http_async_client = MagicMock()
+
+            LLMService(
+                provider_name="openai", model_name="gpt-4", api_key="fake-key", temperature=0.2,
+                http_client=http_client, http_async_client=http_async_client,
+            )
+
+            mock_chat_openai.assert_called_once_with(
+                model_name="gpt-4",
+                openai_api_key="fake-key",
+                temperature=0.2,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+
+
+class TestLLMClientRegistry:
+    """
+    Unit tests for the LLMClientRegistry class
+    """
+
+    def test_get_model_reuses_client_per_configuration(self):
+        """Test that models are created once per (provider, model, temperature, api_key)"""
+        with patch('app.services.llm.ChatOpenAI') as mock_chat_openai:
+            mock_chat_openai.side_effect = lambda **kwargs: MagicMock()
+            registry = LLMClientRegistry()
+
+            first = registry.get_model("openai", "gpt-4", "fake-key", 0.2)
+            second = registry.get_model("OpenAI", "gpt-4", "fake-key", 0.2)
+            other = registry.get_model("openai", "gpt-4", "fake-key", 0.9)
+
+            assert first is second
+            assert other is not first
+            assert mock_chat_openai.call_count == 2
+
+    def test_models_share_http_clients(self):
+        """Test that every model uses the registry's pooled HTTP clients"""
+        with patch('app.services.llm.ChatOpenAI') as mock_chat_openai:
+            registry = LLMClientRegistry(max_connections=10, max_keepalive_connections=5)
+
+            registry.get_model("openai", "gpt-4", "fake-key")
+            registry.get_model("openai", "gpt-4o", "fake-key")
+
+            first, second = (call.kwargs for call in mock_chat_openai.call_args_list)
+            assert first["http_client"] is second["http_client"]
+            assert first["http_async_client"] is second["http_async_client"]
+            assert "temperature" not in first
+            assert registry.limits.max_connections == 10
+
+    def test_structured_wrappers_are_cached(self):
+        """Test that structured-output wrappers are reused for the same model and schema"""
+        registry = LLMClientRegistry()
+        model = MagicMock()
+        model.with_structured_output.side_effect = lambda schema, **kwargs: MagicMock()
+        schema = {"type": "object", "properties": {"a": {"type": "string"}}}
+
+        first = registry.structured(model, schema, include_raw=True)
+        second = registry.structured(model, dict(schema), include_raw=True)
+        without_raw = registry.structured(model, schema)
+
+        assert first is second
+        assert without_raw is not first
+        assert model.with_structured_output.call_count == 2
+
+
+class TestLLMRateLimiter:
+    """
+    Unit tests for the LLMRateLimiter class
+    """
+
+    def test_disabled_budgets_grant_immediately(self):
+        """Test that a limiter without budgets never queues"""
+        limiter = LLMRateLimiter()
+
+        for _ in range(100):
+            assert limiter.acquire(10_000, "p1") < 0.05
+
+        assert limiter.stats()["granted"] == 100
+
+    def test_token_budget_delays_calls(self):
+        """Test that a call waits until the token bucket has refilled enough"""
+        limiter = LLMRateLimiter(tokens_per_minute=600)  # 10 tokens per second
+        limiter.acquire(600, "p1")
+
+        wait = limiter.acquire(5, "p1")
+
+        assert wait >= 0.4
+        assert limiter.stats()["max_wait_ms"] >= 400
+
+    def test_request_budget_delays_calls(self):
+        """Test that a call waits when the request bucket is empty"""
+        limiter = LLMRateLimiter(requests_per_minute=600)  # 10 requests per second
+        for _ in range(600):
+            limiter.acquire(1, "p1")
+
+        assert limiter.acquire(1, "p1") >= 0.05
+
+    def test_projects_are_served_round_robin(self):
+        """Test that queued calls alternate between projects instead of first come, first served"""
+        limiter = LLMRateLimiter(tokens_per_minute=6000)  # 100 tokens per second
+        limiter.acquire(6000, "drain")
+        order = []
+
+        async def call(project_id):
+            await limiter.aacquire(10, project_id)
+            order.append(project_id)
+
+        async def run_all():
+            await asyncio.gather(call("a"), call("a"), call("a"), call("b"))
+
+        asyncio.run(run_all())
+
+        assert order == ["a", "b", "a", "a"]
+
+    def test_settle_refunds_overestimated_tokens(self):
+        """Test that unused estimated tokens are returned to the budget"""
+        limiter = LLMRateLimiter(tokens_per_minute=1000)
+        limiter.acquire(1000, "p1")
+
+        limiter.settle(estimated_tokens=1000, actual_tokens=100)
+
+        assert limiter.stats()["available_tokens"] >= 900
+
+    def test_cancelled_wait_leaves_queue(self):
+        """Test that a cancelled async wait doesn't hold a place in the queue"""
+        limiter = LLMRateLimiter(tokens_per_minute=60)
+        limiter.acquire(60, "p1")
+
+        async def cancelled():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.aacquire(30, "p1"), timeout=0.05)
+
+        asyncio.run(cancelled())
+
+        assert limiter.stats()["queued"] == {}
+
+    def test_limit_settles_with_actual_usage(self):
+        """Test that the limit context manager settles the budget with the reported usage"""
+        limiter = LLMRateLimiter(tokens_per_minute=1000)
+        model = GenericFakeChatModel(messages=iter([AIMessage(
+            content="ok",
+            response_metadata={"model_name": "fake-model"},
+            usage_metadata={"input_tokens": 30, "output_tokens": 20, "total_tokens": 50},
+        )]))
+
+        with limiter.limit("p1", estimated_tokens=500) as usage:
+            model.invoke("hi")
+
+        assert usage.total_tokens == 50
+        assert 940 <= limiter.stats()["available_tokens"] <= 1000
+
+
+    def test_failed_call_keeps_its_estimate(self):
+        """Test that a call failing without usage stays charged, so error storms count against TPM"""
+        limiter = LLMRateLimiter(tokens_per_minute=1000)
+
+        with pytest.raises(RuntimeError):
+            with limiter.limit("p1", estimated_tokens=500):
+                raise RuntimeError("429 Too Many Requests")
+
+        assert limiter.stats()["available_tokens"] <= 510
+
+    def test_coalesced_call_is_refunded(self):
+        """Test that a call joining another's in-flight call gives back its request and tokens"""
+        limiter = LLMRateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        def leader():
+            with limiter.limit("p1", estimated_tokens=500):
+                single_flight.do("key", lambda: release.wait() and "leader")
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        while single_flight.stats()["leaders"] == 0:
+            time.sleep(0.01)
+        timer = threading.Timer(0.05, release.set)
+        timer.start()
+        with limiter.limit("p1", estimated_tokens=400) as usage:
+            single_flight.do("key", lambda: "follower")
+        thread.join()
+
+        assert usage.coalesced == 1
+        stats = limiter.stats()
+        # The leader reported no usage either, so only its estimate and request remain charged
+        assert 490 <= stats["available_tokens"] <= 510
+        assert stats["available_requests"] >= 1
+
+
+class TestTrackUsage:
+    """
+    Unit tests for nested token usage tracking
+    """
+
+    def test_nested_trackers_all_see_usage(self):
+        """Test that an outer tracker also counts calls made inside an inner one"""
+        model = GenericFakeChatModel(messages=iter([
+            AIMessage(
+                content=reply,
+                response_metadata={"model_name": "fake-model"},
+                usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15},
+            )
+            for reply in ("a", "b")
+        ]))
+
+        with track_usage() as outer:
+            model.invoke("first")
+            with track_usage() as inner:
+                model.invoke("second")
+
+        assert inner.total_tokens == 15
+        assert outer.input_tokens == 20
+        assert outer.output_tokens == 10
+
+
+class Reply(BaseModel):
+    answer: str
+
+
+def _slow_provider(service):
+    return FakeChatModel(model_name=service.model_name, latency_seconds=1, timeout_seconds=service.timeout_seconds)
+
+
+def _steady_provider(service):
+    return FakeChatModel(model_name=service.model_name, latency_seconds=0.3, timeout_seconds=service.timeout_seconds)
+
+
+def _broken_provider(service):
+    model = MagicMock()
+    model.invoke.side_effect = RuntimeError("provider down")
+    return model
+
+
+class TestLLMRouter:
+    """
+    Unit tests for provider backends and the LLMRouter class
+    """
+
+    def test_fake_provider_supports_structured_output(self):
+        """Test that the offline fake backend answers with the requested schema"""
+        model = LLMService(provider_name="fake", model_name="fake-model", api_key="").model
+
+        result = model.with_structured_output(Reply).invoke("hi")
+
+        assert isinstance(model, FakeChatModel)
+        assert result == Reply(answer="fake answer")
+
+    def test_async_timeout_fails_over_to_next_route(self):
+        """Test that a call past the deadline is retried on the secondary route"""
+        with patch.dict(LLM_PROVIDERS, {"slow": _slow_provider}):
+            router = LLMRouter(
+                [LLMRoute("slow", "primary"), LLMRoute("fake", "secondary")],
+                registry=LLMClientRegistry(),
+                deadline_seconds=0.1,
+            )
+
+            result = asyncio.run(router.with_structured_output(Reply).ainvoke("hi"))
+
+        assert result.answer == "fake answer"
+        stats = router.stats()["routes"]
+        assert stats["slow:primary"]["errors"] == 1
+        assert stats["fake:secondary"]["errors"] == 0
+
+    def test_sync_timeout_fails_over_to_next_route(self):
+        """Test that a sync call past the deadline times out in the client and is retried on the secondary route"""
+        with patch.dict(LLM_PROVIDERS, {"slow": _slow_provider}):
+            router = LLMRouter(
+                [LLMRoute("slow", "primary"), LLMRoute("fake", "secondary")],
+                registry=LLMClientRegistry(),
+                deadline_seconds=0.1,
+            )
+
+            result = router.with_structured_output(Reply).invoke("hi")
+
+        assert result.answer == "fake answer"
+        assert router.stats()["routes"]["slow:primary"]["errors"] == 1
+
+    def test_sync_deadline_counts_only_the_call(self):
+        """Test that concurrent sync calls faster than the deadline all succeed on the primary route"""
+        with patch.dict(LLM_PROVIDERS, {"steady": _steady_provider}):
+            router = LLMRouter(
+                [LLMRoute("steady", "primary"), LLMRoute("fake", "secondary")],
+                registry=LLMClientRegistry(),
+                deadline_seconds=0.5,
+                coalesce=False,
+            )
+            threads = [threading.Thread(target=router.invoke, args=(f"hello {index}",)) for index in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        stats = router.stats()["routes"]
+        assert stats["steady:primary"] == {**stats["steady:primary"], "calls": 20, "errors": 0}
+        assert stats["fake:secondary"]["calls"] == 0
+
+    def test_deadline_sets_the_route_client_timeout(self):
+        """Test that route models get the deadline as their request timeout and no client retries"""
+        router = LLMRouter([LLMRoute("openai", "gpt-test", "key")], registry=LLMClientRegistry(), deadline_seconds=5)
+
+        model = router.model_for(router.routes[0])
+
+        assert model.request_timeout == 5
+        assert model.max_retries == 0
+
+    def test_sync_error_fails_over_to_next_route(self):
+        """Test that a failing provider falls back to the next route"""
+        with patch.dict(LLM_PROVIDERS, {"broken": _broken_provider}):
+            router = LLMRouter(
+                [LLMRoute("broken", "primary"), LLMRoute("fake", "secondary")],
+                registry=LLMClientRegistry(),
+            )
+
+            result = router.invoke("hello")
+
+        assert result.content == "Fake reply to: hello"
+        assert router.stats()["routes"]["broken:primary"]["error_rate"] == 1.0
+
+    def test_all_routes_failing_raises(self):
+        """Test that the last error is raised when every route fails"""
+        with patch.dict(LLM_PROVIDERS, {"broken": _broken_provider}):
+            router = LLMRouter([LLMRoute("broken", "a"), LLMRoute("broken", "b")], registry=LLMClientRegistry())
+
+            with pytest.raises(RuntimeError):
+                router.invoke("hello")
+
+    def test_routes_ordered_by_health_and_p95(self):
+        """Test that measured fast routes go first and error-prone routes go last"""
+        primary, secondary, flaky = LLMRoute("fake", "primary"), LLMRoute("fake", "secondary"), LLMRoute("fake", "flaky")
+        router = LLMRouter([flaky, primary, secondary], registry=LLMClientRegistry(), min_samples=3)
+        assert router.ordered_routes() == [flaky, primary, secondary]
+
+        for _ in range(3):
+            router.record(primary, 0.5, True)
+            router.record(secondary, 0.1, True)
+            router.record(flaky, 0.01, False)
+
+        assert router.ordered_routes() == [secondary, primary, flaky]
+
+    def test_from_config_parses_fallbacks(self):
+        """Test that LLM_FALLBACKS routes follow the primary route"""
+        with patch('app.services.llm.llm_config') as mock_config:
+            mock_config.provider = "openai"
+            mock_config.model_name = "gpt-4.1-mini"
+            mock_config.fallbacks = "openai:gpt-4.1-nano, fake:offline"
+            mock_config.call_deadline_seconds = 30
+            mock_config.router_max_error_rate = 0.5
+            mock_config.router_min_samples = 5
+
+            router = LLMRouter.from_config()
+
+        assert [route.key for route in router.routes] == ["openai:gpt-4.1-mini", "openai:gpt-4.1-nano", "fake:offline"]
+        assert router.deadline_seconds == 30
+
+
+def _delayed_provider(service):
+    return FakeChatModel(model_name=service.model_name, latency_seconds=0.05)
+
+
+class TestCoalescing:
+    """
+    Unit tests for single-flight coalescing of identical LLM calls
+    """
+
+    def test_message_key_normalizes_whitespace(self):
+        """Test that prompts differing only in whitespace share a key"""
+        assert message_key("Generate  titles\nfor Life") == message_key(" Generate titles for Life ")
+        assert message_key("Generate titles for Life") != message_key("Generate titles for Love")
+        assert message_key([HumanMessage(content="hi")]) != message_key([SystemMessage(content="hi")])
+
+    def test_async_callers_share_one_call(self):
+        """Test that concurrent identical async calls run once and get separate copies"""
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"titles": ["a"]}
+
+        async def run_all():
+            return await asyncio.gather(*(single_flight.ado("key", fetch) for _ in range(5)))
+
+        results = asyncio.run(run_all())
+
+        assert len(calls) == 1
+        assert all(result == {"titles": ["a"]} for result in results)
+        assert len({id(result) for result in results}) == 5
+        assert single_flight.stats() == {"leaders": 1, "coalesced": 4}
+
+    def test_sync_callers_share_one_call_and_error(self):
+        """Test that concurrent identical threads share the call and its exception"""
+        single_flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def fail():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("provider down")
+
+        errors = []
+
+        def call():
+            try:
+                single_flight.do("key", fail)
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=call) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader] + followers:
+            thread.join()
+
+        assert len(calls) == 1
+        assert len(errors) == 4
+
+    def test_router_coalesces_identical_structured_calls(self):
+        """Test that identical structured-output calls through the router make one upstream request"""
+        with patch.dict(LLM_PROVIDERS, {"delayed": _delayed_provider}):
+            router = LLMRouter([LLMRoute("delayed", "model")], registry=LLMClientRegistry())
+            structured = router.with_structured_output(Reply)
+
+            async def run_all():
+                return await asyncio.gather(
+                    structured.ainvoke("Titles for Life"),
+                    structured.ainvoke("Titles  for Life"),
+                    structured.ainvoke("Titles for Love"),
+                )
+
+            results = asyncio.run(run_all())
+
+        assert all(result.answer == "fake answer" for result in results)
+        assert router.stats()["routes"]["delayed:model"]["calls"] == 2
+        assert router.stats()["single_flight"]["coalesced"] == 1
+
+    def test_router_without_coalescing_calls_every_time(self):
+        """Test that coalescing can be turned off"""
+        with patch.dict(LLM_PROVIDERS, {"delayed": _delayed_provider}):
+            router = LLMRouter([LLMRoute("delayed", "model")], registry=LLMClientRegistry(), coalesce=False)
+
+            async def run_all():
+                await asyncio.gather(*(router.ainvoke("hi") for _ in range(3)))
+
+            asyncio.run(run_all())
+
+        assert router.stats()["routes"]["delayed:model"]["calls"] == 3
@@ -0,0 +1,109 @@
+import json
+import pytest
+from pydantic import BaseModel
+from langchain_core.messages import HumanMessage
+
+from app.services.llm_batch import BATCH_COMPLETED, BatchBackend, BatchRunner, LocalBatchBackend
+
+
+class Reply(BaseModel):
+    answer: str
+
+
+class ScriptedBackend(BatchBackend):
+    """Backend stand-in that walks through a list of states before completing"""
+
+    def __init__(self, states, results=None):
+        self.states = list(states)
+        self.results = results or []
+        self.submitted = []
+
+    def submit(self, input_path):
+        with open(input_path) as f:
+            self.submitted.append([json.loads(line) for line in f])
+        return "batch-1"
+
+    def status(self, batch_id):
+        return self.states.pop(0)
+
+    def download(self, batch_id, output_path):
+        with open(output_path, "w") as f:
+            for result in self.results:
+                f.write(json.dumps(result) + "\n")
+
+
+class TestBatchRunner:
+    """
+    Unit tests for the BatchRunner class and the local batch backend
+    """
+
+    def test_local_backend_answers_every_request(self, tmp_path):
+        """Test that the local backend returns a parseable result per custom ID"""
+        runner = BatchRunner(LocalBatchBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake-model")
+        requests = [runner.chat_request(f"req-{index}", [HumanMessage(content="hi")], Reply) for index in range(3)]
+
+        results = runner.run(requests, name="test")
+
+        assert sorted(results) == ["req-0", "req-1", "req-2"]
+        assert BatchRunner.parse(results["req-1"], Reply) == Reply(answer="fake answer")
+        assert len(list(tmp_path.glob("test-*.input.jsonl"))) == 1
+        assert len(list(tmp_path.glob("test-*.output.jsonl"))) == 1
+
+    def test_backend_must_implement_every_method(self):
+        """Test that a backend missing part of the batch API can't be constructed"""
+        class SubmitOnlyBackend(BatchBackend):
+            def submit(self, input_path):
+                return "batch-1"
+
+        with pytest.raises(TypeError):
+            SubmitOnlyBackend()
+
+    def test_chat_request_uses_openai_batch_format(self, tmp_path):
+        """Test that request lines follow the chat completions batch input format"""
+        runner = BatchRunner(ScriptedBackend([]), str(tmp_path), model_name="gpt-test", temperature=0.2)
+
+        request = runner.chat_request("req-0", [HumanMessage(content="hi")], Reply)
+
+        assert request["url"] == "/v1/chat/completions"
+        assert request["body"]["model"] == "gpt-test"
+        assert request["body"]["messages"] == [{"role": "user", "content": "hi"}]
+        assert request["body"]["response_format"]["json_schema"]["name"] == "Reply"
+
+    def test_polls_until_completed(self, tmp_path):
+        """Test that the runner keeps polling while the batch is in progress"""
+        result = {
+            "custom_id": "req-0",
+            "response": {"status_code": 200, "body": {"choices": [{"message": {"content": '{"answer": "ok"}'}}]}},
+            "error": None,
+        }
+        backend = ScriptedBackend(["validating", "in_progress", BATCH_COMPLETED], [result])
+        runner = BatchRunner(backend, str(tmp_path), poll_interval_seconds=0)
+
+        results = runner.run([runner.chat_request("req-0", [HumanMessage(content="hi")], Reply)])
+
+        assert backend.states == []
+        assert BatchRunner.parse(results["req-0"], Reply) == Reply(answer="ok")
+
+    def test_failed_batch_raises(self, tmp_path):
+        """Test that a failed or expired batch is reported"""
+        runner = BatchRunner(ScriptedBackend(["in_progress", "expired"]), str(tmp_path), poll_interval_seconds=0)
+
+        with pytest.raises(RuntimeError, match="expired"):
+            runner.run([])
+
+    def test_timeout_raises(self, tmp_path):
+        """Test that the runner gives up after the timeout"""
+        runner = BatchRunner(ScriptedBackend(["in_progress"] * 3), str(tmp_path), poll_interval_seconds=0,
+                             timeout_seconds=0)
+
+        with pytest.raises(TimeoutError):
+            runner.run([])
+
+    def test_failed_request_raises_on_content(self):
+        """Test that a failed or missing request result raises instead of returning content"""
+        failed = {"custom_id": "req-0", "response": None, "error": {"message": "rate limited"}}
+
+        with pytest.raises(RuntimeError, match="rate limited"):
+            BatchRunner.content(failed)
+        with pytest.raises(RuntimeError):
+            BatchRunner.content(None)
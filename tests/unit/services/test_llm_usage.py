@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sqlite3
+import pytest
+from unittest.mock import patch
+
+from app.services.fake_llm import FakeChatModel
+from app.services.llm_usage import LLMUsageLedger, llm_usage, usage_labels
+
+
+def _entry(project_id="p1", endpoint="/mcq", node=None, latency_ms=100.0, error=None):
+    return {
+        "ts": 0.0,
+        "project_id": project_id,
+        "endpoint": endpoint,
+        "node": node,
+        "model": "gpt-4.1-mini",
+        "input_tokens": 1000,
+        "cached_input_tokens": 0,
+        "output_tokens": 100,
+        "cost_usd": 0.001,
+        "latency_ms": latency_ms,
+        "error": error,
+    }
+
+
+class TestLLMUsageLedger:
+    """
+    Unit tests for the LLMUsageLedger class
+    """
+
+    def test_records_calls_with_labels(self):
+        """Test that a model call is recorded with the labels of the enclosing blocks"""
+        ledger = LLMUsageLedger()
+        model = FakeChatModel(model_name="gpt-4.1-mini")
+
+        with usage_labels(project_id="p1", endpoint="/graph"):
+            with usage_labels(node="create_quotes"):
+                model.invoke("hello there", config={"callbacks": [ledger]})
+
+        [group] = ledger.summary(group_by=("project_id", "endpoint", "node", "model"))
+        assert group["project_id"] == "p1"
+        assert group["endpoint"] == "/graph"
+        assert group["node"] == "create_quotes"
+        assert group["model"] == "gpt-4.1-mini"
+        assert group["calls"] == 1
+        assert group["input_tokens"] > 0 and group["output_tokens"] > 0
+        assert group["cost_usd"] > 0
+
+    def test_async_calls_are_recorded_by_the_global_ledger(self):
+        """Test that the process-wide ledger sees calls without callbacks being passed"""
+        model = FakeChatModel(model_name="fake")
+
+        async def call():
+            with usage_labels(project_id="global-ledger-test", endpoint="/mcq/stream"):
+                await model.ainvoke("hi")
+
+        asyncio.run(call())
+
+        [group] = llm_usage.summary(project_id="global-ledger-test")
+        assert group["endpoint"] == "/mcq/stream"
+        assert group["calls"] == 1
+
+    def test_records_errors(self):
+        """Test that a failed call counts as an error"""
+        ledger = LLMUsageLedger()
+        model = FakeChatModel(model_name="fake")
+
+        with patch.object(FakeChatModel, "_reply", side_effect=RuntimeError("provider down")):
+            with pytest.raises(RuntimeError):
+                model.invoke("hi", config={"callbacks": [ledger]})
+
+        assert ledger.summary()[0]["errors"] == 1
+
+    def test_cost_uses_cached_and_versioned_prices(self):
+        """Test that cached input tokens are priced separately and dated model names use the base price"""
+        ledger = LLMUsageLedger(prices={"gpt-4.1-mini": (0.40, 0.10, 1.60)})
+
+        assert ledger.cost("gpt-4.1-mini", 1_000_000, 0, 0) == pytest.approx(0.40)
+        assert ledger.cost("gpt-4.1-mini-2025-04-14", 1_000_000, 500_000, 1_000_000) == pytest.approx(1.85)
+        assert ledger.cost("unknown", 1_000_000, 0, 0) == 0.0
+
+    def test_summary_filters_groups_and_percentiles(self):
+        """Test filtering by project, grouping by node and the latency percentiles"""
+        ledger = LLMUsageLedger()
+        for latency_ms in range(1, 101):
+            ledger.record(_entry(node="create_quotes", endpoint="/graph", latency_ms=float(latency_ms)))
+        ledger.record(_entry(project_id="p2", node="create_description", endpoint="/graph"))
+
+        [group] = ledger.summary(project_id="p1", group_by=("node",))
+
+        assert group["node"] == "create_quotes"
+        assert group["calls"] == 100
+        assert group["p50_ms"] == 51.0
+        assert group["p95_ms"] == 96.0
+        assert len(ledger.summary(endpoint="/graph", group_by=("node",))) == 2
+        with pytest.raises(ValueError):
+            ledger.summary(group_by=("user",))
+
+    def test_flush_to_jsonl(self, tmp_path):
+        """Test that pending records are appended to a JSONL store once"""
+        path = tmp_path / "usage.jsonl"
+        ledger = LLMUsageLedger(store_path=str(path), flush_interval_seconds=3600)
+        ledger.record(_entry())
+        ledger.record(_entry(project_id="p2"))
+
+        assert ledger.flush() == 2
+        assert ledger.flush() == 0
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["project_id"] for line in lines] == ["p1", "p2"]
+
+    def test_flush_to_sqlite(self, tmp_path):
+        """Test that records can be flushed to a SQLite store"""
+        path = tmp_path / "usage.sqlite"
+        ledger = LLMUsageLedger(store_path=str(path), flush_interval_seconds=3600)
+        ledger.record(_entry(node="create_quotes"))
+
+        ledger.flush()
+
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT project_id, node, input_tokens FROM llm_usage").fetchall()
+        assert rows == [("p1", "create_quotes", 1000)]
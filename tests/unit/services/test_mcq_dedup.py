@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch
+from app.models import MCQQuestion, MCQOption
+from app.services.mcq_dedup import MCQDedupIndex
+
+
+def _question(text, answer="A"):
+    """Build an MCQ question with the given text"""
+    return MCQQuestion(
+        question=text,
+        questionDescription="",
+        options=[MCQOption(text="A", isCorrect=True), MCQOption(text="B", isCorrect=False)],
+        optionsDescription="",
+        correctAnswer=answer,
+        correctAnswerDescription="",
+        explanation="",
+        explanationDescription="",
+    )
+
+
+class TestMCQDedupIndex:
+    """
+    Unit tests for the MCQDedupIndex class
+    """
+
+    @pytest.fixture(autouse=True)
+    def mcq_files_path(self, tmp_path):
+        """Store dedup indexes in a temporary directory"""
+        with patch('app.services.mcq_dedup.storage_config') as mock_storage_config:
+            mock_storage_config.mcq_files_path = str(tmp_path)
+            yield tmp_path
+
+    def test_signature_is_stable(self):
+        """Test that signatures are deterministic across index instances"""
+        text = "What is the capital of France?"
+        assert MCQDedupIndex("p1").signature(text) == MCQDedupIndex("p2").signature(text)
+
+    def test_filter_drops_near_duplicates_in_batch(self):
+        """Test that near-identical questions in one batch are dropped"""
+        index = MCQDedupIndex("p1")
+        questions = [
+            _question("What is the capital city of France?"),
+            _question("What is the capital city of France ?"),
+            _question("what is the Capital City of france"),
+            _question("Which planet is known as the red planet?"),
+        ]
+
+        unique, duplicates = index.filter(questions)
+
+        assert [q.question for q in unique] == [
+            "What is the capital city of France?",
+            "Which planet is known as the red planet?",
+        ]
+        assert len(duplicates) == 2
+
+    def test_filter_keeps_distinct_questions(self):
+        """Test that different questions sharing words are kept"""
+        index = MCQDedupIndex("p1")
+        questions = [
+            _question("Who created the Python programming language?"),
+            _question("When was the Python programming language first released?"),
+            _question("What does unit testing focus on?"),
+        ]
+
+        unique, duplicates = index.filter(questions)
+
+        assert len(unique) == 3
+        assert duplicates == []
+
+    def test_saved_index_applies_to_later_requests(self, mcq_files_path):
+        """Test that persisted questions are treated as duplicates for the same project only"""
+        first = MCQDedupIndex.load("p1")
+        first.filter([_question("What is the capital city of France?")])
+        first.save()
+
+        assert (mcq_files_path / "p1" / "dedup_index.json").exists()
+
+        unique, duplicates = MCQDedupIndex.load("p1").filter([_question("What is the capital city of France?")])
+        assert unique == []
+        assert len(duplicates) == 1
+
+        unique, duplicates = MCQDedupIndex.load("p2").filter([_question("What is the capital city of France?")])
+        assert len(unique) == 1
+
+    def test_unsaved_questions_are_not_persisted(self):
+        """Test that questions are only remembered after save"""
+        MCQDedupIndex.load("p1").filter([_question("What is the capital city of France?")])
+
+        unique, _ = MCQDedupIndex.load("p1").filter([_question("What is the capital city of France?")])
+        assert len(unique) == 1
+
+    def test_save_merges_concurrent_writes(self):
+        """Test that two indexes saved for the same project keep both sets of questions"""
+        first = MCQDedupIndex.load("p1")
+        second = MCQDedupIndex.load("p1")
+        first.filter([_question("What is the capital city of France?")])
+        second.filter([_question("Which planet is known as the red planet?")])
+        first.save()
+        second.save()
+
+        assert len(MCQDedupIndex.load("p1").entries) == 2
+
+    def test_invalid_num_perm(self):
+        """Test that num_perm must split evenly into LSH bands"""
+        with pytest.raises(ValueError):
+            MCQDedupIndex("p1", num_perm=10)
@@ -3,6 +3,7 @@ import os
 import json
 from unittest.mock import patch, MagicMock, mock_open
 from app.services.mcq_service import MCQService
+from app.services.llm_batch import BatchRunner, LocalBatchBackend
 
 
 class TestMCQService:
@@ -87,16 +88,14 @@ class TestMCQService:
         # Verify OCR was not called since download failed
         mock_ocr.extract_text.assert_not_called()
 
-    @patch('app.services.mcq_service.LLMService')
-    def test_generate_mcqs_json_response(self, mock_llm_service):
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_json_response(self, mock_get_model):
         """Test _generate_mcqs with a JSON response"""
         # Set up mock for LLM service
         mock_model = MagicMock()
         mock_model.predict.return_value = '{"questions": [{"question": "Test?", "options": ["A", "B"]}]}'
         
-        mock_llm_instance = MagicMock()
-        mock_llm_instance.model = mock_model
-        mock_llm_service.return_value = mock_llm_instance
+        mock_get_model.return_value = mock_model
         
         result = MCQService._generate_mcqs(
             system_prompt="Generate MCQs",
@@ -105,23 +104,21 @@ class TestMCQService:
         )
         
         # Verify the LLM service was called correctly
-        mock_llm_service.assert_called_once()
+        mock_get_model.assert_called_once()
         mock_model.predict.assert_called_once()
         
         # Verify the result was parsed as JSON
         assert "questions" in result
         assert isinstance(result["questions"], list)
 
-    @patch('app.services.mcq_service.LLMService')
-    def test_generate_mcqs_text_response(self, mock_llm_service):
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_text_response(self, mock_get_model):
         """Test _generate_mcqs with a non-JSON response"""
         # Set up mock for LLM service
         mock_model = MagicMock()
         mock_model.predict.return_value = "This is a text response, not JSON"
         
-        mock_llm_instance = MagicMock()
-        mock_llm_instance.model = mock_model
-        mock_llm_service.return_value = mock_llm_instance
+        mock_get_model.return_value = mock_model
         
         result = MCQService._generate_mcqs(
             system_prompt="Generate MCQs",
@@ -133,16 +130,14 @@ class TestMCQService:
         assert "raw_response" in result
         assert result["raw_response"] == "This is a text response, not JSON"
 
-    @patch('app.services.mcq_service.LLMService')
-    def test_generate_mcqs_truncation(self, mock_llm_service):
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_truncation(self, mock_get_model):
         """Test document truncation in _generate_mcqs for long documents"""
         # Set up mock for LLM service
         mock_model = MagicMock()
         mock_model.predict.return_value = '{"result": "success"}'
         
-        mock_llm_instance = MagicMock()
-        mock_llm_instance.model = mock_model
-        mock_llm_service.return_value = mock_llm_instance
+        mock_get_model.return_value = mock_model
         
         # Create a very long document that should be truncated
         long_doc = "x" * 30000
@@ -158,16 +153,14 @@ class TestMCQService:
         assert "...[truncated]" in call_args
         assert len(call_args) < 30000 + 500  # Add some buffer for prompt text
 
-    @patch('app.services.mcq_service.LLMService')
-    def test_generate_mcqs_llm_error(self, mock_llm_service):
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_llm_error(self, mock_get_model):
         """Test error handling in _generate_mcqs when LLM fails"""
         # Set up mock for LLM service to raise exception
         mock_model = MagicMock()
         mock_model.predict.side_effect = Exception("LLM error")
         
-        mock_llm_instance = MagicMock()
-        mock_llm_instance.model = mock_model
-        mock_llm_service.return_value = mock_llm_instance
+        mock_get_model.return_value = mock_model
         
         with pytest.raises(Exception):
             MCQService._generate_mcqs(
@@ -175,3 +168,175 @@ class TestMCQService:
                 document_text="Test document",
                 user_prompt="Generate questions"
             )
+
+
+def _question_dict(index):
+    """Build a valid MCQ question payload"""
+    return {
+        "question": f"Question {index}?",
+        "questionDescription": f"Description {index}",
+        "options": [{"text": "A", "isCorrect": True}, {"text": "B", "isCorrect": False}],
+        "optionsDescription": "Options",
+        "correctAnswer": "A",
+        "correctAnswerDescription": "A is correct",
+        "explanation": "Because",
+        "explanationDescription": "Explanation",
+    }
+
+
+class TestMCQRepair:
+    """
+    Unit tests for partial-result repair of MCQ structured output
+    """
+
+    def _mock_model(self, *responses):
+        """Create a model whose structured output runnables return the given responses in order"""
+        model = MagicMock()
+        runnables = []
+        for response in responses:
+            runnable = MagicMock()
+            runnable.invoke.return_value = response
+            runnables.append(runnable)
+        model.with_structured_output.side_effect = runnables
+        return model, runnables
+
+    @patch('app.services.mcq_service.MCQService._write_debug_files')
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_valid_response_skips_repair(self, mock_get_model, mock_debug):
+        """Test that a valid response is returned without a follow-up call"""
+        payload = {"count": 20, "raw": [_question_dict(i) for i in range(20)]}
+        model, runnables = self._mock_model({"raw": MagicMock(), "parsed": payload, "parsing_error": None})
+        mock_get_model.return_value = model
+
+        result = MCQService._generate_mcqs("Generate MCQs", "Document", "Questions", project_id="p1")
+
+        assert result.count == 20
+        assert len(result.raw) == 20
+        assert model.with_structured_output.call_count == 1
+
+    @patch('app.services.mcq_service.MCQService._write_debug_files')
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_repairs_only_invalid_questions(self, mock_get_model, mock_debug):
+        """Test that invalid questions are re-requested in a small follow-up call"""
+        questions = [_question_dict(i) for i in range(20)]
+        questions[3]["options"] = [{"text": "A", "isCorrect": True}]  # too few options
+        del questions[7]["explanation"]
+        payload = {"count": 20, "raw": questions}
+        repair_payload = {"raw": [_question_dict(100), _question_dict(101)]}
+        model, runnables = self._mock_model(
+            {"raw": MagicMock(), "parsed": payload, "parsing_error": None},
+            {"raw": MagicMock(), "parsed": repair_payload, "parsing_error": None},
+        )
+        mock_get_model.return_value = model
+
+        before = MCQService.get_repair_stats()
+        result = MCQService._generate_mcqs("Generate MCQs", "Document", "Questions", project_id="p1")
+        after = MCQService.get_repair_stats()
+
+        assert result.count == 20
+        assert [q.question for q in result.raw[-2:]] == ["Question 100?", "Question 101?"]
+        repair_prompt = MCQService._prompt_text(runnables[1].invoke.call_args[0][0])
+        assert "Generate exactly 2 additional" in repair_prompt
+        assert "- Question 0?" in repair_prompt
+        assert after["repaired"] == before["repaired"] + 1
+        assert after["questions_salvaged"] == before["questions_salvaged"] + 18
+        assert mock_debug.call_args[0][3]["questions_repaired"] == 2
+
+    def test_prompt_keeps_document_in_stable_prefix(self):
+        """Test that prompts for different queries on one document share their leading messages"""
+        first = MCQService.build_mcq_prompt("System", "Document", "Query one", "Generate 20")
+        second = MCQService.build_mcq_prompt("System", "Document", "Query two", "Generate 5")
+
+        assert [message.type for message in first] == ["system", "human", "human"]
+        assert first[:2] == second[:2]
+        assert "Document" in first[1].content
+        assert "Query one" in first[2].content and "Generate 20" in first[2].content
+
+    def test_extract_payload_salvages_truncated_json(self):
+        """Test that complete questions are recovered from a truncated raw response"""
+        content = '{"count": 20, "raw": [' + ", ".join(
+            json.dumps(_question_dict(i)) for i in range(2)
+        ) + ', {"question": "Trunc'
+        raw = MagicMock()
+        raw.content = content
+
+        payload = MCQService._extract_payload({"raw": raw, "parsed": None, "parsing_error": ValueError()})
+        valid, invalid = MCQService._tolerant_parse(payload)
+
+        assert len(valid) == 2
+        assert invalid == 1
+
+    @patch('app.services.mcq_service.MCQService._write_debug_files')
+    @patch('app.services.mcq_service.llm_registry.get_model')
+    def test_generate_mcqs_repair_failure_raises(self, mock_get_model, mock_debug):
+        """Test that a repair that still cannot satisfy the schema raises"""
+        payload = {"count": 20, "raw": [_question_dict(i) for i in range(5)]}
+        model, runnables = self._mock_model(
+            {"raw": MagicMock(), "parsed": payload, "parsing_error": None},
+            {"raw": MagicMock(), "parsed": {"raw": []}, "parsing_error": None},
+        )
+        mock_get_model.return_value = model
+
+        before = MCQService.get_repair_stats()
+        with pytest.raises(Exception):
+            MCQService._generate_mcqs("Generate MCQs", "Document", "Questions", project_id="p1")
+
+        assert MCQService.get_repair_stats()["repair_failures"] == before["repair_failures"] + 1
+
+
+class TestMCQBatch:
+    """
+    Unit tests for batch MCQ generation
+    """
+
+    @patch('app.services.mcq_service.MCQService.create_mcq_video')
+    @patch('app.services.mcq_service.MCQService._extract_asset_texts')
+    def test_process_mcq_batch_creates_video_per_job(self, mock_extract, mock_create_video, tmp_path):
+        """Test that all jobs are generated in one batch and each result feeds video creation"""
+        mock_extract.return_value = ("Document text", ["/tmp/file.pdf"])
+        mock_create_video.side_effect = lambda project_id, raw: ({"video_id": "v1"}, raw, [])
+        runner = BatchRunner(LocalBatchBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake")
+        jobs = [
+            {"project_id": f"p{index}", "system_prompt": "Generate MCQs", "asset_files": [], "user_prompt": "Questions"}
+            for index in range(2)
+        ]
+
+        results = MCQService.process_mcq_batch(jobs, runner)
+
+        assert [result["status"] for result in results] == ["success", "success"]
+        assert results[0]["mcqs"].count == 20
+        assert [call.args[0] for call in mock_create_video.call_args_list] == ["p0", "p1"]
+        assert len(list(tmp_path.glob("mcq-*.input.jsonl"))) == 1
+
+    @patch('app.services.mcq_service.MCQService.create_mcq_video')
+    @patch('app.services.mcq_service.MCQService._extract_asset_texts')
+    def test_process_mcq_batch_reports_failed_job(self, mock_extract, mock_create_video, tmp_path):
+        """Test that a failing job doesn't fail the rest of the batch"""
+        mock_extract.return_value = ("Document text", [])
+        mock_create_video.side_effect = [RuntimeError("video API down"), ({"video_id": "v2"}, [], [])]
+        runner = BatchRunner(LocalBatchBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake")
+        jobs = [
+            {"project_id": f"p{index}", "system_prompt": "Generate MCQs", "asset_files": [], "user_prompt": "Questions"}
+            for index in range(2)
+        ]
+
+        results = MCQService.process_mcq_batch(jobs, runner)
+
+        assert results[0] == {"project_id": "p0", "status": "failed", "error": "video API down"}
+        assert results[1]["status"] == "success"
+
+    @patch('app.services.mcq_service.MCQService.create_mcq_video')
+    @patch('app.services.mcq_service.MCQService._extract_asset_texts')
+    def test_process_mcq_batch_returns_deduplicated_mcqs(self, mock_extract, mock_create_video, tmp_path):
+        """Test that the returned MCQs are the ones in the video, with duplicates reported separately"""
+        mock_extract.return_value = ("Document text", [])
+        mock_create_video.side_effect = lambda project_id, raw: ({"video_id": "v1"}, raw[:-2], raw[-2:])
+        runner = BatchRunner(LocalBatchBackend(provider_name="fake", api_key=""), str(tmp_path), model_name="fake")
+        jobs = [{"project_id": "p0", "system_prompt": "Generate MCQs", "asset_files": [], "user_prompt": "Questions"}]
+
+        results = MCQService.process_mcq_batch(jobs, runner)
+
+        generated = mock_create_video.call_args.args[1]
+        assert results[0]["mcqs"].raw == generated[:-2]
+        assert results[0]["mcqs"].count == len(generated) - 2
+        assert results[0]["duplicates_removed"] == 2
@@ -0,0 +1,155 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.models import MCQQuestion
+from app.services.fake_llm import FakeChatModel
+from app.services.llm import LLMClientRegistry, LLMConcurrencyLimiter, LLMRoute, LLMRouter, register_provider
+from app.services.mcq_stream import MCQStreamParser, astream_mcqs
+
+
+def _question(index: int) -> dict:
+    return {
+        "question": f"Question {index} with {{braces}} and \"quotes\"?",
+        "questionDescription": "desc \\ with [brackets]",
+        "options": [{"text": "a", "isCorrect": True}, {"text": "b", "isCorrect": False}],
+        "optionsDescription": "options",
+        "correctAnswer": "a",
+        "correctAnswerDescription": "answer",
+        "explanation": "because",
+        "explanationDescription": "explanation",
+    }
+
+
+def _streaming_provider(service):
+    return FakeChatModel(model_name=service.model_name, stream_chunk_chars=50, stream_chunk_delay_seconds=0.001)
+
+
+def _reply(model, content):
+    message = AIMessage(content=content, response_metadata={"model_name": model.model_name})
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _collect(**kwargs):
+    async def collect():
+        return [event async for event in astream_mcqs("system", "document", "user", **kwargs)]
+
+    return asyncio.run(collect())
+
+
+class TestMCQStreamParser:
+    """
+    Unit tests for the MCQStreamParser class
+    """
+
+    def test_questions_complete_across_chunks(self):
+        """Test that questions are returned as soon as they close, however the text is split"""
+        document = json.dumps({"count": 3, "raw": [_question(0), _question(1), _question(2)]})
+        parser = MCQStreamParser()
+
+        completed = []
+        for start in range(0, len(document), 7):
+            completed.extend(parser.feed(document[start:start + 7]))
+
+        assert completed == [_question(0), _question(1), _question(2)]
+
+    def test_question_is_emitted_before_the_document_ends(self):
+        """Test that the first question is available before the rest of the list has arrived"""
+        document = json.dumps({"raw": [_question(0), _question(1)], "count": 2})
+        first_end = document.index(json.dumps(_question(1))) - 1
+        parser = MCQStreamParser()
+
+        assert parser.feed(document[:first_end]) == [_question(0)]
+        assert parser.feed(document[first_end:]) == [_question(1)]
+
+    def test_ignores_objects_outside_the_question_array(self):
+        """Test that objects under other keys are not mistaken for questions"""
+        parser = MCQStreamParser()
+
+        completed = parser.feed(json.dumps({"meta": [{"question": "no"}], "raw": [{"question": "yes"}]}))
+
+        assert completed == [{"question": "yes"}]
+
+
+class TestAstreamMCQs:
+    """
+    Unit tests for streamed MCQ generation
+    """
+
+    def test_streams_validated_questions_then_done(self):
+        """Test that each question is yielded as it arrives, ahead of the final list"""
+        register_provider("streaming", _streaming_provider)
+        router = LLMRouter([LLMRoute("streaming", "model")], registry=LLMClientRegistry())
+
+        with patch("app.services.mcq_stream.llm_router", router):
+            events = _collect(mcq_count=20, project_id="p1")
+
+        questions = [event for event in events if event["event"] == "question"]
+        done = events[-1]
+        assert len(questions) == 20
+        assert [event["index"] for event in questions] == list(range(20))
+        assert done["event"] == "done"
+        assert done["count"] == 20
+        assert done["mcqs"].raw[0].question == questions[0]["question"]["question"]
+        assert done["invalid"] == 0 and done["repaired"] == 0
+        assert done["first_question_ms"] < done["elapsed_ms"]
+        assert router.stats()["routes"]["streaming:model"]["calls"] == 1
+
+    def test_slow_reader_does_not_hold_the_llm_slot(self):
+        """Test that the concurrency slot is freed once generation ends, even while the client hasn't read the events"""
+        register_provider("streaming", _streaming_provider)
+        router = LLMRouter([LLMRoute("streaming", "model")], registry=LLMClientRegistry())
+        limiter = LLMConcurrencyLimiter(1)
+
+        async def read_slowly():
+            stream = astream_mcqs("system", "document", "user", mcq_count=20)
+            first = await stream.__anext__()
+            # The client stalls after the first question while generation finishes
+            for _ in range(200):
+                if not limiter.slot().locked():
+                    break
+                await asyncio.sleep(0.01)
+            slot_free = not limiter.slot().locked()
+            await stream.aclose()
+            return first, slot_free
+
+        with patch("app.services.mcq_stream.llm_router", router), \
+                patch("app.services.mcq_stream.llm_concurrency", limiter):
+            first, slot_free = asyncio.run(read_slowly())
+
+        assert first["event"] == "question"
+        assert slot_free
+
+    def test_invalid_questions_are_replaced(self):
+        """Test that questions failing validation are reported and replaced after the stream"""
+        register_provider("streaming", _streaming_provider)
+        router = LLMRouter([LLMRoute("streaming", "model")], registry=LLMClientRegistry())
+        valid = [_question(index) for index in range(19)]
+        invalid = dict(_question(19), options=[])
+        document = json.dumps({"count": 20, "raw": valid + [invalid]})
+
+        with patch("app.services.mcq_stream.llm_router", router), \
+                patch.object(FakeChatModel, "_reply", lambda self, messages, **kwargs: _reply(self, document)), \
+                patch("app.services.mcq_stream.MCQService.request_replacements") as request_replacements:
+            request_replacements.return_value = [MCQQuestion.model_validate(_question(20))]
+            events = _collect(mcq_count=20)
+
+        assert [event["index"] for event in events if event["event"] == "invalid"] == [19]
+        assert events[-2]["repaired"] is True
+        assert events[-1]["count"] == 20
+        assert events[-1]["repaired"] == 1
+        assert request_replacements.call_args[0][5] == 1
+
+    def test_provider_error_ends_with_error_event(self):
+        """Test that a failing stream ends with an error event"""
+        register_provider("streaming", _streaming_provider)
+        router = LLMRouter([LLMRoute("streaming", "model")], registry=LLMClientRegistry())
+
+        with patch("app.services.mcq_stream.llm_router", router), \
+                patch.object(FakeChatModel, "_reply", side_effect=RuntimeError("provider down")):
+            events = _collect()
+
+        assert events == [{"event": "error", "error": "provider down", "elapsed_ms": events[0]["elapsed_ms"]}]
@@ -1,5 +1,7 @@
+import json
 import pytest
-from app.services.prompts import Prompts
+from app.graphs.quotes_video_graph import State
+from app.services.prompts import PROMPT_TEMPLATES, PromptRegistry, Prompts, prompt_registry
 from langchain_core.prompts import ChatPromptTemplate
 
 
@@ -59,6 +61,23 @@ class TestPrompts:
         assert "{titles}" in user_msg.prompt.template
         assert "{thumbnail_text_list}" in user_msg.prompt.template
 
+    def test_create_and_select_title_thumbnail_prompt(self):
+        """Test creating the fused title generation and selection prompt"""
+        prompt = Prompts.create_and_select_title_thumbnail_prompt()
+        
+        # Verify it's the right type
+        assert isinstance(prompt, ChatPromptTemplate)
+        
+        # Verify the prompt structure
+        messages = prompt.messages
+        assert len(messages) == 2
+        
+        # Check user message
+        user_msg = messages[1]
+        assert "create list of titles and a list of thumbnail texts" in user_msg.prompt.template
+        assert "select best title and thumbnail text" in user_msg.prompt.template
+        assert "{topic}" in user_msg.prompt.template
+
     def test_create_quotes_prompt(self):
         """Test creating quotes generation prompt"""
         prompt = Prompts.create_quotes_prompt()
@@ -115,10 +134,77 @@ class TestPrompts:
         # Check system message
         system_msg = messages[0]
         assert "expert youtube content creator" in system_msg.prompt.template
-        assert "{topic}" in system_msg.prompt.template
         
         # Check user message
         user_msg = messages[1]
         assert "create a description for the youtube video" in user_msg.prompt.template
+        assert "{topic}" in user_msg.prompt.template
         assert "{best_title}" in user_msg.prompt.template 
         assert "{best_thumbnail_text}" in user_msg.prompt.template
+
+    def test_system_messages_are_static(self):
+        """Test that no system message contains variables, so it stays a cacheable prefix"""
+        for factory in (
+            Prompts.create_titles_thumbnails_prompt,
+            Prompts.find_best_title_thumbnail_prompt,
+            Prompts.create_and_select_title_thumbnail_prompt,
+            Prompts.create_quotes_prompt,
+            Prompts.create_thumbnail_visual_desc_prompt,
+            Prompts.create_description_prompt,
+        ):
+            system_msg = factory().messages[0]
+            assert system_msg.prompt.input_variables == [], factory.__name__
+
+
+class TestPromptRegistry:
+    """
+    Unit tests for the PromptRegistry class
+    """
+
+    def test_prompts_are_compiled_once(self):
+        """Test that repeated lookups return the same compiled template"""
+        assert Prompts.create_quotes_prompt() is Prompts.create_quotes_prompt()
+        assert Prompts.create_quotes_prompt() is prompt_registry.get("create_quotes", "v1")
+
+    def test_version_selection(self):
+        """Test that the selected version is used unless a version is given"""
+        registry = PromptRegistry(
+            {"greet": {"v1": [("user", "hi {name}")], "v2": [("user", "hello {name}")]}},
+            PromptRegistry.parse_versions("greet=v2"),
+        )
+
+        assert registry.get("greet").invoke({"name": "a"}).to_messages()[0].content == "hello a"
+        assert registry.get("greet", "v1").invoke({"name": "a"}).to_messages()[0].content == "hi a"
+        assert registry.versions("greet") == ["v1", "v2"]
+
+    def test_unknown_prompt_version(self):
+        """Test that an unknown name or version is rejected"""
+        registry = PromptRegistry({"greet": {"v1": [("user", "hi")]}}, {"greet": "v9"})
+
+        with pytest.raises(ValueError):
+            registry.get("greet")
+        with pytest.raises(ValueError):
+            PromptRegistry.parse_versions("greet")
+
+    def test_validate_reports_unknown_variables(self):
+        """Test that a template using a variable outside the state is reported"""
+        registry = PromptRegistry({"greet": {"v1": [("system", "static"), ("user", "hi {name} {mood}")]}})
+
+        registry.validate(["name", "mood", "extra"])
+        with pytest.raises(ValueError, match="greet \\(v1\\): mood"):
+            registry.validate(["name"])
+
+    def test_builtin_prompts_match_graph_state(self):
+        """Test that every built-in prompt only uses quotes video graph state keys"""
+        prompt_registry.validate(State.__annotations__)
+
+    def test_load_versions_from_file(self, tmp_path):
+        """Test that template versions can be added from a JSON file"""
+        path = tmp_path / "prompts.json"
+        path.write_text(json.dumps({"create_quotes": {"v2": [["system", "static"], ["user", "quotes for {topic}"]]}}))
+        registry = PromptRegistry(PROMPT_TEMPLATES, {"create_quotes": "v2"})
+
+        registry.load(str(path))
+
+        assert registry.get("create_quotes").input_variables == ["topic"]
+        assert registry.versions("create_quotes") == ["v1", "v2"]
@@ -0,0 +1,20 @@
+from app.services.stats import percentile
+
+
+class TestPercentile:
+    """
+    Unit tests for the shared percentile helper
+    """
+
+    def test_nearest_rank(self):
+        """Test that the sample at the requested rank is returned, whatever the input order"""
+        samples = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+
+        assert percentile(samples, 0.5) == 6
+        assert percentile(samples, 0.95) == 10
+        assert percentile(iter(samples), 0.0) == 1
+
+    def test_empty_samples_return_the_default(self):
+        """Test that no samples give the default, 0.0 unless another is passed"""
+        assert percentile([], 0.95) == 0.0
+        assert percentile([], 0.95, default=None) is None
@@ -0,0 +1,111 @@
+import os
+import json
+import asyncio
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.thumbnail_service import ThumbnailService
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake-image"
+
+
+class ImageServerHandler(BaseHTTPRequestHandler):
+    """Stand-in for the image generation API and the image download host"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.prompts.append(body["prompt"])
+        host, port = self.server.server_address
+        payload = json.dumps({"created": 0, "data": [{"url": f"http://{host}:{port}/images/generated.png"}]})
+        self._respond(200, "application/json", payload.encode("utf-8"))
+
+    def do_GET(self):
+        self.server.downloads += 1
+        if self.server.fail_downloads:
+            self._respond(500, "text/plain", b"error")
+        else:
+            self._respond(200, "image/png", PNG_BYTES)
+
+    def _respond(self, status_code, content_type, body):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def image_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageServerHandler)
+    server.prompts = []
+    server.downloads = 0
+    server.fail_downloads = False
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(image_server, tmp_path):
+    host, port = image_server.server_address
+    return ThumbnailService(
+        image_dir=str(tmp_path / "thumbnails"),
+        api_key="test-key",
+        base_url=f"http://{host}:{port}/v1",
+        timeout_seconds=5,
+    )
+
+
+class TestThumbnailService:
+    """
+    Unit tests for the ThumbnailService class
+    """
+
+    def test_get_or_create_stores_image_by_content_hash(self, service, image_server):
+        """Test that the generated image is downloaded and stored under the prompt hash"""
+        path = asyncio.run(service.get_or_create("A sunrise over mountains"))
+
+        assert os.path.basename(path) == f"{service.content_hash('A sunrise over mountains')}.png"
+        with open(path, "rb") as f:
+            assert f.read() == PNG_BYTES
+        assert image_server.prompts == ["A sunrise over mountains"]
+
+    def test_repeated_prompt_reuses_stored_image(self, service, image_server):
+        """Test that a prompt with a stored image doesn't call the image API again"""
+        first = asyncio.run(service.get_or_create("A sunrise over mountains"))
+        second = asyncio.run(service.get_or_create("A sunrise over mountains "))
+
+        assert first == second
+        assert len(image_server.prompts) == 1
+
+    def test_concurrent_identical_prompts_generate_once(self, service, image_server):
+        """Test that concurrent runs with the same prompt share one generation"""
+        async def run_all():
+            return await asyncio.gather(*(service.get_or_create("A calm lake") for _ in range(5)))
+
+        paths = asyncio.run(run_all())
+
+        assert len(set(paths)) == 1
+        assert image_server.prompts == ["A calm lake"]
+
+    def test_different_settings_use_different_hashes(self, service):
+        """Test that the image model and size are part of the content hash"""
+        other = ThumbnailService(image_dir=service.image_dir, api_key="test-key", size="1024x1024")
+
+        assert service.content_hash("A calm lake") != other.content_hash("A calm lake")
+        assert service.content_hash("A calm lake") != service.content_hash("A stormy sea")
+
+    def test_failed_download_leaves_no_file(self, service, image_server):
+        """Test that a failed download raises and doesn't store a partial image"""
+        image_server.fail_downloads = True
+
+        with pytest.raises(Exception):
+            asyncio.run(service.get_or_create("A calm lake"))
+
+        assert not os.path.exists(service.image_path("A calm lake"))
@@ -0,0 +1,93 @@
+import json
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from app.services.title_cache import TitleCache
+
+
+class TestTitleCache:
+    """
+    Unit tests for the TitleCache class
+    """
+
+    def test_missing_pool(self):
+        """Test that an unknown topic has no pool"""
+        assert TitleCache().get_pool("Life Quotes") is None
+
+    def test_store_and_reuse_pool(self):
+        """Test that a stored pool is reused while fresh"""
+        cache = TitleCache()
+        cache.store_pool("Life Quotes", ["t1", "t2", "t3"], ["x1", "x2"])
+
+        assert cache.get_pool("Life Quotes") == {"titles": ["t1", "t2", "t3"], "thumbnail_text_list": ["x1", "x2"]}
+
+    def test_used_titles_are_excluded(self):
+        """Test that titles marked as used are not offered again"""
+        cache = TitleCache(min_unused=2)
+        cache.store_pool("Life Quotes", ["t1", "t2", "t3"], ["x1", "x2"])
+
+        cache.mark_used("Life Quotes", "t1", "x1")
+
+        assert cache.get_pool("Life Quotes") == {"titles": ["t2", "t3"], "thumbnail_text_list": ["x2"]}
+
+    def test_pool_with_too_few_unused_titles_is_not_reused(self):
+        """Test that a mostly used pool triggers regeneration"""
+        cache = TitleCache(min_unused=3)
+        cache.store_pool("Life Quotes", ["t1", "t2", "t3"], ["x1"])
+
+        cache.mark_used("Life Quotes", "t1", "x1")
+
+        assert cache.get_pool("Life Quotes") is None
+
+    def test_expired_pool_is_not_reused(self):
+        """Test that a pool older than the TTL is not reused"""
+        cache = TitleCache(ttl_seconds=60)
+        with patch('app.services.title_cache.time.time', return_value=1000.0):
+            cache.store_pool("Life Quotes", ["t1", "t2", "t3"], ["x1"])
+        with patch('app.services.title_cache.time.time', return_value=1061.0):
+            assert cache.get_pool("Life Quotes") is None
+
+    def test_new_pool_keeps_used_history(self):
+        """Test that a regenerated pool filters titles used before"""
+        cache = TitleCache()
+        cache.mark_used("Life Quotes", "t1", "x1")
+
+        pool = cache.store_pool("Life Quotes", ["t1", "t2"], ["x1", "x2"])
+
+        assert pool == {"titles": ["t2"], "thumbnail_text_list": ["x2"]}
+
+    def test_persistence(self, tmp_path):
+        """Test that pools and history survive a restart"""
+        path = str(tmp_path / "title_cache.json")
+        cache = TitleCache(path=path)
+        cache.store_pool("Life Quotes", ["t1", "t2", "t3", "t4"], ["x1", "x2"])
+        cache.mark_used("Life Quotes", "t1", "x1")
+
+        reloaded = TitleCache(path=path)
+
+        assert reloaded.get_pool("Life Quotes")["titles"] == ["t2", "t3", "t4"]
+        with open(path) as f:
+            assert json.load(f)["Life Quotes"]["used_titles"] == ["t1"]
+
+    def test_async_writes_run_off_the_event_loop(self, tmp_path):
+        """Test that the async methods persist the cache from a worker thread"""
+        path = str(tmp_path / "title_cache.json")
+        cache = TitleCache(path=path)
+        write = cache._write
+        threads = []
+
+        def record_thread(snapshot):
+            threads.append(threading.current_thread())
+            write(snapshot)
+
+        async def run():
+            await cache.astore_pool("Life Quotes", ["t1", "t2", "t3", "t4"], ["x1", "x2"])
+            await cache.amark_used("Life Quotes", "t1", "x1")
+
+        with patch.object(cache, "_write", side_effect=record_thread):
+            asyncio.run(run())
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+        assert TitleCache(path=path).get_pool("Life Quotes")["titles"] == ["t2", "t3", "t4"]
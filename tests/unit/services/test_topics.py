@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch
-from app.services.topics import TOPICS, get_random_topic
+from app.services.topics import TOPICS, get_random_topic, get_random_topics
 
 
 class TestTopics:
@@ -43,3 +43,12 @@ class TestTopics:
         
         # Verify the result is in the TOPICS list
         assert result in TOPICS
+
+    def test_get_random_topics(self):
+        """Test that get_random_topics returns distinct topics, capped at the list size"""
+        result = get_random_topics(5)
+        
+        assert len(result) == 5
+        assert len(set(result)) == 5
+        assert all(topic in TOPICS for topic in result)
+        assert len(get_random_topics(len(TOPICS) + 10)) == len(TOPICS)
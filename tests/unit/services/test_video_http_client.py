@@ -1,6 +1,21 @@
+import asyncio
+import time
+from dataclasses import replace
+
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
-from app.services.video_http_client import VideoHttpClient
+from app.config import api_config
+from app.services.video_http_client import (
+    VideoHttpClient,
+    CircuitBreaker,
+    Bulkhead,
+    CircuitOpenError,
+    BulkheadFullError,
+    CIRCUIT_CLOSED,
+    CIRCUIT_OPEN,
+    CIRCUIT_HALF_OPEN,
+)
 
 
 class TestVideoHttpClient:
@@ -97,3 +112,229 @@ class TestVideoHttpClient:
             )
             
         assert "API Error" in str(excinfo.value)
+
+
+def _breaker(**kwargs):
+    return CircuitBreaker(**{"max_error_rate": 0.5, "slow_call_seconds": 10, "min_calls": 4,
+                             "window_seconds": 60, "open_seconds": 30, **kwargs})
+
+
+def _video_args():
+    return dict(title="Test Video", desc="desc", thumbnail_text="text", thumbnail_visual_desc="visual",
+                raw=["Quote 1"], video_type="message", project_id="project456")
+
+
+class TestCircuitBreaker:
+    """
+    Unit tests for the CircuitBreaker class
+    """
+
+    def test_opens_on_error_rate(self):
+        """Test that the circuit opens once enough recent calls failed"""
+        breaker = _breaker()
+        for succeeded in (True, False, False):
+            breaker.record(0.1, succeeded)
+        assert breaker.state == CIRCUIT_CLOSED
+
+        breaker.record(0.1, False)
+
+        assert breaker.state == CIRCUIT_OPEN
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+        assert 0 < breaker.retry_after() <= 30
+
+    def test_opens_on_p95_latency(self):
+        """Test that successful but slow calls open the circuit"""
+        breaker = _breaker()
+        for _ in range(4):
+            breaker.record(12, True)
+
+        assert breaker.state == CIRCUIT_OPEN
+
+    def test_half_open_lets_one_probe_through(self):
+        """Test that after the open period one probe call decides whether the circuit closes"""
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record(0.1, False)
+
+        assert breaker.state == CIRCUIT_HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.record(0.1, True)
+
+        assert breaker.state == CIRCUIT_CLOSED
+        assert breaker.stats()["calls"] == 0
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe opens the circuit again"""
+        breaker = _breaker()
+        for _ in range(4):
+            breaker.record(0.1, False)
+        breaker.open_seconds = 0
+        assert breaker.allow()
+        breaker.open_seconds = 30
+
+        breaker.record(0.1, False)
+
+        assert breaker.state == CIRCUIT_OPEN
+        assert breaker.stats()["trips"] == 2
+
+
+class TestBulkhead:
+    """
+    Unit tests for the Bulkhead class
+    """
+
+    def test_rejects_when_full(self):
+        """Test that a call is rejected once every slot is taken for the whole wait time"""
+        bulkhead = Bulkhead(1, max_wait_seconds=0)
+
+        with bulkhead.slot():
+            assert bulkhead.stats()["in_flight"] == 1
+            with pytest.raises(BulkheadFullError):
+                with bulkhead.slot():
+                    pass
+
+        assert bulkhead.stats() == {"max_concurrent": 1, "in_flight": 0, "rejected": 1}
+
+    def test_sync_slot_does_not_block_the_event_loop(self):
+        """Test that the sync slot fails at once instead of blocking when called on an event loop"""
+        bulkhead = Bulkhead(1, max_wait_seconds=5)
+
+        async def run():
+            with bulkhead.slot():
+                started = time.monotonic()
+                with pytest.raises(BulkheadFullError):
+                    with bulkhead.slot():
+                        pass
+                return time.monotonic() - started
+
+        assert asyncio.run(run()) < 1
+
+    def test_async_slot_waits_for_a_free_slot(self):
+        """Test that async callers share the limit and wait without blocking the loop"""
+        bulkhead = Bulkhead(2, max_wait_seconds=5)
+        peak = []
+
+        async def call():
+            async with bulkhead.aslot():
+                peak.append(bulkhead.stats()["in_flight"])
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(call() for _ in range(5)))
+
+        asyncio.run(run())
+
+        assert len(peak) == 5
+        assert max(peak) == 2
+
+
+class TestVideoHttpClientResilience:
+    """
+    Unit tests for the circuit breaker and bulkhead around video creation
+    """
+
+    def setup_method(self):
+        self.breaker = _breaker()
+        self.client = MagicMock()
+        self.client.post.return_value = {"id": "video123"}
+
+    def _patches(self, tmp_path, mode="fail"):
+        config = replace(api_config, breaker_mode=mode, deferred_path=str(tmp_path / "deferred.jsonl"))
+        return (
+            patch("app.services.video_http_client.video_breaker", self.breaker),
+            patch("app.services.video_http_client.video_bulkhead", Bulkhead(2, max_wait_seconds=0)),
+            patch("app.services.video_http_client.api_config", config),
+            patch.object(VideoHttpClient, "_client", return_value=self.client),
+        )
+
+    def test_outcomes_feed_the_breaker(self, tmp_path):
+        """Test that server errors count against the circuit and client errors don't"""
+        server_error = requests.HTTPError(response=MagicMock(status_code=503))
+        client_error = requests.HTTPError(response=MagicMock(status_code=400))
+        self.client.post.side_effect = [{"id": "video123"}, server_error, client_error]
+        p1, p2, p3, p4 = self._patches(tmp_path)
+
+        with p1, p2, p3, p4:
+            assert VideoHttpClient.create_video(**_video_args())["video_id"] == "video123"
+            for _ in range(2):
+                with pytest.raises(requests.HTTPError):
+                    VideoHttpClient.create_video(**_video_args())
+
+        stats = self.breaker.stats()
+        assert (stats["calls"], stats["errors"]) == (3, 1)
+
+    def test_only_transport_errors_count_without_a_response(self, tmp_path):
+        """Test that connection errors count against the circuit but local errors record no outcome"""
+        self.client.post.side_effect = [
+            requests.ConnectionError("connection refused"),
+            TypeError("Object of type set is not JSON serializable"),
+            ValueError("unsupported content encoding"),
+        ]
+        p1, p2, p3, p4 = self._patches(tmp_path)
+
+        with p1, p2, p3, p4:
+            for error in (requests.ConnectionError, TypeError, ValueError):
+                with pytest.raises(error):
+                    VideoHttpClient.create_video(**_video_args())
+
+        stats = self.breaker.stats()
+        assert (stats["calls"], stats["errors"]) == (1, 1)
+
+    def test_fails_fast_while_open(self, tmp_path):
+        """Test that no request is sent while the circuit is open"""
+        for _ in range(4):
+            self.breaker.record(0.1, False)
+        p1, p2, p3, p4 = self._patches(tmp_path)
+
+        with p1, p2, p3, p4:
+            with pytest.raises(CircuitOpenError):
+                VideoHttpClient.create_video(**_video_args())
+
+        self.client.post.assert_not_called()
+
+    def test_defers_while_open_and_submits_later(self, tmp_path):
+        """Test that deferred submissions are queued and sent once the circuit lets calls through"""
+        for _ in range(4):
+            self.breaker.record(0.1, False)
+        p1, p2, p3, p4 = self._patches(tmp_path, mode="defer")
+
+        with p1, p2, p3, p4:
+            result = asyncio.run(VideoHttpClient.acreate_video(**_video_args()))
+            assert result == {"video_id": None, "video_url": None, "deferred": True}
+            assert VideoHttpClient.health()["deferred"] == 1
+
+            self.breaker.open_seconds = 0
+            assert VideoHttpClient.submit_deferred() == 1
+            assert VideoHttpClient.deferred_count() == 0
+
+        assert self.client.post.call_args[0][1]["name"] == "Test Video"
+        assert self.breaker.state == CIRCUIT_CLOSED
+
+    def test_cancelled_probe_frees_the_half_open_circuit(self, tmp_path):
+        """Test that a probe cancelled mid-call lets the next call probe instead of blocking the circuit"""
+        for _ in range(4):
+            self.breaker.record(0.1, False)
+        self.breaker.open_seconds = 0
+
+        async def hang(endpoint, payload):
+            await asyncio.sleep(10)
+
+        self.client.apost.side_effect = hang
+        p1, p2, p3, p4 = self._patches(tmp_path)
+
+        async def cancel_probe():
+            task = asyncio.create_task(VideoHttpClient.acreate_video(**_video_args()))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        with p1, p2, p3, p4:
+            asyncio.run(cancel_probe())
+            assert self.breaker.state == CIRCUIT_HALF_OPEN
+            assert VideoHttpClient.create_video(**_video_args())["video_id"] == "video123"
+
+        assert self.breaker.state == CIRCUIT_CLOSED
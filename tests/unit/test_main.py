@@ -0,0 +1,176 @@
+import os
+import sys
+import asyncio
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config import api_config
+from app.graphs import quotes_video_graph
+from app.services.llm_usage import _usage_labels_var
+from app.services.title_cache import TitleCache
+from tests.unit.graphs.conftest import FakeLLM
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Fails if anything constructs a chat model or loads the agent modules while importing app.main
+IMPORT_CHECK = """
+import sys
+import langchain_openai
+
+def fail(*args, **kwargs):
+    raise AssertionError("ChatOpenAI constructed at import time")
+
+langchain_openai.ChatOpenAI.__init__ = fail
+import app.main
+assert "app.agents.quotes_video_agent" not in sys.modules, "agent module imported"
+assert "langchain.agents" not in sys.modules, "langchain agents imported"
+"""
+
+
+class TestMainImport:
+    """
+    Regression tests for the startup cost of importing app.main
+    """
+
+    def test_import_does_not_construct_llm_clients(self):
+        """Test that importing app.main creates no LLM clients and loads no agents"""
+        env = dict(os.environ, LLM_API_KEY="", PYTHONPATH=REPO_ROOT)
+        env.pop("OPENAI_API_KEY", None)
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_CHECK],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+
+        assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture
+def client():
+    """API client with the graph LLM and video tool replaced"""
+    async def create_video(input):
+        return {"video_id": f"video-{input['project_id']}", "video_url": "https://example.com/video"}
+
+    video_tool = MagicMock()
+    video_tool.ainvoke.side_effect = create_video
+    with patch.object(quotes_video_graph, "get_llm_model", lambda: FakeLLM()), \
+            patch.object(quotes_video_graph, "create_video_tool", video_tool), \
+            patch.object(quotes_video_graph, "title_cache", TitleCache()):
+        yield TestClient(main.app, headers={"Authorization": f"Bearer {api_config.server_api_key}"}), video_tool
+
+
+class TestGraphEndpoints:
+    """
+    Unit tests for the /graph endpoints
+    """
+
+    def test_graph_runs_to_completion(self, client):
+        """Test that /graph runs the graph and returns the final state"""
+        api, video_tool = client
+
+        response = api.post("/graph", json={"topic": "topic-1", "project_id": "p1"})
+
+        assert response.status_code == 200, response.text
+        assert video_tool.ainvoke.call_count == 1
+        assert "video-p1" in response.text
+
+    def test_resume_completes_failed_run(self, client):
+        """Test that /graph/resume continues a failed run from its checkpoint"""
+        api, video_tool = client
+        create_video = video_tool.ainvoke.side_effect
+
+        async def fail_once(input):
+            if video_tool.ainvoke.call_count == 1:
+                raise RuntimeError("video API down")
+            return await create_video(input=input)
+
+        video_tool.ainvoke.side_effect = fail_once
+
+        failed = api.post("/graph", json={"topic": "topic-1", "project_id": "p1"})
+        assert failed.status_code == 500
+        thread_id = failed.json()["detail"]["thread_id"]
+
+        resumed = api.post("/graph/resume", json={"thread_id": thread_id})
+
+        assert resumed.status_code == 200, resumed.text
+        assert video_tool.ainvoke.call_count == 2
+        assert "video-p1" in resumed.text
+
+    def test_resume_uses_the_variant_of_the_failed_run(self, client):
+        """Test that /graph/resume replays the thread on the graph variant it was started with"""
+        api, video_tool = client
+        create_video = video_tool.ainvoke.side_effect
+
+        async def fail_once(input):
+            if video_tool.ainvoke.call_count == 1:
+                raise RuntimeError("video API down")
+            return await create_video(input=input)
+
+        video_tool.ainvoke.side_effect = fail_once
+
+        failed = api.post("/graph", json={"topic": "topic-1", "project_id": "p1", "variant": "fused"})
+        thread_id = failed.json()["detail"]["thread_id"]
+
+        with patch.object(quotes_video_graph, "get_graph", wraps=quotes_video_graph.get_graph) as get_graph:
+            resumed = api.post("/graph/resume", json={"thread_id": thread_id})
+
+        assert resumed.status_code == 200, resumed.text
+        get_graph.assert_called_once_with("fused")
+        assert "video-p1" in resumed.text
+
+    def test_resume_unknown_thread(self, client):
+        """Test that resuming a thread without checkpoints is a 404"""
+        api, _ = client
+
+        response = api.post("/graph/resume", json={"thread_id": "no-such-thread"})
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("body", [
+        {"project_id": "p1", "count": -1},
+        {"project_id": "p1", "count": 0},
+        {"project_id": "p1", "topics": []},
+        {"project_id": "p1", "topics": ["topic"] * 101},
+    ])
+    def test_batch_rejects_out_of_bounds_input(self, client, body):
+        """Test that /graph/batch rejects a non-positive count or an empty or oversized topic list"""
+        api, video_tool = client
+
+        response = api.post("/graph/batch", json=body)
+
+        assert response.status_code == 422
+        video_tool.ainvoke.assert_not_called()
+
+
+class TestMCQEndpoint:
+    """
+    Unit tests for the /mcq endpoint
+    """
+
+    def test_runs_off_the_event_loop_with_usage_labels(self, client):
+        """Test that the blocking MCQ path runs in a worker thread and keeps the request's usage labels"""
+        api, _ = client
+        seen = {}
+
+        def process_mcq_request(**kwargs):
+            try:
+                asyncio.get_running_loop()
+                seen["on_loop"] = True
+            except RuntimeError:
+                seen["on_loop"] = False
+            seen["labels"] = dict(_usage_labels_var.get())
+            return {"project_id": kwargs["project_id"]}
+
+        with patch.object(main.MCQService, "process_mcq_request", side_effect=process_mcq_request):
+            response = api.post("/mcq", json={"project_id": "p1", "system_prompt": "s", "user_prompt": "u"})
+
+        assert response.status_code == 200, response.text
+        assert seen["on_loop"] is False
+        assert seen["labels"] == {"endpoint": "/mcq", "project_id": "p1"}